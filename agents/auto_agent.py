@@ -1,12 +1,16 @@
-# agents/auto_agent.py
-import time
-import subprocess
-
-while True:
-    result = subprocess.run(["python", "core/orchestrator.py"], capture_output=True, text=True)
-    print(result.stdout)
-    if "All tasks completed" in result.stdout:
-        print("Idle — waiting for new tasks...")
-        time.sleep(30)
-    else:
-        time.sleep(5)
\ No newline at end of file
+# agents/auto_agent.py - Autonomous mode: runs the orchestrator as a long-lived daemon
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.orchestrator import positive_int, run_daemon
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=positive_int, default=1, help='Run up to N ready tasks concurrently')
+    parser.add_argument('--debounce', type=float, default=0.1, help='Seconds to wait for a burst of file events to settle')
+    args = parser.parse_args()
+
+    run_daemon(workers=args.workers, debounce=args.debounce)
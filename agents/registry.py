@@ -40,11 +40,12 @@ def load_plugins():
         if hasattr(module, 'register'):
             module.register(register_agent)
 
-def dispatch_task(task):
-    agent = AGENTS.get(task["assignee"])
+def dispatch_task(task, agent_name=None):
+    """Runs `task` with the handler of `agent_name` (default: its assignee)"""
+    agent = AGENTS.get(agent_name or task["assignee"])
     if agent["executor"]:
         return agent["executor"](task)
     elif agent["handoff"]:
         return agent["handoff"](task)
     else:
-        raise ValueError(f"No handler for {task['assignee']}")
\ No newline at end of file
+        raise ValueError(f"No handler for {agent_name or task['assignee']}")
\ No newline at end of file
@@ -1,12 +1,496 @@
-import subprocess
+# sandbox.py - Pooled, pre-warmed sandboxes for running agent commands (tests, validation)
+#
+# run_in_sandbox() hands a command to a SandboxPool of long-lived workers,
+# so the per-job cost is a pipe round trip instead of starting a container.
+# Two backends:
+#
+#   docker   (default) a long-lived `python:3.12-slim` container per worker
+#            with a read-only root filesystem and only the repository
+#            mounted; jobs run through `docker exec` under ulimit limits, and
+#            the tmpfs /tmp and HOME are cleared between jobs
+#   process  a helper process per worker that unshares a user, network and
+#            mount namespace at start-up and runs each job in its own session
+#            and mount namespace, where everything but the job's cwd and a
+#            private scratch TMPDIR/HOME (wiped between jobs) is read-only,
+#            under setrlimit limits. A worker that cannot set up the
+#            namespaces refuses to start unless `namespaces: false` is set.
+#
+# This file doubles as the process worker's entry point (--worker), so it
+# only imports the standard library at module level.
+import ctypes
+import json
 import os
+import queue
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+
+class SandboxError(RuntimeError):
+    """A sandbox worker could not be started or stopped responding."""
+
+
+@dataclass
+class ResourceLimits:
+    """Per-job limits. None leaves a limit unset."""
+    timeout: float = 300.0      # wall clock seconds; the job's process group is killed
+    cpu_seconds: int = None     # RLIMIT_CPU
+    memory_mb: int = None       # RLIMIT_AS (docker: container --memory)
+    max_processes: int = None   # RLIMIT_NPROC (docker: container --pids-limit)
+    max_file_mb: int = None     # RLIMIT_FSIZE
+
+    @classmethod
+    def from_config(cls, settings: dict):
+        fields = {k: v for k, v in (settings or {}).items() if k in cls.__dataclass_fields__}
+        return cls(**fields)
+
+
+@dataclass
+class SandboxResult:
+    args: list
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    duration: float = 0.0
+    timed_out: bool = False
+
+    def completed_process(self) -> subprocess.CompletedProcess:
+        return subprocess.CompletedProcess(self.args, self.returncode, self.stdout, self.stderr)
+
+
+# === PROCESS BACKEND ===
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY, MS_NOSUID, MS_NODEV, MS_NOEXEC, MS_REMOUNT = 0x1, 0x2, 0x4, 0x8, 0x20
+MS_NOATIME, MS_NODIRATIME, MS_BIND, MS_REC, MS_PRIVATE, MS_RELATIME = 0x400, 0x800, 0x1000, 0x4000, 0x40000, 0x200000
+# Flags a user namespace may not drop when remounting what it inherited
+LOCKED_MOUNT_FLAGS = {"nosuid": MS_NOSUID, "nodev": MS_NODEV, "noexec": MS_NOEXEC, "noatime": MS_NOATIME,
+                      "nodiratime": MS_NODIRATIME, "relatime": MS_RELATIME}
+
+
+def _libc():
+    return ctypes.CDLL(None, use_errno=True)
+
+
+def _check(ret: int, what: str):
+    if ret != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def _unshare(flags: int):
+    if hasattr(os, "unshare"):
+        os.unshare(flags)
+    else:
+        _check(_libc().unshare(flags), "unshare")
+
+
+def _mount(source, target: str, flags: int):
+    _check(_libc().mount(source and source.encode(), target.encode(), None, ctypes.c_ulong(flags), None),
+           f"mount {target}")
+
+
+def _isolate_filesystem(writable: list):
+    """Runs in the job's child before exec: a private mount namespace where only `writable` can be written.
+
+    The worker's user namespace grants the capabilities for this; they are
+    dropped at exec, so the job cannot undo it.
+    """
+    _unshare(CLONE_NEWNS)
+    _mount(None, "/", MS_REC | MS_PRIVATE)
+    for path in writable:
+        _mount(path, path, MS_BIND | MS_REC)
+    with open("/proc/self/mountinfo") as f:
+        mounts = [line.split() for line in f]
+    for fields in mounts:
+        target = fields[4].encode().decode("unicode_escape")  # octal escapes such as \040
+        if any(target == path or target.startswith(path.rstrip("/") + "/") for path in writable):
+            continue
+        flags = MS_REMOUNT | MS_BIND | MS_RDONLY
+        for option in fields[5].split(","):
+            flags |= LOCKED_MOUNT_FLAGS.get(option, 0)
+        _mount(None, target, flags)
+
+
+def _enter_namespaces() -> list:
+    """Moves this process into new user, network and mount namespaces. Returns what was isolated."""
+    uid, gid = os.getuid(), os.getgid()
+    try:
+        _unshare(CLONE_NEWUSER | CLONE_NEWNET | CLONE_NEWNS)
+    except OSError:
+        return []
+    # Keep the caller's ids inside the namespace so files in the workdir stay writable
+    with open("/proc/self/setgroups", "w") as f:
+        f.write("deny")
+    with open("/proc/self/uid_map", "w") as f:
+        f.write(f"{uid} {uid} 1")
+    with open("/proc/self/gid_map", "w") as f:
+        f.write(f"{gid} {gid} 1")
+    return ["user", "net", "mount"]
+
+
+def _apply_limits(limits: dict, isolated: bool):
+    mb = 1024 * 1024
+    # RLIMIT_NPROC counts processes per uid, or (Linux 5.14+) per user namespace: only with the worker's own
+    # namespace is it a per-sandbox cap (+1 for the worker itself); otherwise it would count the whole uid
+    nproc = limits.get("max_processes") and isolated and limits["max_processes"] + 1
+    for rlimit, value in ((resource.RLIMIT_CPU, limits.get("cpu_seconds")),
+                          (resource.RLIMIT_AS, limits.get("memory_mb") and limits["memory_mb"] * mb),
+                          (resource.RLIMIT_NPROC, nproc),
+                          (resource.RLIMIT_FSIZE, limits.get("max_file_mb") and limits["max_file_mb"] * mb)):
+        if value:
+            resource.setrlimit(rlimit, (int(value), int(value)))
+
+
+def _run_job(job: dict, scratch: str, isolated: bool) -> dict:
+    limits = job["limits"]
+    env = {"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "LANG": "C.UTF-8",
+           **job.get("env", {}), "HOME": scratch, "TMPDIR": scratch}
+
+    def setup():
+        if isolated:
+            _isolate_filesystem([os.path.realpath(job["cwd"]), os.path.realpath(scratch)])
+            os.chdir(job["cwd"])  # Popen entered it before the bind mount covered it
+        _apply_limits(limits, isolated)
+
+    started = time.perf_counter()
+    try:
+        proc = subprocess.Popen(job["args"], cwd=job["cwd"], env=env, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace",
+                                start_new_session=True, preexec_fn=setup)
+    except (OSError, subprocess.SubprocessError) as e:  # a failed setup() refuses the job
+        return {"returncode": 127, "stderr": str(e), "duration": time.perf_counter() - started}
+    timed_out = False
+    try:
+        stdout, stderr = proc.communicate(timeout=limits.get("timeout"))
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        os.killpg(proc.pid, signal.SIGKILL)
+        stdout, stderr = proc.communicate()
+    return {"returncode": proc.returncode, "stdout": stdout, "stderr": stderr,
+            "duration": time.perf_counter() - started, "timed_out": timed_out}
+
+
+def _worker_main(scratch: str, namespaces: bool):
+    """Job loop of a process worker: one JSON job per stdin line, one JSON result per stdout line."""
+    isolation = _enter_namespaces() if namespaces else []
+    out = sys.stdout
+    out.write(json.dumps({"ready": True, "isolation": isolation}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        out.write(json.dumps(_run_job(json.loads(line), scratch, bool(isolation))) + "\n")
+        out.flush()
+
+
+class ProcessWorker:
+    """A warm worker process. With `namespaces` (the default) it refuses to start without them."""
+
+    def __init__(self, namespaces: bool = True):
+        self.scratch = tempfile.mkdtemp(prefix="sandbox-")
+        self._proc = subprocess.Popen([sys.executable, "-I", os.path.abspath(__file__), "--worker", self.scratch]
+                                      + ([] if namespaces else ["--no-namespaces"]),
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        hello = self._proc.stdout.readline()
+        if not hello:
+            self.close()
+            raise SandboxError("process sandbox worker failed to start")
+        self.isolation = json.loads(hello)["isolation"]
+        if namespaces and not self.isolation:
+            self.close()
+            raise SandboxError("process sandbox could not create user/network/mount namespaces, refusing to run "
+                               "jobs on the host; use the docker backend or set sandbox.namespaces: false")
+
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def run(self, args: list, cwd: str, limits: ResourceLimits, env: dict = None) -> SandboxResult:
+        job = {"args": list(args), "cwd": cwd, "env": env or {}, "limits": asdict(limits)}
+        try:
+            self._proc.stdin.write(json.dumps(job) + "\n")
+            self._proc.stdin.flush()
+            line = self._proc.stdout.readline()
+        except (BrokenPipeError, OSError) as e:
+            raise SandboxError(f"process sandbox worker died: {e}") from e
+        if not line:
+            raise SandboxError("process sandbox worker died")
+        return SandboxResult(args=list(args), **json.loads(line))
+
+    def reset(self):
+        """Wipes the scratch directory the job used as HOME/TMPDIR."""
+        if not self.alive:
+            raise SandboxError("process sandbox worker exited")
+        for entry in os.scandir(self.scratch):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.unlink(entry.path)
+
+    def close(self):
+        if self.alive:
+            self._proc.stdin.close()
+            try:
+                self._proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+class ProcessBackend:
+    name = "process"
+
+    def __init__(self, namespaces: bool = True):
+        self.namespaces = namespaces
+        if not namespaces:
+            print("  [SANDBOX] WARNING: process backend without namespaces: jobs run on the host with full "
+                  "filesystem and network access, and max_processes is not enforced")
+
+    def start_worker(self, limits: ResourceLimits) -> ProcessWorker:
+        return ProcessWorker(self.namespaces)
+
+
+# === DOCKER BACKEND ===
+DOCKER_HOME = "/home/sandbox"
+DOCKER_SCRATCH = ("/tmp", DOCKER_HOME)  # the only writable paths besides /code, wiped between jobs
+# Run each job under the per-job ulimits; sh's -f counts 512-byte blocks
+DOCKER_ULIMITS = 'if [ -n "$SANDBOX_CPU" ]; then ulimit -t "$SANDBOX_CPU"; fi; ' \
+                 'if [ -n "$SANDBOX_FSIZE" ]; then ulimit -f "$SANDBOX_FSIZE"; fi; exec "$@"'
+
+
+class DockerWorker:
+    """A long-lived container; memory and process limits are fixed when it starts."""
+
+    def __init__(self, root: Path, image: str, limits: ResourceLimits):
+        self.root = root
+        self.limits = limits
+        args = ["docker", "run", "-d", "--rm", "-v", f"{root}:/code", "-w", "/code", "--cap-drop=ALL",
+                "--read-only", "-e", f"HOME={DOCKER_HOME}"]
+        for path in DOCKER_SCRATCH:
+            args += ["--tmpfs", f"{path}:rw,exec,mode=1777"]
+        if limits.memory_mb:
+            args += [f"--memory={limits.memory_mb}m"]
+        if limits.max_processes:
+            args += [f"--pids-limit={limits.max_processes}"]
+        try:
+            proc = subprocess.run(args + [image, "sleep", "infinity"], capture_output=True, text=True)
+        except FileNotFoundError as e:
+            raise SandboxError("docker worker failed to start: docker is not installed") from e
+        if proc.returncode != 0:
+            raise SandboxError(f"docker worker failed to start: {proc.stderr.strip()}")
+        self.container = proc.stdout.strip()
+        self.isolation = ["docker"]
+        self._stale = False  # a timed-out exec may still be running inside
+
+    @property
+    def alive(self) -> bool:
+        proc = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", self.container],
+                              capture_output=True, text=True)
+        return proc.stdout.strip() == "true"
+
+    def run(self, args: list, cwd: str, limits: ResourceLimits, env: dict = None) -> SandboxResult:
+        for name in ("memory_mb", "max_processes"):
+            if getattr(limits, name) != getattr(self.limits, name):
+                raise ValueError(f"docker sandbox: {name} is set per container ({getattr(self.limits, name)}), "
+                                 f"not per job ({getattr(limits, name)})")
+        workdir = "/code/" + Path(cwd).resolve().relative_to(self.root).as_posix()
+        env = {**(env or {}), "SANDBOX_CPU": limits.cpu_seconds or "",
+               "SANDBOX_FSIZE": limits.max_file_mb and limits.max_file_mb * 2048 or ""}
+        env_args = [arg for key, value in env.items() for arg in ("-e", f"{key}={value}")]
+        started = time.perf_counter()
+        try:
+            proc = subprocess.run(["docker", "exec", "-w", workdir, *env_args, self.container,
+                                   "sh", "-c", DOCKER_ULIMITS, "sh", *args],
+                                  capture_output=True, text=True, errors="replace", timeout=limits.timeout)
+        except subprocess.TimeoutExpired as e:
+            # The exec'd process can outlive the client; restart the container on reset
+            self._stale = True
+            return SandboxResult(list(args), -signal.SIGKILL, e.stdout or "", e.stderr or "",
+                                 time.perf_counter() - started, timed_out=True)
+        return SandboxResult(list(args), proc.returncode, proc.stdout, proc.stderr, time.perf_counter() - started)
+
+    def reset(self):
+        if self._stale:
+            raise SandboxError("docker worker had a job time out")
+        wipe = "; ".join(f"rm -rf {path}/* {path}/.[!.]* 2>/dev/null" for path in DOCKER_SCRATCH)
+        proc = subprocess.run(["docker", "exec", self.container, "sh", "-c", f"{wipe}; true"], capture_output=True)
+        if proc.returncode != 0:
+            raise SandboxError("docker worker could not be reset")
+
+    def close(self):
+        subprocess.run(["docker", "rm", "-f", self.container], capture_output=True)
+
+
+class DockerBackend:
+    name = "docker"
+
+    def __init__(self, root=None, image: str = "python:3.12-slim"):
+        self.root = Path(root or os.getcwd()).resolve()
+        self.image = image
+
+    def start_worker(self, limits: ResourceLimits) -> DockerWorker:
+        return DockerWorker(self.root, self.image, limits)
+
+
+# === POOL ===
+class SandboxPool:
+    """A fixed set of pre-warmed sandbox workers behind a job queue.
+
+    submit() queues a job and returns a Future of its SandboxResult; at most
+    `workers` jobs run at once and the rest wait their turn. Each job gets
+    the pool's default limits, overridden per job. A worker is reset after
+    every job, and replaced if the reset fails or the worker has died. If
+    no replacement can be started, queued jobs fail with SandboxError and
+    the next submit() starts the pool afresh.
+    """
+
+    def __init__(self, backend, workers: int = 2, limits: ResourceLimits = None):
+        self.backend = backend
+        self.size = workers
+        self.limits = limits or ResourceLimits()
+        self._idle = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sandbox")
+        self._started = False
+        self._live = 0  # workers started and not yet closed
+        self._lock = threading.Lock()
+        self.stats = {"jobs": 0, "replaced": 0, "timeouts": 0, "queue_seconds": 0.0}
+
+    def start(self):
+        """Starts all workers up front, in parallel, so the first jobs do not pay for it."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            # Not on self._executor, whose threads may all be jobs waiting for these workers
+            with ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sandbox-start") as starter:
+                starting = [starter.submit(self.backend.start_worker, self.limits) for _ in range(self.size)]
+            workers, error = [], None
+            for future in starting:
+                try:
+                    workers.append(future.result())
+                except Exception as e:
+                    error = error or e
+            if error is not None:
+                for worker in workers:
+                    worker.close()
+                self._started = False
+                raise error
+            self._live = len(workers)
+            for worker in workers:
+                self._idle.put(worker)
+
+    def submit(self, args: list, cwd=None, limits: ResourceLimits = None, env: dict = None, **overrides) -> Future:
+        """Queues a job. Keyword overrides (timeout=..., memory_mb=...) adjust the limits."""
+        self.start()
+        limits = replace(limits or self.limits, **overrides)
+        cwd = str(cwd or os.getcwd())
+        return self._executor.submit(self._run, list(args), cwd, limits, env, time.perf_counter())
+
+    def run(self, args: list, cwd=None, limits: ResourceLimits = None, env: dict = None, **overrides) -> SandboxResult:
+        return self.submit(args, cwd, limits, env, **overrides).result()
+
+    def _take(self):
+        """Waits for an idle worker. Raises SandboxError once the pool has none left."""
+        while True:
+            worker = self._idle.get()
+            if worker is not None:
+                return worker
+            with self._lock:
+                if self._live == 0:
+                    self._idle.put(None)  # for the next queued job
+                    raise SandboxError("no sandbox workers left: replacements failed to start")
+
+    def _run(self, args, cwd, limits, env, queued_at) -> SandboxResult:
+        worker = self._take()
+        with self._lock:
+            self.stats["queue_seconds"] += time.perf_counter() - queued_at
+        try:
+            result = worker.run(args, cwd, limits, env)
+        except SandboxError:
+            self._replace(worker)
+            raise
+        except Exception:
+            self._idle.put(worker)
+            raise
+        try:
+            worker.reset()
+            self._idle.put(worker)
+        except (OSError, SandboxError):
+            self._replace(worker)
+        with self._lock:
+            self.stats["jobs"] += 1
+            self.stats["timeouts"] += result.timed_out
+        return result
+
+    def _replace(self, worker, attempts: int = 2):
+        worker.close()
+        for attempt in range(attempts):
+            try:
+                replacement = self.backend.start_worker(self.limits)
+            except Exception as e:
+                print(f"  [SANDBOX] Could not start a replacement worker (attempt {attempt + 1}): {e}")
+                continue
+            with self._lock:
+                self.stats["replaced"] += 1
+            self._idle.put(replacement)
+            return
+        with self._lock:
+            self._live -= 1
+            if self._live == 0:
+                self._started = False
+                self._idle.put(None)  # wakes the queued jobs, which then fail
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_sandbox_pool() -> SandboxPool:
+    """Returns the process-wide pool configured by `sandbox:` in core/config.yaml."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from core.config import load_config
+            settings = load_config().get("sandbox") or {}
+            name = settings.get("backend", "docker")
+            if name == "process":
+                backend = ProcessBackend(namespaces=bool(settings.get("namespaces", True)))
+            else:
+                backend = DockerBackend(image=settings.get("image", "python:3.12-slim"))
+            _pool = SandboxPool(backend, workers=int(settings.get("workers", 2)),
+                                limits=ResourceLimits.from_config(settings.get("limits")))
+        return _pool
+
+
+def run_in_sandbox(cmd: list[str], cwd=None, check: bool = True, **limits) -> subprocess.CompletedProcess:
+    """Runs `cmd` on a warm sandbox worker and returns the CompletedProcess (output captured).
+
+    Raises CalledProcessError on a non-zero exit if `check`, like before.
+    Keyword arguments (timeout=..., memory_mb=...) override the job's limits.
+    """
+    result = get_sandbox_pool().run(cmd, cwd=cwd, **limits)
+    completed = result.completed_process()
+    if check:
+        completed.check_returncode()
+    return completed
+
 
-def run_in_sandbox(cmd: list[str]):
-    return subprocess.run([
-        "docker", "run", "--rm",
-        "-v", f"{os.getcwd()}:/code",
-        "-w", "/code",
-        "--cap-drop=ALL",
-        "python:3.12-slim",
-        *cmd
-    ], check=True)
\ No newline at end of file
+if __name__ == "__main__" and len(sys.argv) > 2 and sys.argv[1] == "--worker":
+    _worker_main(sys.argv[2], namespaces="--no-namespaces" not in sys.argv)
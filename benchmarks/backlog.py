@@ -0,0 +1,75 @@
+# backlog.py - Synthetic tasks/ backlogs for benchmarks
+#
+#   python benchmarks/backlog.py --shape diamond --tasks 1000 --out /tmp/bench/tasks
+#
+# Shapes:
+#   wide     independent tasks
+#   chain    each task depends on the previous one
+#   fanout   one root task, every other task depends on it
+#   diamond  repeated root -> `width` parallel tasks -> join layers
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+SHAPES = ("wide", "chain", "fanout", "diamond")
+
+
+def generate(shape: str, count: int, width: int = 8, assignee: str = "grok-fast") -> list:
+    """Returns `count` pending task dicts with task_ids task_000001... and depends_on per `shape`."""
+    if shape not in SHAPES:
+        raise ValueError(f"unknown shape {shape!r}; expected one of {', '.join(SHAPES)}")
+    tasks = []
+    ids = [f"task_{i:06d}" for i in range(1, count + 1)]
+    last_join = None
+    for i, task_id in enumerate(ids):
+        if shape == "chain":
+            deps = [ids[i - 1]] if i else []
+        elif shape == "fanout":
+            deps = [ids[0]] if i else []
+        elif shape == "diamond":
+            # Layer layout per diamond: join (or root), then `width` middles; the next join waits on all middles
+            position = i % (width + 1)
+            if position == 0:
+                deps = ids[max(0, i - width):i] if i else []
+                last_join = task_id
+            else:
+                deps = [last_join]
+        else:
+            deps = []
+        tasks.append({
+            "task_id": task_id,
+            # "ui"/"gemini" in a description routes grok-fast to Gemini, so keep them out
+            "description": f"Implement handler {i} for the synthetic {shape} backlog",
+            "assignee": assignee,
+            "files": [f"shared/bench/mod_{i}.py"],
+            "status": "pending",
+            "priority": 10,
+            "depends_on": deps,
+        })
+    return tasks
+
+
+def write_backlog(tasks: list, directory) -> Path:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for task in tasks:
+        (directory / f"{task['task_id']}.json").write_text(json.dumps(task, indent=2))
+    return directory
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--shape", choices=SHAPES, default="diamond")
+    ap.add_argument("--tasks", type=int, default=1000)
+    ap.add_argument("--width", type=int, default=8, help="Parallel tasks per diamond")
+    ap.add_argument("--out", required=True, help="Directory to write task_*.json into")
+    args = ap.parse_args(argv)
+    write_backlog(generate(args.shape, args.tasks, args.width), args.out)
+    print(f"Wrote {args.tasks} {args.shape} tasks to {os.path.abspath(args.out)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# bench_orchestrator.py - End-to-end orchestrator benchmarks against a local mock LLM
+#
+#   python benchmarks/bench_orchestrator.py --sizes 100 1000 10000 --json results.json
+#   python benchmarks/bench_orchestrator.py --json new.json --baseline results.json
+#
+# Three phases per backlog shape (see benchmarks/backlog.py):
+#
+#   scheduler  TaskScheduler alone: pop_ready/release/update until the DAG is
+#              done; reports ops/sec (three ops per task)
+#   dispatch   run_tasks() over task files with a no-op executor; the
+#              makespan per task is the orchestrator's own overhead (task
+#              store, journal, thread pool, logging)
+#   e2e        run_tasks() with the real grok-fast executor writing into a
+#              scratch checkout, against benchmarks/mock_llm.py
+#
+# peak_rss_mb is the process's peak resident set size after the phase, so it
+# only grows; run a single size per invocation to attribute it precisely.
+# --baseline prints the change of each metric against an earlier --json file.
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AIFACTORY_TELEMETRY", "none")
+
+from benchmarks.backlog import SHAPES, generate, write_backlog
+from benchmarks.mock_llm import MockLLMServer
+from clients import grok_fast_client
+from clients.cache import get_cache
+from core import orchestrator
+from core.scheduler import TaskScheduler
+
+# Higher is better for these; everything else is a cost
+HIGHER_IS_BETTER = {"ops_per_sec", "tasks_per_sec"}
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def bench_scheduler(shape, count, width):
+    tasks = generate(shape, count, width)
+    started = time.perf_counter()
+    scheduler = TaskScheduler(tasks)
+    built = time.perf_counter()
+    done = 0
+    while True:
+        task = scheduler.pop_ready()
+        if task is None:
+            break
+        scheduler.release(task['task_id'])
+        task['status'] = 'completed'
+        scheduler.update(task)
+        done += 1
+    elapsed = time.perf_counter() - built
+    assert done == count, f"scheduler finished {done} of {count} tasks"
+    return {"build_s": built - started, "drain_s": elapsed, "ops_per_sec": 3 * count / elapsed}
+
+
+@contextlib.contextmanager
+def orchestrator_sandbox(tasks_dir, executor, retry_delay=0.05):
+    """Points the orchestrator at `tasks_dir` and routes grok-fast tasks to `executor`."""
+    saved = (orchestrator.TASKS_DIR, orchestrator.AGENTS["grok-fast"]["executor"], orchestrator.workflow_config)
+    orchestrator.TASKS_DIR = Path(tasks_dir)
+    orchestrator.AGENTS["grok-fast"]["executor"] = executor
+    orchestrator.workflow_config = lambda: {"max_retries": 3, "retry_base_delay": retry_delay, "retry_jitter": 0}
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        orchestrator.TASKS_DIR, orchestrator.AGENTS["grok-fast"]["executor"], orchestrator.workflow_config = saved
+
+
+def statuses(tasks_dir):
+    orchestrator.get_journal().compact()
+    counts = {}
+    for task in orchestrator.load_all_tasks():
+        counts[task['status']] = counts.get(task['status'], 0) + 1
+    return counts
+
+
+def bench_dispatch(shape, count, width, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        tasks_dir = write_backlog(generate(shape, count, width), Path(tmp) / "tasks")
+        with orchestrator_sandbox(tasks_dir, lambda task: True):
+            started = time.perf_counter()
+            orchestrator.run_tasks(workers)
+            makespan = time.perf_counter() - started
+            counts = statuses(tasks_dir)
+    return {"makespan_s": makespan, "per_task_ms": makespan / count * 1000,
+            "tasks_per_sec": count / makespan, "completed": counts.get("completed", 0)}
+
+
+def bench_e2e(shape, count, width, workers, server):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp).resolve()
+        tasks_dir = write_backlog(generate(shape, count, width), root / "tasks")
+
+        def executor(task):
+            result = grok_fast_client.run_task(task['task_id'], task['description'],
+                                               [str(root / f) for f in task['files']], root=root, commit=False)
+            return result.ok
+
+        with orchestrator_sandbox(tasks_dir, executor):
+            started = time.perf_counter()
+            orchestrator.run_tasks(workers)
+            makespan = time.perf_counter() - started
+            counts = statuses(tasks_dir)
+    return {"makespan_s": makespan, "per_task_ms": makespan / count * 1000, "tasks_per_sec": count / makespan,
+            "completed": counts.get("completed", 0), "failed": counts.get("failed", 0),
+            "llm_requests": server.stats["requests"], "llm_failures": server.stats["failures"]}
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["phase"], r["shape"], r["tasks"]): r for r in json.load(f)["results"]}
+    print(f"\nChange vs {baseline_path} (+ is better):")
+    for row in results:
+        old = baseline.get((row["phase"], row["shape"], row["tasks"]))
+        if old is None:
+            continue
+        changes = []
+        for key, value in row.items():
+            if isinstance(value, float) and isinstance(old.get(key), (int, float)) and old[key]:
+                delta = (value - old[key]) / old[key] * 100
+                changes.append(f"{key} {delta if key in HIGHER_IS_BETTER else -delta:+.1f}%")
+        print(f"  {row['phase']:>9} {row['shape']:>8} {row['tasks']:>6}: {', '.join(changes)}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Tasks per backlog (up to 50k)")
+    ap.add_argument("--width", type=int, default=8, help="Parallel tasks per diamond")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--phases", nargs="+", choices=["scheduler", "dispatch", "e2e"], default=["scheduler", "dispatch", "e2e"])
+    ap.add_argument("--e2e-tasks", type=int, default=200, help="Backlog size for the e2e phase")
+    ap.add_argument("--latency", type=float, default=0.05, help="Mock LLM seconds before the first byte")
+    ap.add_argument("--tokens-per-second", type=float, default=2000, help="Mock LLM output rate (0 = unlimited)")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of mock LLM requests that fail")
+    ap.add_argument("--json", help="Write results to this file")
+    ap.add_argument("--baseline", help="Earlier --json file to compare against")
+    args = ap.parse_args(argv)
+
+    results = []
+
+    def report(phase, shape, tasks, row):
+        row = {"phase": phase, "shape": shape, "tasks": tasks, **row, "peak_rss_mb": peak_rss_mb()}
+        results.append(row)
+        metrics = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                            for k, v in row.items() if k not in ("phase", "shape", "tasks"))
+        print(f"{phase:>9} {shape:>8} {tasks:>6}  {metrics}", flush=True)
+
+    for shape in args.shapes:
+        for count in args.sizes:
+            if "scheduler" in args.phases:
+                report("scheduler", shape, count, bench_scheduler(shape, count, args.width))
+            if "dispatch" in args.phases:
+                report("dispatch", shape, count, bench_dispatch(shape, count, args.width, args.workers))
+
+    if "e2e" in args.phases:
+        server = MockLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                               failure_rate=args.failure_rate).start()
+        os.environ["OPENCODE_GROK_URL"] = server.url
+        get_cache().enabled = False  # every task must reach the mock endpoint
+        try:
+            for shape in args.shapes:
+                server.stats.update(requests=0, failures=0, streamed=0)
+                report("e2e", shape, args.e2e_tasks, bench_e2e(shape, args.e2e_tasks, args.width, args.workers, server))
+        finally:
+            server.stop()
+
+    if args.json:
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                "cpus": os.cpu_count(), "time": time.time(), "args": vars(args)}
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
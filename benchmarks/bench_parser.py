@@ -0,0 +1,91 @@
+# bench_parser.py - Micro-benchmark: single-pass stream parser vs the old regex parsing
+#
+#   python benchmarks/bench_parser.py --sizes 1 4 16 --repeat 3
+#
+# "regex" is what grok_fast_client did before: a DOTALL search for the
+# request_help block followed by re.findall over every fence, each scanning
+# the full response string.
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clients.stream_parser import FenceStreamParser, parse_events
+
+
+def regex_parse(text: str):
+    help_request = re.search(r"```request_help\s*(.*?)\n(.*?)\n```", text, re.DOTALL)
+    blocks = re.findall(r"```(?:\w+:)?([^\n`]+)\n(.*?)\n```", text, re.DOTALL)
+    return help_request, blocks
+
+
+def synthetic_response(megabytes: float, seed: int = 0) -> str:
+    """Prose and ```python:shared/... blocks of 20-400 lines, ending in a help request."""
+    rng = random.Random(seed)
+    parts, size, n = [], 0, 0
+    while size < megabytes * 1024 * 1024:
+        prose = f"Step {n}: update module {n} so the tests pass.\n"
+        lines = [f"def fn_{n}_{i}(x):\n    return x * {i}  # {'`' * rng.randint(0, 2)}\n" for i in range(rng.randint(20, 400))]
+        block = f"```python:shared/gen/mod_{n}.py\n{''.join(lines)}```\n"
+        parts += [prose, block]
+        size += len(prose) + len(block)
+        n += 1
+    parts.append("```request_help\nQuestion for Grok 4.1: is this fine?\nContext files: shared/gen/mod_0.py\n```\n")
+    return "".join(parts)
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def chunked(text, size):
+    parser = FenceStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+    return events + parser.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Response sizes in MB")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--chunk", type=int, default=64, help="Bytes per streamed delta")
+    ap.add_argument("--json", help="Also write results to this file")
+    args = ap.parse_args(argv)
+
+    results = []
+    print(f"{'MB':>6} {'blocks':>7} {'regex s':>9} {'parser s':>9} {'chunked s':>10} {'parser MB/s':>12}")
+    for mb in args.sizes:
+        text = synthetic_response(mb)
+        real_mb = len(text) / 1024 / 1024
+        blocks = len(regex_parse(text)[1])
+        row = {
+            "mb": round(real_mb, 2),
+            "blocks": blocks,
+            "regex_s": best_of(lambda: regex_parse(text), args.repeat),
+            "parser_s": best_of(lambda: parse_events(text), args.repeat),
+            "chunked_s": best_of(lambda: chunked(text, args.chunk), args.repeat),
+        }
+        results.append(row)
+        print(f"{row['mb']:>6.1f} {blocks:>7} {row['regex_s']:>9.3f} {row['parser_s']:>9.3f} "
+              f"{row['chunked_s']:>10.3f} {real_mb / row['parser_s']:>12.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
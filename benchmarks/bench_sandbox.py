@@ -0,0 +1,86 @@
+# bench_sandbox.py - Cold vs. warm sandbox execution latency
+#
+#   python benchmarks/bench_sandbox.py --jobs 50 --backend process
+#
+# "cold" starts a fresh worker for every job and tears it down afterwards,
+# which is what run_in_sandbox did with `docker run --rm`; "warm" sends the
+# same jobs through a SandboxPool whose workers were started beforehand.
+# "direct" is a plain subprocess.run with no sandbox, as a floor.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.sandbox import DockerBackend, ProcessBackend, ResourceLimits, SandboxPool
+
+
+def timed(fn, jobs):
+    samples = []
+    for _ in range(jobs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summary(name, samples):
+    samples = sorted(samples)
+    row = {"mode": name, "jobs": len(samples), "mean_ms": statistics.mean(samples) * 1000,
+           "p50_ms": samples[len(samples) // 2] * 1000, "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000}
+    print(f"{name:>8} {row['jobs']:>6} {row['mean_ms']:>9.1f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f}")
+    return row
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--backend", choices=["process", "docker"], default="process")
+    ap.add_argument("--jobs", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--cmd", nargs="+", default=["python3", "-c", "pass"], help="Command each job runs")
+    ap.add_argument("--json", help="Also write results to this file")
+    args = ap.parse_args(argv)
+
+    backend = ProcessBackend() if args.backend == "process" else DockerBackend()
+    limits = ResourceLimits(timeout=60)
+    cwd = os.getcwd()
+
+    def cold():
+        worker = backend.start_worker(limits)
+        try:
+            worker.run(args.cmd, cwd, limits)
+        finally:
+            worker.close()
+
+    pool = SandboxPool(backend, workers=args.workers, limits=limits)
+    pool.start()
+    print(f"{'mode':>8} {'jobs':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        results = [
+            summary("direct", timed(lambda: subprocess.run(args.cmd, capture_output=True), args.jobs)),
+            summary("cold", timed(cold, args.jobs)),
+            summary("warm", timed(lambda: pool.run(args.cmd, cwd), args.jobs)),
+        ]
+        started = time.perf_counter()
+        futures = [pool.submit(args.cmd, cwd) for _ in range(args.jobs)]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started
+        print(f"queued: {args.jobs} jobs on {args.workers} warm workers in {elapsed:.2f}s "
+              f"({args.jobs / elapsed:.1f} jobs/s)")
+        results.append({"mode": "queued", "jobs": args.jobs, "workers": args.workers, "seconds": elapsed})
+    finally:
+        pool.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
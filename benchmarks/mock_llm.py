@@ -0,0 +1,154 @@
+# mock_llm.py - Local OpenAI-compatible chat completions stub for benchmarks
+#
+#   python benchmarks/mock_llm.py --port 4242 --latency 0.2 --tokens-per-second 400 --failure-rate 0.05
+#   OPENCODE_GROK_URL=http://127.0.0.1:4242/v1/chat/completions python core/orchestrator.py
+#
+# Answers POST /v1/chat/completions (plain JSON, or SSE when "stream" is set)
+# with one canned ```python:<path> block for every "### <path>" file section
+# in the prompt, which is how grok_fast_client lists the task's files. Each
+# response waits `latency` seconds before the first byte and then emits its
+# content at `tokens_per_second` (4 bytes per token); `failure_rate` of the
+# requests get an HTTP 500 instead.
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILE_SECTION = re.compile(r"^### (\S+)", re.MULTILINE)
+BYTES_PER_TOKEN = 4
+
+
+def canned_answer(prompt: str) -> str:
+    """One full-content block per file listed in the prompt."""
+    paths = FILE_SECTION.findall(prompt) or ["shared/mock_output.py"]
+    blocks = [f"```python:{path}\n# generated by mock_llm\ndef handler():\n    return {i}\n```" for i, path in enumerate(paths)]
+    return "Here are the files.\n\n" + "\n\n".join(blocks) + "\n"
+
+
+class MockLLMServer:
+    """Threaded stub server; start() returns self, url is the completions endpoint."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 tokens_per_second: float = 0.0, failure_rate: float = 0.0, chunk_tokens: int = 16,
+                 answer=canned_answer, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.chunk_tokens = chunk_tokens
+        self.answer = answer
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "failures": 0, "streamed": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def _fails(self) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.failure_rate
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real endpoint
+
+            def do_POST(self):
+                try:
+                    self._answer()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled, e.g. a hedged request that lost
+
+            def _answer(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.stats["requests"] += 1
+                time.sleep(server.latency)
+                if server._fails():
+                    server.stats["failures"] += 1
+                    return self._send(500, "application/json", b'{"error": "mock failure"}')
+                prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+                content = server.answer(prompt)
+                if payload.get("stream"):
+                    server.stats["streamed"] += 1
+                    return self._stream(content)
+                time.sleep(server._emit_seconds(content))
+                body = {"id": "mock", "object": "chat.completion",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                     "finish_reason": "stop"}]}
+                self._send(200, "application/json", json.dumps(body).encode())
+
+            def _send(self, status, ctype, data):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                size = server.chunk_tokens * BYTES_PER_TOKEN
+                for i in range(0, len(content), size):
+                    piece = content[i:i + size]
+                    time.sleep(server._emit_seconds(piece))
+                    self._chunk({"choices": [{"index": 0, "delta": {"content": piece}}]})
+                self._chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, data):
+                line = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode()
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _emit_seconds(self, text: str) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return len(text) / BYTES_PER_TOKEN / self.tokens_per_second
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=4242)
+    ap.add_argument("--latency", type=float, default=0.2, help="Seconds before the first byte")
+    ap.add_argument("--tokens-per-second", type=float, default=400, help="0 = unlimited")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    args = ap.parse_args(argv)
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.tokens_per_second, args.failure_rate).start()
+    print(f"Mock LLM listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
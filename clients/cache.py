@@ -0,0 +1,156 @@
+# cache.py - On-disk content-addressed cache for LLM responses, shared by all clients
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.fileio import atomic_write_text
+
+COLLAB_ROOT = Path(__file__).parent.parent.resolve()
+
+
+class ResponseCache:
+    """Maps a hash of (endpoint/model, system prompt, user message, temperature,
+    max_tokens) to the completion text, one JSON file per entry.
+
+    Entries older than `max_age` seconds are treated as misses and deleted.
+    When the cache grows past `max_bytes`, the least recently used entries
+    (by file mtime, which a hit refreshes) are evicted. With `bypass` set,
+    lookups always miss but fresh responses are still stored.
+    """
+
+    def __init__(self, directory, max_bytes: int = 512 * 1024 * 1024, max_age: float = 30 * 86400,
+                 enabled: bool = True, bypass: bool = False):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self.bypass = bypass
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+        self._lock = threading.Lock()
+        self._size = None  # total bytes on disk, computed on first store
+
+    @staticmethod
+    def key(endpoint: str, system: str, user: str, temperature: float, max_tokens: int) -> str:
+        fields = {"endpoint": endpoint, "system": system, "user": user,
+                  "temperature": temperature, "max_tokens": max_tokens}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str):
+        """Returns the cached text, or None on a miss (or when bypassed/disabled)."""
+        if not self.enabled:
+            return None
+        if self.bypass:
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        if time.time() - entry.get("created", 0) > self.max_age:
+            self.discard(key)
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.stats["hits"] += 1
+        return entry["content"]
+
+    def put(self, key: str, content: str):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"created": time.time(), "content": content})
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self.directory.glob("*/*.json"))
+            try:
+                self._size -= path.stat().st_size
+            except FileNotFoundError:
+                pass
+            atomic_write_text(path, data)
+            self._size += len(data.encode("utf-8"))
+            self.stats["stores"] += 1
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def discard(self, key: str):
+        """Drops an entry, e.g. a response that turned out to be unusable."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def _evict(self):
+        """Deletes least recently used entries until the cache is under 90% of max_bytes."""
+        entries = []
+        for p in self.directory.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        target = self.max_bytes * 0.9
+        for _, size, p in entries:
+            if self._size <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.stats["evictions"] += 1
+
+    def fetch(self, key: str, compute):
+        """Returns the cached text for `key`, or calls compute() and stores its result."""
+        content = self.get(key)
+        if content is None:
+            content = compute()
+            self.put(key, content)
+        return content
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ResponseCache:
+    """Returns the process-wide cache configured by `cache:` in core/config.yaml.
+
+    AIFACTORY_CACHE_BYPASS=1 in the environment sets the bypass flag.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from core.config import load_config
+            settings = load_config().get("cache") or {}
+            _cache = ResponseCache(
+                COLLAB_ROOT / settings.get("dir", ".cache/llm"),
+                max_bytes=int(settings.get("max_bytes", 512 * 1024 * 1024)),
+                max_age=float(settings.get("max_age_days", 30)) * 86400,
+                enabled=bool(settings.get("enabled", True)),
+                bypass=os.getenv("AIFACTORY_CACHE_BYPASS", "") not in ("", "0"))
+        return _cache
@@ -0,0 +1,164 @@
+# edit_protocol.py - Search/replace edit blocks: parsing, fuzzy application and token accounting
+#
+# Instead of repeating a whole file to change one line, the model may answer
+#
+#   ```edit:shared/app/main.py
+#   <<<<<<< SEARCH
+#   def add(a, b):
+#       return a - b
+#   =======
+#   def add(a, b):
+#       return a + b
+#   >>>>>>> REPLACE
+#   ```
+#
+# Hunks are located exactly first, then ignoring whitespace, then by the most
+# similar run of lines; a hunk that still cannot be placed raises EditError so
+# the caller can ask for the file's full content instead.
+import difflib
+from dataclasses import dataclass
+
+SEARCH_MARK = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE_MARK = ">>>>>>> REPLACE"
+FUZZY_THRESHOLD = 0.85
+BYTES_PER_TOKEN = 4
+
+
+class EditError(ValueError):
+    """An edit block is malformed or one of its hunks does not match the file."""
+
+
+@dataclass
+class Hunk:
+    search: str
+    replace: str
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text.encode("utf-8")) + BYTES_PER_TOKEN - 1) // BYTES_PER_TOKEN
+
+
+def parse_hunks(body: str) -> list:
+    """Splits an edit block body into hunks; raises EditError if the markers are unbalanced."""
+    hunks = []
+    state, search, replace = None, [], []
+    for line in body.split("\n"):
+        marker = line.strip()
+        if marker == SEARCH_MARK and state is None:
+            state, search, replace = "search", [], []
+        elif marker == DIVIDER and state == "search":
+            state = "replace"
+        elif marker == REPLACE_MARK and state == "replace":
+            hunks.append(Hunk("\n".join(search), "\n".join(replace)))
+            state = None
+        elif state == "search":
+            search.append(line)
+        elif state == "replace":
+            replace.append(line)
+        elif marker:
+            raise EditError(f"Text outside a SEARCH/REPLACE hunk: {line[:60]!r}")
+    if state is not None or not hunks:
+        raise EditError("Unterminated or empty edit block")
+    return hunks
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _reindent(lines: list, matched: list, search: list) -> list:
+    """Shifts replacement lines by the indentation difference between the file and the SEARCH text."""
+    have = next((_indent(l) for l in matched if l.strip()), "")
+    want = next((_indent(l) for l in search if l.strip()), "")
+    if have == want:
+        return lines
+    out = []
+    for line in lines:
+        if line.startswith(want):
+            out.append(have + line[len(want):])
+        else:
+            out.append(line)
+    return out
+
+
+def _locate(lines: list, search: list, start: int):
+    """Returns (index, fuzzy) of the best window of len(search) lines, or None."""
+    n = len(search)
+    if n == 0 or n > len(lines):
+        return None
+    order = list(range(start, len(lines) - n + 1)) + list(range(0, min(start, len(lines) - n + 1)))
+    # 1. exact (modulo trailing whitespace), preferring matches after the previous hunk
+    wanted = [l.rstrip() for l in search]
+    for i in order:
+        if [l.rstrip() for l in lines[i:i + n]] == wanted:
+            return i, False
+    # 2. ignoring leading and trailing whitespace (the model re-indented)
+    wanted = [l.strip() for l in search]
+    for i in order:
+        if [l.strip() for l in lines[i:i + n]] == wanted:
+            return i, True
+    # 3. most similar window above the threshold
+    target = "\n".join(wanted)
+    best, best_ratio = None, FUZZY_THRESHOLD
+    for i in order:
+        matcher = difflib.SequenceMatcher(None, "\n".join(l.strip() for l in lines[i:i + n]), target, autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    return (best, True) if best is not None else None
+
+
+def apply_hunks(text: str, hunks: list):
+    """Applies hunks in order and returns (new_text, fuzzy_count).
+
+    An empty SEARCH appends its REPLACE text to the end of the file (which
+    is how a file gets created). Raises EditError naming the first hunk that
+    could not be placed; the original text is never partially modified.
+    """
+    lines = text.split("\n") if text else []
+    trailing_newline = text.endswith("\n")
+    if trailing_newline:
+        lines.pop()
+    cursor = 0
+    fuzzy = 0
+    for number, hunk in enumerate(hunks, 1):
+        search = hunk.search.split("\n") if hunk.search.strip() else []
+        replace = hunk.replace.split("\n") if hunk.replace else []
+        if not search:
+            lines.extend(replace)
+            cursor = len(lines)
+            continue
+        found = _locate(lines, search, cursor)
+        if found is None:
+            raise EditError(f"Hunk {number} does not match: {search[0].strip()[:60]!r}")
+        index, was_fuzzy = found
+        matched = lines[index:index + len(search)]
+        if was_fuzzy:
+            fuzzy += 1
+            replace = _reindent(replace, matched, search)
+        lines[index:index + len(search)] = replace
+        cursor = index + len(replace)
+    return "\n".join(lines) + ("\n" if trailing_newline or not text else ""), fuzzy
+
+
+@dataclass
+class EditStats:
+    """Per-task accounting of how much output the edit format saved."""
+    full_blocks: int = 0
+    edit_blocks: int = 0
+    hunks: int = 0
+    fuzzy_hunks: int = 0
+    failed_blocks: int = 0
+    fallbacks: int = 0
+    output_tokens: int = 0     # what the model actually generated for file blocks
+    full_file_tokens: int = 0  # what full-content blocks would have cost
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_file_tokens - self.output_tokens
+
+    def as_dict(self) -> dict:
+        return {**self.__dict__, "tokens_saved": self.tokens_saved}
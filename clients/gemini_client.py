@@ -1,12 +1,31 @@
 # gemini_client.py - Direct API client for Gemini 3.0 Pro
 
 import os
+import sys
 import uuid
-import google.generativeai as genai
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from clients.cache import get_cache, ResponseCache
+from clients.transport import get_transport
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_gemini_model(name: str):
+    """Configures the SDK once and returns a cached GenerativeModel for `name`."""
+    import google.generativeai as genai
+    with _models_lock:
+        if not _models:
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        if name not in _models:
+            _models[name] = genai.GenerativeModel(name)
+        return _models[name]
 
 def gemini_propose(task_description: str, files: list[str]) -> str:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel("gemini-1.5-pro-exp-0827")  # or 3.0 when live
+    model_name = "gemini-1.5-pro-exp-0827"  # or 3.0 when live
+    model = get_gemini_model(model_name)
     file_contents = "\n\n".join([f"--- {f} ---\n{open(f).read()}" for f in files if os.path.exists(f)])
     prompt = f"""You are Gemini agent in AI Factory OS.
 Task: {task_description}
@@ -15,22 +34,25 @@ Output ONLY code proposals in this format:
 # full code
 ```
 """
-    response = model.generate_content(prompt + "\n\n" + file_contents)
+    # Not cached: the random proposal name makes every prompt unique
+    response = get_transport().run("gemini", model.generate_content, prompt + "\n\n" + file_contents)
     return response.text
 
 def call_gemini_api(prompt: str, temperature: float = 0.2) -> str:
     """Direct call to Gemini 3.0 Pro API"""
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel("gemini-3.0-pro-latest")
+    import google.generativeai as genai
+    model = get_gemini_model("gemini-3.0-pro-latest")
 
-    response = model.generate_content(
+    key = ResponseCache.key("gemini:gemini-3.0-pro-latest", "", prompt, temperature, 32768)
+    return get_cache().fetch(key, lambda: get_transport().run(
+        "gemini",
+        model.generate_content,
         prompt,
         generation_config=genai.GenerationConfig(
             temperature=temperature,
             max_output_tokens=32768,
         )
-    )
-    return response.text
+    ).text)
 
 if __name__ == "__main__":
     import sys
@@ -39,4 +61,4 @@ if __name__ == "__main__":
         sys.exit(1)
     prompt = sys.argv[1]
     result = call_gemini_api(prompt)
-    print(result)
\ No newline at end of file
+    print(result)
@@ -1,50 +1,67 @@
 # grok_fast_client.py — Grok Code Fast 1 with Auto-Help Request (v2.1)
 # Implements the official Grok-Centric Collaboration Baseline (Nov 19, 2025)
+#
+# Importable API: run_task(...) returns a GrokFastResult. The orchestrator calls
+# it in-process; HTTP goes through the shared pooled transport in
+# clients/transport.py. The CLI below is a thin wrapper.
 
 import argparse
 import json
 import os
 import sys
 import textwrap
-import uuid
+import time
 import datetime
+from dataclasses import dataclass, field
 from pathlib import Path
-import re
-import requests
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from core.git_utils import git_commit_changes
+from core.git_utils import commit_paths, git_commit_changes
+from clients.cache import get_cache, ResponseCache
+from clients.edit_protocol import EditError, EditStats, apply_hunks, estimate_tokens, parse_hunks
+from core.snapshot import assemble_context, get_snapshot
+from clients.gemini_client import get_gemini_model
+from clients.stream_parser import FenceStreamParser, FileBlock, HelpRequest, InvalidBlock, parse_events
+from clients.transport import get_transport
+from core.config import agent_config
+from core.logger import flush_telemetry, record_span
+from core.metrics import record_completion
 
 def call_gemini_30_pro(messages: list[dict], temperature: float = 0.2) -> str:
     import google.generativeai as genai
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel("gemini-3.0-pro-latest")
+    model = get_gemini_model("gemini-3.0-pro-latest")
 
     chat = model.start_chat()
     full_prompt = "\n\n".join([f"{m['role'].upper()}: {m['content']}" for m in messages])
-    response = chat.send_message(
+    key = ResponseCache.key("gemini:gemini-3.0-pro-latest", "", full_prompt, temperature, 32768)
+    return get_cache().fetch(key, lambda: get_transport().run(
+        "gemini",
+        chat.send_message,
         full_prompt,
         generation_config=genai.GenerationConfig(
             temperature=temperature,
             max_output_tokens=32768,
             response_mime_type="text/plain"
         )
-    )
-    return response.text
+    ).text)
 
 # === CONFIGURATION ===
 COLLAB_ROOT = Path(__file__).parent.parent.resolve()  # collaboration_archive or collaboration_framework
 TASKS_DIR = COLLAB_ROOT / "tasks"
 PROMPTS_DIR = COLLAB_ROOT / "prompts"
+DEFAULT_GROK_URL = "http://127.0.0.1:4242/v1/chat/completions"
+TEMPERATURE = 0.15
+MAX_TOKENS = 32768
+ALLOWED_TOP_DIRS = {"grok", "shared", "docs", ".github", "pyproject.toml", "requirements.txt", "README.md", "LICENSE", "core", "agents", "clients"}
 
 SYSTEM_PROMPT = textwrap.dedent("""\
     You are Grok Code Fast 1 — the primary programmatic coder in a Grok-centric collaboration system.
 
     CRITICAL RULES:
     • You may ONLY modify files in grok/ and shared/
-    • Always output FULL file content in the exact format shown below
+    • Output each file you change in one of the two formats shown below
     • If you are unsure, stuck, or the problem requires high-level design/architecture → YOU MUST ASK FOR HELP
 
     WHEN TO ASK FOR HELP (mandatory):
@@ -61,108 +78,300 @@ SYSTEM_PROMPT = textwrap.dedent("""\
     Context files: shared/data_utils.py grok/quantizer.py
     ```
 
-    REQUIRED OUTPUT FORMAT when implementing:
+    REQUIRED OUTPUT FORMAT when implementing — new files, or rewrites of most of a file:
     ```python:shared/main.py
     # full new content
     ```
 
+    For small changes to an existing file, use SEARCH/REPLACE edits instead (much faster).
+    SEARCH must copy a few existing lines verbatim; several hunks may share one block:
+    ```edit:shared/main.py
+    <<<<<<< SEARCH
+    def add(a, b):
+        return a - b
+    =======
+    def add(a, b):
+        return a + b
+    >>>>>>> REPLACE
+    ```
+
     Begin work now.
 """).strip()
 
-# === ARGUMENTS ===
-parser = argparse.ArgumentParser()
-parser.add_argument("--description", required=True)
-parser.add_argument("--files", nargs="+", required=True)
-parser.add_argument("--task-id", required=True, help="Original task ID (e.g. task_010)")
-args = parser.parse_args()
 
-CURRENT_TASK_ID = args.task_id
-TASK_DESCRIPTION = args.description
-TARGET_FILES = [Path(p) for p in args.files]
+class ProtocolViolation(ValueError):
+    """A target path is outside the directories Grok Code Fast may write to."""
+
+
+@dataclass
+class GrokFastResult:
+    """Outcome of one run_task() call.
+
+    status is one of 'completed', 'help_requested', 'gemini_proposal',
+    'no_code' or 'error'; timings are seconds per phase.
+    """
+    task_id: str
+    status: str
+    files_written: list = field(default_factory=list)
+    help_request: dict = None
+    raw_output: str = ""
+    error: str = None
+    cache_key: str = None
+    timings: dict = field(default_factory=dict)
+    edits: EditStats = field(default_factory=EditStats)
+    failed_edits: list = field(default_factory=list)  # (path, reason) for edit blocks that did not apply
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("completed", "help_requested", "gemini_proposal")
+
 
 # === PROTOCOL SAFETY ===
-for p in TARGET_FILES:
-    try:
-        rel = p.relative_to(COLLAB_ROOT)
-        if rel.parts[0] not in {"grok", "shared", "docs", ".github", "pyproject.toml", "requirements.txt", "README.md", "LICENSE", "core", "agents", "clients"}:
-            print(f"PROTOCOL VIOLATION: Cannot write to {p}", file=sys.stderr)
-            sys.exit(1)
-    except ValueError:
-        print(f"PROTOCOL VIOLATION: Path {p} outside collaboration root", file=sys.stderr)
-        sys.exit(1)
+def check_target_files(target_files: list[Path], root: Path = COLLAB_ROOT):
+    """Raises ProtocolViolation unless every path is inside an allowed top-level directory."""
+    for p in target_files:
+        try:
+            rel = p.relative_to(root)
+        except ValueError:
+            raise ProtocolViolation(f"Path {p} outside collaboration root")
+        if rel.parts[0] not in ALLOWED_TOP_DIRS:
+            raise ProtocolViolation(f"Cannot write to {p}")
 
 # === COLLECT CURRENT FILE CONTENTS ===
-file_contexts = []
-for full_path in TARGET_FILES:
-    rel_path = full_path.relative_to(COLLAB_ROOT)
-    if full_path.exists():
-        content = full_path.read_text(encoding="utf-8")
-        lang = rel_path.suffix.lstrip(".") or "text"
-        file_contexts.append(f"### {rel_path}\n```{lang}\n{content.rstrip()}\n```")
-    else:
-        file_contexts.append(f"### {rel_path}  (NEW FILE)\n```text\n# File does not exist yet\n```")
-
-user_message = f"""TASK ID: {CURRENT_TASK_ID}
-TASK: {TASK_DESCRIPTION}
+def build_user_message(task_id: str, description: str, target_files: list[Path], root: Path = COLLAB_ROOT) -> str:
+    file_contexts = []
+    for full_path in target_files:
+        rel_path = full_path.relative_to(root)
+        if full_path.exists():
+            content = full_path.read_text(encoding="utf-8")
+            lang = rel_path.suffix.lstrip(".") or "text"
+            file_contexts.append(f"### {rel_path}\n```{lang}\n{content.rstrip()}\n```")
+        else:
+            file_contexts.append(f"### {rel_path}  (NEW FILE)\n```text\n# File does not exist yet\n```")
+
+    return f"""TASK ID: {task_id}
+TASK: {description}
 
 CURRENT FILES:
 {"".join(file_contexts)}
 """
 
 # === CALL GROK CODE FAST 1 ===
-payload = {
-    "messages": [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": user_message}
-    ],
-    "temperature": 0.15,
-    "max_tokens": 32768
-}
-
-try:
-    resp = requests.post(
-        os.getenv("OPENCODE_GROK_URL", "http://127.0.0.1:4242/v1/chat/completions"),
-        json=payload,
-        timeout=400
+def build_payload(user_message: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ],
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS
+    }
+
+def grok_urls(url=None) -> list:
+    """Endpoints to route between: `url` (one or a list), else OPENCODE_GROK_URL (comma-separated),
+    else `agents.grok-fast.endpoints` in config.yaml, else the local default."""
+    if url:
+        return [url] if isinstance(url, str) else list(url)
+    env = os.getenv("OPENCODE_GROK_URL")
+    if env:
+        return [u.strip() for u in env.split(",") if u.strip()]
+    return list(agent_config("grok-fast").get("endpoints") or [DEFAULT_GROK_URL])
+
+def grok_url(url=None) -> str:
+    """The primary endpoint, which also names the cache entries (replicas share them)."""
+    return grok_urls(url)[0]
+
+def cache_key(user_message: str, url: str = None) -> str:
+    return ResponseCache.key(grok_url(url), SYSTEM_PROMPT, user_message, TEMPERATURE, MAX_TOKENS)
+
+def call_grok(user_message: str, transport=None, url: str = None, timeout: float = 400) -> str:
+    def complete():
+        started = time.perf_counter()
+        response = (transport or get_transport()).post_json(
+            "grok-fast",
+            grok_urls(url),
+            build_payload(user_message),
+            timeout=timeout
+        )
+        content = response["choices"][0]["message"]["content"]
+        record_completion("grok-fast", estimate_tokens(content), time.perf_counter() - started)
+        return content
+
+    return get_cache().fetch(cache_key(user_message, url), complete)
+
+def stream_grok(user_message: str, transport=None, url: str = None, timeout: float = 400):
+    """Yields content deltas from a streaming (SSE) chat completion.
+
+    If the endpoint ignores "stream" and answers with plain JSON, the whole
+    message is yielded as a single chunk. A cached response is also yielded
+    as one chunk; a streamed one is cached only if it ran to completion.
+    Closing the generator aborts the request.
+    """
+    cache = get_cache()
+    key = cache_key(user_message, url)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    started = time.perf_counter()
+    lines = (transport or get_transport()).stream_lines(
+        "grok-fast",
+        grok_urls(url),
+        {**build_payload(user_message), "stream": True},
+        timeout=timeout
     )
-    resp.raise_for_status()
-    grok_output = resp.json()["choices"][0]["message"]["content"]
-except Exception as e:
-    print(f"Grok API error: {e}", file=sys.stderr)
-    sys.exit(1)
-
-# === DETECT HELP REQUEST OR AUTO-GEMINI ===
-if "gemini" in TASK_DESCRIPTION.lower() or "ui" in TASK_DESCRIPTION.lower() or "frontend" in TASK_DESCRIPTION.lower():
-    # Auto-consult Gemini 3.0 Pro instead of blocking
-    gemini_messages = [
-        {"role": "system", "content": "You are Gemini 3.0 Pro, expert in UX, frontend, API design, and Pydantic schemas."},
-        {"role": "user", "content": user_message}
-    ]
-    gemini_response = call_gemini_30_pro(gemini_messages)
-
-    # Save as proposal
-    proposal_path = COLLAB_ROOT / "shared" / "proposals" / f"gemini_auto_{CURRENT_TASK_ID}.py"
-    proposal_path.parent.mkdir(parents=True, exist_ok=True)
-    proposal_path.write_text(f"# Gemini 3.0 Pro auto-proposal for {CURRENT_TASK_ID}\n\n{gemini_response}")
-    print(f"Auto-consulted Gemini 3.0 Pro → proposal saved to {proposal_path}")
-    sys.exit(0)  # Let next orchestrator cycle merge
-
-help_request = re.search(r"```request_help\s*(.*?)\n(.*?)\n```", grok_output, re.DOTALL)
-if help_request:
-    question = help_request.group(1).strip().split("\n")[0]
-    context_line = help_request.group(2).strip()
-    context_files = re.findall(r'\S+', context_line.replace("Context files:", ""))
-
-    # Create new task for Grok 4.1
-    new_task_id = f"task_{int(CURRENT_TASK_ID.split('_')[1]) + 1:03d}"
+    body = []
+    deltas = []
+    saw_sse = False
+    complete = False
+    try:
+        for line in lines:
+            if line.startswith("data:"):
+                saw_sse = True
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    complete = True
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    deltas.append(delta)
+                    yield delta
+            elif not saw_sse:
+                body.append(line)
+        if not saw_sse and body:
+            deltas.append(json.loads("\n".join(body))["choices"][0]["message"]["content"])
+            complete = True
+            yield deltas[-1]
+        if complete:
+            content = "".join(deltas)
+            record_completion("grok-fast", estimate_tokens(content), time.perf_counter() - started)
+            cache.put(key, content)
+    finally:
+        lines.close()
+
+# === OUTPUT PARSING ===
+def parse_output(grok_output) -> list:
+    """Parses a response (string or chunks) into stream_parser events, rejecting unwritable paths."""
+    return parse_events(grok_output, allowed_top_dirs=ALLOWED_TOP_DIRS)
+
+def help_request_dict(event: HelpRequest) -> dict:
+    return {"question": event.question, "context_files": event.context_files}
+
+def parse_help_request(grok_output: str):
+    """Returns {'question', 'context_files'} if the output contains a request_help block."""
+    for event in parse_output(grok_output):
+        if isinstance(event, HelpRequest):
+            return help_request_dict(event)
+    return None
+
+def file_blocks(events: list) -> list[FileBlock]:
+    """The FileBlock events, reporting any rejected or unterminated blocks."""
+    blocks = []
+    for event in events:
+        if isinstance(event, FileBlock):
+            blocks.append(event)
+        elif isinstance(event, InvalidBlock):
+            print(f"  [Grok-Fast] Ignoring block ```{event.info}: {event.reason}")
+    return blocks
+
+def parse_code_blocks(grok_output: str) -> list[tuple[str, str]]:
+    """Returns (relative path, code) for every file block in the output."""
+    return [(block.path, block.body) for block in file_blocks(parse_output(grok_output))]
+
+def safe_target(rel_str: str, root: Path = COLLAB_ROOT):
+    """Absolute path for a block's relative path, or None if it escapes `root`."""
+    target = (root / rel_str).resolve()
+    try:
+        target.relative_to(root)
+    except ValueError:
+        print(f"SAFETY BLOCK: Attempted write outside root: {target}")
+        return None
+    return target
+
+def write_code_blocks(code_blocks: list[tuple[str, str]], root: Path = COLLAB_ROOT) -> list[str]:
+    written = []
+    for rel_str, code in code_blocks:
+        target = safe_target(rel_str, root)
+        if target is None:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(code.rstrip() + "\n", encoding="utf-8")
+        written.append(str(target.relative_to(root)))
+    return written
+
+def write_blocks(blocks: list[FileBlock], stats: EditStats, failed: list, root: Path = COLLAB_ROOT) -> list[str]:
+    """Writes full-content and edit blocks.
+
+    An edit block is applied all-or-nothing; if any hunk does not match, the
+    file is left untouched and (path, reason) is appended to `failed`.
+    """
+    written = []
+    for block in blocks:
+        rel_str, body = block.path, block.body
+        if not block.is_edit:
+            stats.full_blocks += 1
+            stats.output_tokens += estimate_tokens(body)
+            stats.full_file_tokens += estimate_tokens(body)
+            written += write_code_blocks([(rel_str, body)], root)
+            continue
+        stats.edit_blocks += 1
+        stats.output_tokens += estimate_tokens(body)
+        target = safe_target(rel_str, root)
+        if target is None:
+            continue
+        try:
+            hunks = parse_hunks(body)
+            current = target.read_text(encoding="utf-8") if target.exists() else ""
+            new_text, fuzzy = apply_hunks(current, hunks)
+        except EditError as e:
+            print(f"  [Grok-Fast] Edit for {rel_str} did not apply: {e}")
+            stats.failed_blocks += 1
+            failed.append((rel_str, str(e)))
+            continue
+        stats.hunks += len(hunks)
+        stats.fuzzy_hunks += fuzzy
+        stats.full_file_tokens += estimate_tokens(new_text)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(new_text, encoding="utf-8")
+        written.append(str(target.relative_to(root)))
+    return written
+
+def request_full_content(result: GrokFastResult, task_id: str, description: str, transport=None,
+                         root: Path = COLLAB_ROOT):
+    """Asks Grok again for the full content of files whose edit blocks did not apply.
+
+    Clears result.failed_edits for every file that comes back as a full block.
+    """
+    failed = dict(result.failed_edits)
+    print(f"  [Grok-Fast] Requesting full content for {', '.join(failed)}")
+    reasons = "\n".join(f"- {rel}: {reason}" for rel, reason in failed.items())
+    note = (f"{description}\n\nYOUR PREVIOUS EDIT BLOCKS DID NOT APPLY:\n{reasons}\n"
+            "Reply with the FULL new content of these files (no edit blocks).")
+    targets = [root / rel for rel in failed]
+    user_message = build_user_message(task_id, note, targets, root)
+    output = call_grok(user_message, transport=transport)
+    result.edits.fallbacks += 1
+    blocks = [block for block in file_blocks(parse_output(output)) if not block.is_edit and block.path in failed]
+    if not blocks:
+        get_cache().discard(cache_key(user_message))
+    result.files_written += write_blocks(blocks, result.edits, [], root)
+    done = {block.path for block in blocks}
+    result.failed_edits = [(rel, reason) for rel, reason in result.failed_edits if rel not in done]
+
+# === HELP REQUESTS ===
+def create_help_task(task_id: str, description: str, question: str, context_files: list[str]) -> dict:
+    """Creates the Grok 4.1 task and prompt for a help request and blocks the original task."""
+    new_task_id = f"task_{int(task_id.split('_')[1]) + 1:03d}"
     new_task = {
         "task_id": new_task_id,
-        "description": f"[HELP REQUEST from {CURRENT_TASK_ID}] {question}\n\nOriginal task: {TASK_DESCRIPTION}\n\nRelevant files: {', '.join(context_files)}",
+        "description": f"[HELP REQUEST from {task_id}] {question}\n\nOriginal task: {description}\n\nRelevant files: {', '.join(context_files)}",
         "assignee": "grok-4.1",
         "files": [str(Path(f).relative_to(COLLAB_ROOT)) for f in context_files if Path(f).exists()],
         "status": "pending",
         "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
-        "depends_on": CURRENT_TASK_ID
+        "depends_on": [],  # the original task waits on this one (blocked_by), not the other way round
+        "help_for": task_id
     }
 
     task_file = TASKS_DIR / f"{new_task_id}.json"
@@ -171,7 +380,7 @@ if help_request:
     print(f"Question: {question}")
 
     # Update original task to blocked
-    orig_task_file = TASKS_DIR / f"{CURRENT_TASK_ID}.json"
+    orig_task_file = TASKS_DIR / f"{task_id}.json"
     if orig_task_file.exists():
         orig = json.loads(orig_task_file.read_text())
         orig["status"] = "blocked"
@@ -182,7 +391,7 @@ if help_request:
     prompt_path = PROMPTS_DIR / f"grok41_prompt_{new_task_id}.txt"
     prompt_path.write_text(f"""Grok 4.1 Consultant Request ({new_task_id})
 
-Original task blocked: {CURRENT_TASK_ID}
+Original task blocked: {task_id}
 Question from Grok Code Fast 1:
 
 {question}
@@ -193,43 +402,13 @@ Relevant context files attached (or below):
 Please provide architectural guidance, algorithm selection, or design decision.
 """)
     print(f"Ready for Grok 4.1 → prompt saved to {prompt_path}")
-    sys.exit(0)
-
-# === NORMAL IMPLEMENTATION PATH ===
-code_blocks = re.findall(r"```(?:\w+:)?([^\n`]+)\n(.*?)\n```", grok_output, re.DOTALL)
-if not code_blocks:
-    print("No valid code blocks found. Raw output:")
-    print(grok_output)
-    sys.exit(1)
-
-written = []
-for rel_str, code in code_blocks:
-    rel_str = rel_str.strip()
-    if ":" in rel_str:
-        rel_str = rel_str.split(":", 1)[1]
-    target = (COLLAB_ROOT / rel_str).resolve()
-
-    # Final safety
-    try:
-        target.relative_to(COLLAB_ROOT)
-    except ValueError:
-        print(f"SAFETY BLOCK: Attempted write outside root: {target}")
-        continue
-
-    target.parent.mkdir(parents=True, exist_ok=True)
-    target.write_text(code.rstrip() + "\n", encoding="utf-8")
-    written.append(str(target.relative_to(COLLAB_ROOT)))
+    return new_task
 
 def generate_gemini_prompt(task_id: str, goal: str):
-    context = []
-    for path in Path(COLLAB_ROOT).rglob("*.py"):
-        if "gemini/" in str(path) or "shared/" in str(path):
-            rel = path.relative_to(COLLAB_ROOT)
-            try:
-                content = path.read_text(encoding="utf-8")
-                context.append(f"File: {rel}\n```python\n{content}\n```")
-            except:
-                pass
+    snapshot = get_snapshot(COLLAB_ROOT)
+    context = assemble_context(
+        snapshot, snapshot.files(["gemini", "shared"], suffix=".py"),
+        render=lambda rel, content: f"File: {rel}\n```python\n{content}\n```\n\n")
 
     prompt = f"""You are Gemini 3.0 Pro. Task: {goal}
 Relevant files attached.
@@ -240,11 +419,201 @@ Please output ONLY submittable code proposals using this format:
 """
 
     prompt_path = PROMPTS_DIR / f"gemini_{task_id}.md"
-    prompt_path.write_text(prompt + "\n\n" + "\n\n".join(context))
+    prompt_path.write_text(prompt + "\n\n" + context.text)
     print(f"Gemini prompt ready: {prompt_path}")
 
-print("Task completed successfully by Grok Code Fast 1")
-print("Files updated:", ", ".join(written))
-
-# Commit changes
-git_commit_changes(f"Task {CURRENT_TASK_ID}: {TASK_DESCRIPTION[:60]}", author="grok-fast")
\ No newline at end of file
+# === TASK EXECUTION ===
+def wants_gemini(description: str) -> bool:
+    description = description.lower()
+    return "gemini" in description or "ui" in description or "frontend" in description
+
+def stream_into(result: GrokFastResult, user_message: str, flush: bool = True, transport=None,
+                root: Path = COLLAB_ROOT) -> int:
+    """Streams Grok's answer into `result`, writing each file block as soon as it closes.
+
+    Stops reading (which aborts the generation) as soon as a request_help block
+    is complete. Files written before an error are kept and listed in
+    result.files_written. Returns the number of file blocks seen.
+    """
+    started = time.perf_counter()
+    parser = FenceStreamParser(allowed_top_dirs=ALLOWED_TOP_DIRS)
+    chunks = []
+    blocks = 0
+
+    def handle(events) -> bool:
+        """Writes completed file blocks; returns True once a help request has arrived."""
+        nonlocal blocks
+        for event in events:
+            if isinstance(event, HelpRequest):
+                result.help_request = help_request_dict(event)
+                return True
+            for block in file_blocks([event]):
+                blocks += 1
+                if flush:
+                    result.files_written += write_blocks([block], result.edits, result.failed_edits, root)
+                    result.timings.setdefault("first_file", time.perf_counter() - started)
+        return False
+
+    stream = stream_grok(user_message, transport=transport)
+    try:
+        for delta in stream:
+            chunks.append(delta)
+            if handle(parser.feed(delta)):
+                print("  [Grok-Fast] Help request received, aborting generation early")
+                return blocks
+        handle(parser.close())
+        return blocks
+    finally:
+        stream.close()
+        result.raw_output = "".join(chunks)
+
+def run_task(task_id: str, description: str, files: list, transport=None,
+             commit: bool = True, stream: bool = None, root: Path = None) -> GrokFastResult:
+    """Runs one task end to end: prompt, Grok call, help/Gemini detection, file writes, commit.
+
+    With `stream` (default: agents.grok-fast.stream in config.yaml) the answer
+    is streamed and file blocks are written as they complete. `root` is the
+    checkout the task's files live in (default: the collaboration root), e.g.
+    a per-task git worktree; help tasks and Gemini proposals still go to the
+    collaboration root, where the orchestrator picks them up.
+    """
+    root = Path(root).resolve() if root else COLLAB_ROOT
+    result = GrokFastResult(task_id=task_id, status="error")
+    started = time.perf_counter()
+    phase_start, phase_start_ns = started, time.time_ns()
+
+    def mark(phase):
+        nonlocal phase_start, phase_start_ns
+        now, now_ns = time.perf_counter(), time.time_ns()
+        result.timings[phase] = now - phase_start
+        record_span(phase, phase_start_ns, now_ns, agent="grok-fast")  # child of the task's span
+        phase_start, phase_start_ns = now, now_ns
+
+    target_files = [Path(p).resolve() for p in files]
+    try:
+        check_target_files(target_files, root)
+    except ProtocolViolation as e:
+        result.error = f"PROTOCOL VIOLATION: {e}"
+        print(result.error, file=sys.stderr)
+        return result
+
+    user_message = build_user_message(task_id, description, target_files, root)
+    result.cache_key = cache_key(user_message)
+    mark("prompt")
+
+    if stream is None:
+        stream = bool(agent_config("grok-fast").get("stream", False))
+    streamed_blocks = None
+    try:
+        if stream:
+            # Gemini-routed tasks discard Grok's files, so don't write them early
+            streamed_blocks = stream_into(result, user_message, flush=not wants_gemini(description),
+                                          transport=transport, root=root)
+        else:
+            result.raw_output = call_grok(user_message, transport=transport)
+    except Exception as e:
+        result.error = f"Grok API error: {e}"
+        print(result.error, file=sys.stderr)
+        return result
+    grok_output = result.raw_output
+    mark("llm")
+
+    # === DETECT HELP REQUEST OR AUTO-GEMINI ===
+    if wants_gemini(description):
+        # Auto-consult Gemini 3.0 Pro instead of blocking
+        gemini_messages = [
+            {"role": "system", "content": "You are Gemini 3.0 Pro, expert in UX, frontend, API design, and Pydantic schemas."},
+            {"role": "user", "content": user_message}
+        ]
+        gemini_response = call_gemini_30_pro(gemini_messages)
+
+        # Save as proposal
+        proposal_path = COLLAB_ROOT / "shared" / "proposals" / f"gemini_auto_{task_id}.py"
+        proposal_path.parent.mkdir(parents=True, exist_ok=True)
+        proposal_path.write_text(f"# Gemini 3.0 Pro auto-proposal for {task_id}\n\n{gemini_response}")
+        print(f"Auto-consulted Gemini 3.0 Pro → proposal saved to {proposal_path}")
+        result.status = "gemini_proposal"
+        result.files_written = [str(proposal_path.relative_to(COLLAB_ROOT))]
+        mark("gemini")
+        result.timings["total"] = time.perf_counter() - started
+        return result  # Let next orchestrator cycle merge
+
+    events = None if stream else parse_output(grok_output)
+    if stream:
+        help_request = result.help_request
+    else:
+        help_request = next((help_request_dict(e) for e in events if isinstance(e, HelpRequest)), None)
+    if help_request:
+        new_task = create_help_task(task_id, description, help_request["question"], help_request["context_files"])
+        result.status = "help_requested"
+        result.help_request = {**help_request, "task_id": new_task["task_id"]}
+        mark("parse")
+        result.timings["total"] = time.perf_counter() - started
+        return result
+
+    # === NORMAL IMPLEMENTATION PATH ===
+    code_blocks = None if stream else file_blocks(events)
+    mark("parse")
+    if not (streamed_blocks if stream else code_blocks):
+        print("No valid code blocks found. Raw output:")
+        print(grok_output)
+        get_cache().discard(result.cache_key)  # so the retry asks the model again
+        result.status = "no_code"
+        result.error = "No valid code blocks found"
+        return result
+
+    if not stream:
+        result.files_written = write_blocks(code_blocks, result.edits, result.failed_edits, root)
+        mark("write")
+    if result.failed_edits:
+        try:
+            request_full_content(result, task_id, description, transport=transport, root=root)
+        except Exception as e:
+            print(f"  [Grok-Fast] Full-content fallback failed: {e}", file=sys.stderr)
+        mark("fallback")
+    if result.edits.edit_blocks:
+        stats = result.edits
+        print(f"  [Grok-Fast] {stats.edit_blocks} edit block(s), {stats.hunks} hunk(s) "
+              f"({stats.fuzzy_hunks} fuzzy, {stats.fallbacks} fallback): ~{stats.tokens_saved} output tokens saved")
+    if result.failed_edits:
+        get_cache().discard(result.cache_key)  # don't replay edits that cannot apply
+        result.error = "Edits did not apply: " + ", ".join(rel for rel, _ in result.failed_edits)
+        result.timings["total"] = time.perf_counter() - started
+        return result
+    result.status = "completed"
+
+    print("Task completed successfully by Grok Code Fast 1")
+    print("Files updated:", ", ".join(result.files_written))
+
+    if commit:
+        # Commit only the files this task wrote
+        message = f"Task {task_id}: {description[:60]}"
+        if root == COLLAB_ROOT:
+            if not git_commit_changes(message, author="grok-fast", paths=result.files_written, task_id=task_id):
+                result.status = "error"
+                result.error = "Commit failed"
+        else:
+            # A task worktree is on its own branch, so it is committed straight away
+            commit_paths(result.files_written, message, author="grok-fast", root=root)
+        mark("commit")
+    result.timings["total"] = time.perf_counter() - started
+    return result
+
+# === CLI ===
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--description", required=True)
+    parser.add_argument("--files", nargs="+", required=True)
+    parser.add_argument("--task-id", required=True, help="Original task ID (e.g. task_010)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses (fresh ones are still stored)")
+    args = parser.parse_args(argv)
+
+    if args.no_cache:
+        get_cache().bypass = True
+
+    result = run_task(args.task_id, args.description, args.files)
+    flush_telemetry()
+    return 0 if result.ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
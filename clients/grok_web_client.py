@@ -1,12 +1,26 @@
 # grok_web_client.py - Placeholder for Grok 4 web API client (when xAI API is released)
 
 import os
-import requests
+import sys
+import time
 
-def call_grok_web_api(prompt: str, temperature: float = 0.2) -> str:
-    """Placeholder for direct call to Grok 4 web API (when available)"""
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from clients.cache import get_cache, ResponseCache
+from clients.edit_protocol import estimate_tokens
+from clients.transport import get_transport
+from core.metrics import record_completion
+
+def call_grok_web_api(prompt: str, temperature: float = 0.2, timeout: float = None) -> str:
+    """Placeholder for direct call to Grok 4 web API (when available)
+
+    Goes through the shared transport, so it is pooled, concurrency-limited
+    under the "grok-web" backend and always has a timeout (from config.yaml
+    `transport.backends.grok-web.timeout` unless given).
+    """
     # TODO: Replace with actual xAI API endpoint when released
-    api_url = os.getenv("GROK_WEB_API_URL", "https://api.x.ai/v1/chat/completions")  # Placeholder
+    api_url = os.getenv("GROK_WEB_API_URL", "https://api.x.ai/v1/chat/completions")  # Placeholder; comma-separated for failover
+    api_urls = [u.strip() for u in api_url.split(",") if u.strip()]
     api_key = os.getenv("GROK_WEB_API_KEY")
 
     if not api_key:
@@ -20,9 +34,15 @@ def call_grok_web_api(prompt: str, temperature: float = 0.2) -> str:
 
     headers = {"Authorization": f"Bearer {api_key}"}
 
-    response = requests.post(api_url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
+    def complete():
+        started = time.perf_counter()
+        response = get_transport().post_json("grok-web", api_urls, payload, headers=headers, timeout=timeout)
+        content = response["choices"][0]["message"]["content"]
+        record_completion("grok-4.1", estimate_tokens(content), time.perf_counter() - started)
+        return content
+
+    key = ResponseCache.key(api_urls[0], "", prompt, temperature, payload["max_tokens"])
+    return get_cache().fetch(key, complete)
 
 if __name__ == "__main__":
     import sys
@@ -34,4 +54,4 @@ if __name__ == "__main__":
         result = call_grok_web_api(prompt)
         print(result)
     except Exception as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
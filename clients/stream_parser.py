@@ -0,0 +1,194 @@
+# stream_parser.py - Single-pass parser turning (streamed) LLM output into typed events
+#
+# One state machine replaces the separate request_help / fence regexes: it
+# reads the answer once, line by line, whether it arrives as one string or
+# as SSE deltas, and emits
+#
+#   Prose        text between blocks
+#   FileBlock    ```lang:path or ```edit:path with a validated relative path
+#   HelpRequest  ```request_help
+#   Snippet      a fence with only a language tag (```python), never written
+#   InvalidBlock a block with a rejected path, or one left unterminated
+#
+# Fences follow CommonMark: a block opened with N backticks closes on a line
+# of at least N backticks and nothing else. Inside a block, a path-less
+# opening fence (```bash in a README) starts a nested fence, so its closing
+# ``` does not end the outer block.
+import re
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+
+HELP_TAG = "request_help"
+_FENCE = re.compile(r"^ {0,3}(`{3,})\s*([^`]*?)\s*$")
+
+
+@dataclass
+class Prose:
+    text: str
+
+
+@dataclass
+class FileBlock:
+    path: str    # validated, normalized relative path
+    lang: str    # "python", "edit", ... ("" if the info string was just a path)
+    body: str
+    info: str
+
+    @property
+    def is_edit(self) -> bool:
+        return self.lang == "edit"
+
+
+@dataclass
+class HelpRequest:
+    question: str
+    context_files: list = field(default_factory=list)
+    body: str = ""
+
+
+@dataclass
+class Snippet:
+    lang: str
+    body: str
+
+
+@dataclass
+class InvalidBlock:
+    info: str
+    body: str
+    reason: str
+
+
+def split_info(info: str):
+    """Splits a fence info string into (lang, path); path is None for a bare language tag.
+
+    'python:shared/a.py' -> ('python', 'shared/a.py'), 'shared/a.py' -> ('', 'shared/a.py'),
+    'python' -> ('python', None). Anything after the first whitespace is ignored.
+    """
+    info = info.strip()
+    token = info.split(None, 1)[0] if info else ""
+    if ":" in token:
+        lang, path = token.split(":", 1)
+        return lang, path
+    if "/" in token or "." in token:
+        return "", token
+    return token, None
+
+
+def validate_path(path: str, allowed_top_dirs=None) -> str:
+    """Returns the normalized relative path, or raises ValueError explaining why it is unsafe."""
+    if not path or "\0" in path or "\\" in path:
+        raise ValueError("empty or malformed path")
+    pure = PurePosixPath(path)
+    if pure.is_absolute() or path.startswith("~"):
+        raise ValueError("absolute path")
+    parts = [p for p in pure.parts if p != "."]
+    if not parts or ".." in parts:
+        raise ValueError("path escapes the repository")
+    if allowed_top_dirs is not None and parts[0] not in allowed_top_dirs:
+        raise ValueError(f"'{parts[0]}' is not a writable top-level directory")
+    return "/".join(parts)
+
+
+def parse_help(body: str) -> HelpRequest:
+    """The first line is the question; the rest lists context files ('Context files: a.py b.py')."""
+    lines = body.strip().split("\n")
+    question = lines[0].strip() if lines else ""
+    rest = " ".join(lines[1:]).replace("Context files:", "")
+    return HelpRequest(question=question, context_files=rest.split(), body=body)
+
+
+class FenceStreamParser:
+    """Incremental parser; feed() accepts chunks that may end mid-line.
+
+    feed() and close() return the events completed so far. Total work is
+    linear in the input: chunks are buffered until a newline arrives and
+    block bodies are joined once, when they close.
+    """
+
+    def __init__(self, allowed_top_dirs=None):
+        self.allowed_top_dirs = allowed_top_dirs
+        self._partial = []   # pieces of the current unterminated line
+        self._prose = []
+        self._fence = None   # backtick run that opened the current block
+        self._info = None
+        self._lines = []
+        self._nested = []    # fences opened inside the current block
+
+    @property
+    def in_block(self) -> bool:
+        return self._fence is not None
+
+    def _flush_prose(self, events):
+        if self._prose:
+            text = "\n".join(self._prose)
+            if text.strip():
+                events.append(Prose(text))
+            self._prose = []
+
+    def _block(self, info, body):
+        lang, path = split_info(info)
+        if lang == HELP_TAG:
+            return parse_help(body)
+        if path is None:
+            return Snippet(lang, body)
+        try:
+            return FileBlock(validate_path(path, self.allowed_top_dirs), lang, body, info)
+        except ValueError as e:
+            return InvalidBlock(info, body, str(e))
+
+    def _line(self, line, events):
+        match = _FENCE.match(line) if "```" in line else None
+        if self._fence is None:
+            if match and match.group(2):
+                self._flush_prose(events)
+                self._fence, self._info, self._lines, self._nested = match.group(1), match.group(2), [], []
+            else:
+                self._prose.append(line)
+            return
+        if match:
+            ticks, info = match.groups()
+            if self._nested:
+                if not info and len(ticks) >= len(self._nested[-1]):
+                    self._nested.pop()
+            elif not info and len(ticks) >= len(self._fence):
+                events.append(self._block(self._info, "\n".join(self._lines)))
+                self._fence = self._info = None
+                return
+            elif info and split_info(info)[1] is None and info != HELP_TAG:
+                self._nested.append(ticks)
+        self._lines.append(line)
+
+    def feed(self, chunk: str) -> list:
+        events = []
+        if "\n" not in chunk:
+            self._partial.append(chunk)
+            return events
+        self._partial.append(chunk)
+        lines = "".join(self._partial).split("\n")
+        self._partial = [lines.pop()]
+        for line in lines:
+            self._line(line, events)
+        return events
+
+    def close(self) -> list:
+        """Flushes the last line; an unterminated block becomes an InvalidBlock."""
+        events = []
+        tail = "".join(self._partial)
+        self._partial = []
+        if tail:
+            self._line(tail, events)
+        if self._fence is not None:
+            events.append(InvalidBlock(self._info, "\n".join(self._lines), "unterminated fence"))
+            self._fence = self._info = None
+        self._flush_prose(events)
+        return events
+
+
+def parse_events(source, allowed_top_dirs=None) -> list:
+    """Parses a whole response (a string) or an iterable of chunks into events."""
+    parser = FenceStreamParser(allowed_top_dirs)
+    events = []
+    for chunk in [source] if isinstance(source, str) else source:
+        events += parser.feed(chunk)
+    return events + parser.close()
@@ -0,0 +1,462 @@
+# transport.py - Shared pooled LLM transport: asyncio core with a sync facade
+#
+# All clients/ send their LLM calls through one LLMTransport. It owns an
+# event loop on a background thread, one connection pool per endpoint and a
+# semaphore per backend ("grok-fast", "grok-web", "gemini", ...), so a parallel
+# orchestrator can run dozens of completions over a handful of sockets
+# without any backend exceeding its concurrency limit.
+#
+# A call given a list of endpoint URLs is routed by their recent latency and
+# failures. With `hedge_percentile` set for the backend and at least two
+# distinct endpoints, a duplicate goes to the next endpoint once the first
+# has taken longer than that percentile of its recent latencies; the first
+# valid answer wins and the other request is cancelled. An endpoint that
+# errors fails over to the next one.
+
+import asyncio
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.metrics import LLM_FAILOVERS, LLM_HEDGES, LLM_LATENCY, LLM_REQUESTS
+
+try:
+    import httpx
+except ImportError:  # fall back to requests on the loop's thread pool
+    httpx = None
+
+DEFAULT_BACKEND = {"max_in_flight": 8, "max_connections": 4, "timeout": 400,
+                   "hedge_percentile": None, "hedge_min_delay": 1.0, "hedge_default_delay": 30.0}
+MIN_LATENCY_SAMPLES = 5  # before this many, hedges wait hedge_default_delay
+
+
+class TransportError(RuntimeError):
+    """The endpoint returned an HTTP error or an unreadable body."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class EndpointStats:
+    """Recent latencies and the failure streak of one endpoint.
+
+    `kind` separates full responses ("response") from streams, which are
+    timed to their first line ("first_byte").
+    """
+
+    def __init__(self, window: int = 100, alpha: float = 0.2):
+        self.alpha = alpha
+        self.samples = {}  # kind -> deque of recent latencies
+        self.ewma = {}     # kind -> smoothed latency
+        self._window = window
+        self.failures = 0  # consecutive
+        self.stats = {"ok": 0, "errors": 0, "cancelled": 0}
+
+    def _sample(self, kind: str, seconds: float):
+        self.samples.setdefault(kind, deque(maxlen=self._window)).append(seconds)
+        previous = self.ewma.get(kind)
+        self.ewma[kind] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def record(self, kind: str, seconds: float):
+        self._sample(kind, seconds)
+        self.failures = 0
+        self.stats["ok"] += 1
+
+    def record_cancelled(self, kind: str, seconds: float):
+        """A request that lost a hedge took at least `seconds`; counting that keeps a slow endpoint ranked low."""
+        self._sample(kind, seconds)
+        self.stats["cancelled"] += 1
+
+    def record_failure(self):
+        self.failures += 1
+        self.stats["errors"] += 1
+
+    def percentile(self, kind: str, q: float):
+        """The q-th quantile of recent latencies, or None with too few samples."""
+        samples = sorted(self.samples.get(kind, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def weight(self, kind: str, default_latency: float) -> float:
+        """Routing weight: inverse latency, halved for each consecutive failure."""
+        latency = self.ewma.get(kind, default_latency)
+        return 1.0 / max(latency, 1e-3) * 0.5 ** min(self.failures, 10)
+
+
+class LLMTransport:
+    """Connection pools per endpoint plus bounded concurrency per backend.
+
+    Coroutines (apost_json, arun) run on the transport's own event loop; the
+    sync methods (post_json, run) submit to that loop and block the calling
+    thread, which is what the orchestrator's worker threads use. `url` may be
+    a list of equivalent endpoints (see the module comment).
+    """
+
+    def __init__(self, backends: dict = None):
+        if backends is None:
+            from core.config import load_config  # imported here: core imports clients at load time
+            backends = (load_config().get("transport") or {}).get("backends") or {}
+        self.backends = backends
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._semaphores = {}  # backend -> asyncio.Semaphore
+        self._pools = {}       # endpoint origin -> httpx.AsyncClient / requests.Session
+        self.stats = {}        # backend -> {"requests", "errors", "in_flight", "peak_in_flight", "seconds"}
+        self.endpoints = {}    # url -> EndpointStats
+        self._rng = random.Random()
+
+    def settings(self, backend: str) -> dict:
+        return {**DEFAULT_BACKEND, **(self.backends.get(backend) or {})}
+
+    # --- Event loop ---
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-transport", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _submit(self, coro):
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Use the async methods from inside the transport loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _semaphore(self, backend):
+        if backend not in self._semaphores:
+            self._semaphores[backend] = asyncio.Semaphore(int(self.settings(backend)["max_in_flight"]))
+            self.stats[backend] = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0, "seconds": 0.0}
+        return self._semaphores[backend]
+
+    async def _bounded(self, backend, make_awaitable):
+        async with self._semaphore(backend):
+            stats = self.stats[backend]
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await make_awaitable()
+                outcome = "ok"
+                return result
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+                stats["seconds"] += time.perf_counter() - started
+                self._observe(backend, started, outcome)
+
+    @staticmethod
+    def _observe(backend, started, outcome):
+        LLM_LATENCY.observe(time.perf_counter() - started, backend=backend)
+        LLM_REQUESTS.inc(backend=backend, outcome=outcome)
+
+    # --- Endpoint routing and hedging ---
+
+    def endpoint(self, url: str) -> EndpointStats:
+        stats = self.endpoints.get(url)
+        if stats is None:
+            stats = self.endpoints[url] = EndpointStats()
+        return stats
+
+    def rank_endpoints(self, urls, kind: str = "response") -> list:
+        """`urls` in the order to try them: a weighted random pick first, then by weight.
+
+        Endpoints without latency samples get the best known weight, so they are tried.
+        """
+        urls = list(dict.fromkeys(urls))
+        known = [self.endpoint(u).ewma[kind] for u in urls if kind in self.endpoint(u).ewma]
+        default = min(known, default=1.0)
+        weights = {u: self.endpoint(u).weight(kind, default) for u in urls}
+        first = self._rng.choices(urls, weights=[weights[u] for u in urls])[0]
+        return [first] + sorted((u for u in urls if u != first), key=weights.get, reverse=True)
+
+    def hedge_delay(self, backend: str, url: str, kind: str = "response"):
+        """Seconds to wait on `url` before sending a hedged duplicate; None if hedging is off."""
+        settings = self.settings(backend)
+        if not settings.get("hedge_percentile"):
+            return None
+        delay = self.endpoint(url).percentile(kind, float(settings["hedge_percentile"]))
+        if delay is None:
+            delay = float(settings["hedge_default_delay"])
+        return max(delay, float(settings["hedge_min_delay"]))
+
+    async def _race(self, backend, urls, kind, attempt, discard=None):
+        """Runs `attempt(url)` on the ranked endpoints and returns the first successful result.
+
+        With two or more endpoints, one hedged duplicate is started on the
+        next when the first attempt outlasts hedge_delay() (a duplicate to
+        the same server would only add to its load); a failed attempt fails
+        over to the next endpoint. The
+        losing attempt is cancelled, and a result that arrives too late is
+        passed to `discard`.
+        """
+        ranked = self.rank_endpoints(urls, kind)
+        delay = self.hedge_delay(backend, ranked[0], kind) if len(ranked) > 1 else None
+        pending = {}  # task -> url
+        errors = []
+
+        async def timed(url):
+            started = time.perf_counter()
+            try:
+                result = await attempt(url)
+            except asyncio.CancelledError:
+                self.endpoint(url).record_cancelled(kind, time.perf_counter() - started)
+                raise
+            except Exception:
+                self.endpoint(url).record_failure()
+                raise
+            self.endpoint(url).record(kind, time.perf_counter() - started)
+            return result
+
+        def launch():
+            url = ranked.pop(0)
+            pending[asyncio.ensure_future(timed(url))] = url
+
+        def drop(task):
+            if discard and not task.cancelled() and task.exception() is None:
+                discard(task.result())
+
+        launch()
+        primary = next(iter(pending))
+        hedged = False
+        try:
+            while pending:
+                timeout = delay if not hedged and ranked else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    for task in done - {winner}:
+                        drop(task)
+                    if hedged:
+                        LLM_HEDGES.inc(backend=backend, winner="primary" if winner is primary else "hedge")
+                    return winner.result()
+                for task in done:
+                    errors.append(task.exception())
+                    pending.pop(task)
+                if ranked:
+                    LLM_FAILOVERS.inc(backend=backend)
+                    launch()
+            raise errors[-1]
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                    task.add_done_callback(drop)
+
+    # --- Connection pools ---
+
+    def _pool(self, backend, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        pool = self._pools.get(origin)
+        if pool is None:
+            size = int(self.settings(backend)["max_connections"])
+            if httpx is not None:
+                try:
+                    import h2  # noqa: F401  (lets many requests share one connection)
+                    http2 = True
+                except ImportError:
+                    http2 = False
+                pool = httpx.AsyncClient(http2=http2, limits=httpx.Limits(
+                    max_connections=size, max_keepalive_connections=size))
+            else:
+                import requests
+                pool = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
+                pool.mount(origin, adapter)
+            self._pools[origin] = pool
+        return pool
+
+    async def _post(self, backend, url, payload, headers, timeout):
+        pool = self._pool(backend, url)
+        if httpx is not None:
+            # The pool wait counts against the same timeout as the request
+            resp = await pool.post(url, json=payload, headers=headers, timeout=httpx.Timeout(timeout))
+            status, text = resp.status_code, resp.text
+        else:
+            loop = asyncio.get_running_loop()
+            resp = await loop.run_in_executor(None, lambda: pool.post(url, json=payload, headers=headers, timeout=timeout))
+            status, text = resp.status_code, resp.text
+        if status >= 400:
+            raise TransportError(f"{status} error from {url}: {text[:200]}", status_code=status)
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise TransportError(f"Invalid JSON from {url}: {e}", status_code=status)
+
+    # --- Public API ---
+
+    async def apost_json(self, backend: str, url, payload: dict, headers: dict = None, timeout: float = None) -> dict:
+        """POSTs JSON under the backend's concurrency limit and returns the decoded response.
+
+        With a list of URLs the request is routed, hedged and failed over between them.
+        """
+        timeout = timeout or float(self.settings(backend)["timeout"])
+        if isinstance(url, (list, tuple)):
+            return await self._race(backend, url, "response",
+                                    lambda u: self._bounded(backend, lambda: self._post(backend, u, payload, headers, timeout)))
+        return await self._bounded(backend, lambda: self._post(backend, url, payload, headers, timeout))
+
+    async def arun(self, backend: str, fn, *args, **kwargs):
+        """Runs a blocking SDK call (e.g. google.generativeai) under the backend's limit."""
+        loop = asyncio.get_running_loop()
+        return await self._bounded(backend, lambda: loop.run_in_executor(None, lambda: fn(*args, **kwargs)))
+
+    async def astream_lines(self, backend: str, url: str, payload: dict, headers: dict = None, timeout: float = None):
+        """POSTs JSON and yields the response body line by line as it arrives (e.g. SSE).
+
+        The backend's concurrency slot is held until the stream is exhausted or closed;
+        closing the generator early aborts the request.
+        """
+        timeout = timeout or float(self.settings(backend)["timeout"])
+        async with self._semaphore(backend):
+            stats = self.stats[backend]
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+            started = time.perf_counter()
+            outcome = "aborted"  # closed early, e.g. on a help request
+            try:
+                async for line in self._stream(backend, url, payload, headers, timeout):
+                    yield line
+                outcome = "ok"
+            except Exception:
+                outcome = "error"
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+                stats["seconds"] += time.perf_counter() - started
+                self._observe(backend, started, outcome)
+
+    async def astream_hedged(self, backend: str, urls, payload: dict, headers: dict = None, timeout: float = None):
+        """astream_lines() over a list of endpoints, racing them on the first line like apost_json()."""
+        async def first_line(url):
+            lines = self.astream_lines(backend, url, payload, headers, timeout)
+            try:
+                return lines, await lines.__anext__()
+            except StopAsyncIteration:
+                raise TransportError(f"Empty response from {url}")
+
+        def close(result):
+            asyncio.ensure_future(result[0].aclose())
+
+        lines, first = await self._race(backend, urls, "first_byte", first_line, discard=close)
+        try:
+            yield first
+            async for line in lines:
+                yield line
+        finally:
+            await lines.aclose()
+
+    async def _stream(self, backend, url, payload, headers, timeout):
+        pool = self._pool(backend, url)
+        if httpx is not None:
+            async with pool.stream("POST", url, json=payload, headers=headers, timeout=httpx.Timeout(timeout)) as resp:
+                if resp.status_code >= 400:
+                    text = (await resp.aread()).decode("utf-8", "replace")
+                    raise TransportError(f"{resp.status_code} error from {url}: {text[:200]}", status_code=resp.status_code)
+                async for line in resp.aiter_lines():
+                    yield line
+            return
+
+        loop = asyncio.get_running_loop()
+        resp = await loop.run_in_executor(None, lambda: pool.post(url, json=payload, headers=headers, timeout=timeout, stream=True))
+        try:
+            if resp.status_code >= 400:
+                raise TransportError(f"{resp.status_code} error from {url}: {resp.text[:200]}", status_code=resp.status_code)
+            lines = resp.iter_lines(decode_unicode=True)
+            done = object()
+            while True:
+                line = await loop.run_in_executor(None, next, lines, done)
+                if line is done:
+                    return
+                yield line
+        finally:
+            resp.close()
+
+    def stream_lines(self, backend: str, url, payload: dict, headers: dict = None, timeout: float = None):
+        """Blocking iterator over astream_lines(); closing it early cancels the request."""
+        loop = self._ensure_loop()
+        lines = queue.Queue()
+        done = object()
+
+        stream = self.astream_hedged if isinstance(url, (list, tuple)) else self.astream_lines
+
+        async def pump():
+            try:
+                async for line in stream(backend, url, payload, headers, timeout):
+                    lines.put(line)
+            except BaseException as e:
+                lines.put(e)
+            finally:
+                lines.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                item = lines.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def post_json(self, backend: str, url, payload: dict, headers: dict = None, timeout: float = None) -> dict:
+        return self._submit(self.apost_json(backend, url, payload, headers, timeout))
+
+    def run(self, backend: str, fn, *args, **kwargs):
+        return self._submit(self.arun(backend, fn, *args, **kwargs))
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def _close_pools():
+            for pool in self._pools.values():
+                if httpx is not None:
+                    await pool.aclose()
+                else:
+                    pool.close()
+            self._pools.clear()
+            self._semaphores.clear()
+
+        asyncio.run_coroutine_threadsafe(_close_pools(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport() -> LLMTransport:
+    """Returns the process-wide transport shared by all clients."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = LLMTransport()
+        return _transport
@@ -1,4 +1,12 @@
 __all__ = ["main_workflow", "console", "log_task_start", "log_success", "log_error"]
 
-from .orchestrator import main_workflow
-from .logger import console, log_task_start, log_success, log_error
\ No newline at end of file
+# Resolved lazily so that importing a light module such as core.config or
+# core.fileio (e.g. from clients/) does not pull in the whole orchestrator.
+def __getattr__(name):
+    if name == "main_workflow":
+        from .orchestrator import main_workflow
+        return main_workflow
+    if name in ("console", "log_task_start", "log_success", "log_error"):
+        from . import logger
+        return getattr(logger, name)
+    raise AttributeError(f"module 'core' has no attribute {name!r}")
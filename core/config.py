@@ -0,0 +1,33 @@
+# config.py - Loads core/config.yaml for the orchestrator and clients
+import os
+from pathlib import Path
+
+CONFIG_PATH = Path(os.getenv("AIFACTORY_CONFIG", Path(__file__).parent / "config.yaml"))
+
+_cache = {}
+
+def load_config(path=None) -> dict:
+    """Loads (and caches) the YAML config. Returns {} if the file or PyYAML is missing."""
+    path = Path(path or CONFIG_PATH)
+    if path in _cache:
+        return _cache[path]
+    try:
+        import yaml
+    except ImportError:
+        print("PyYAML not installed. Run: pip install pyyaml")
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        config = {}
+    _cache[path] = config
+    return config
+
+def agent_config(name: str) -> dict:
+    """Returns the `agents.<name>` section (empty dict if not configured)."""
+    return (load_config().get("agents") or {}).get(name) or {}
+
+def workflow_config() -> dict:
+    """Returns the `workflow` section."""
+    return load_config().get("workflow") or {}
@@ -0,0 +1,167 @@
+# dag.py - Load-time compiler for the task graph
+#
+# Normalizes `depends_on` (into the graph, never on the task dicts, which
+# may be in flight) and checks the graph of unfinished tasks in
+# O(V+E): Kahn's algorithm gives a topological order and depth levels, and
+# whatever it cannot order is split by Tarjan's algorithm into the cycles
+# themselves and the tasks stuck behind them. The critical path of a task
+# is the longest chain of unfinished tasks starting at it; the scheduler
+# uses it to break priority ties so long chains are started first.
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+
+def normalize_depends_on(value) -> list:
+    """`depends_on` as a list of unique task_ids: a single id, a comma-separated string or None are accepted."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    seen = []
+    for dep in value:
+        dep = str(dep).strip()
+        if dep and dep not in seen:
+            seen.append(dep)
+    return seen
+
+
+@dataclass
+class TaskGraph:
+    order: list = field(default_factory=list)          # unfinished task_ids in dependency order
+    level: dict = field(default_factory=dict)          # task_id -> depth (0 = no unfinished dependencies)
+    critical_path: dict = field(default_factory=dict)  # task_id -> tasks on the longest chain starting here
+    cycles: list = field(default_factory=list)         # each a list of task_ids depending on each other
+    stuck: list = field(default_factory=list)          # task_ids that depend (transitively) on a cycle
+    dangling: dict = field(default_factory=dict)       # task_id -> dependencies that do not exist
+    dependents: dict = field(default_factory=dict)     # task_id -> unfinished tasks depending on it
+    depends_on: dict = field(default_factory=dict)     # task_id -> its normalized dependencies
+
+    @property
+    def span(self) -> int:
+        """Length of the longest chain, i.e. the number of rounds with unlimited workers."""
+        return max(self.critical_path.values(), default=0)
+
+    @property
+    def parallelism(self) -> float:
+        """Average tasks per round with unlimited workers (work / span)."""
+        return len(self.order) / self.span if self.span else 0.0
+
+    def levels(self) -> list:
+        """task_ids grouped by depth level, in dependency order."""
+        grouped = defaultdict(list)
+        for task_id in self.order:
+            grouped[self.level[task_id]].append(task_id)
+        return [grouped[depth] for depth in sorted(grouped)]
+
+    def critical_chain(self) -> list:
+        """One longest chain of unfinished tasks, first to last."""
+        if not self.critical_path:
+            return []
+        chain = [max(self.order, key=self.critical_path.get)]  # always a root
+        while self.critical_path[chain[-1]] > 1:
+            remaining = self.critical_path[chain[-1]] - 1
+            chain.append(next(t for t in self.dependents[chain[-1]] if self.critical_path.get(t) == remaining))
+        return chain
+
+    def issues(self) -> list:
+        out = [f"Dependency cycle among {', '.join(cycle)}" for cycle in self.cycles]
+        if self.stuck:
+            out.append(f"{len(self.stuck)} task(s) wait on a cycle and can never run: {', '.join(self.stuck[:10])}"
+                       + (" ..." if len(self.stuck) > 10 else ""))
+        out += [f"Task {task_id} depends on missing task(s) {', '.join(missing)} (treated as done)"
+                for task_id, missing in sorted(self.dangling.items())]
+        return out
+
+
+def _cycles(nodes: set, deps: dict) -> list:
+    """Strongly connected components of `nodes` that are cycles (iterative Tarjan)."""
+    index, low, on_stack, stack, found = {}, {}, set(), [], []
+    counter = 0
+    for root in sorted(nodes):
+        if root in index:
+            continue
+        work = [(root, iter(deps[root]))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, edges = work[-1]
+            for dep in edges:
+                if dep not in nodes:
+                    continue
+                if dep not in index:
+                    index[dep] = low[dep] = counter
+                    counter += 1
+                    stack.append(dep)
+                    on_stack.add(dep)
+                    work.append((dep, iter(deps[dep])))
+                    break
+                if dep in on_stack:
+                    low[node] = min(low[node], index[dep])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in deps[node]:
+                        found.append(sorted(component))
+    return sorted(found)
+
+
+def compile_graph(tasks) -> TaskGraph:
+    """Analyses the graph of unfinished tasks, reading each `depends_on` through normalize_depends_on().
+
+    Completed tasks satisfy their dependents; dependencies on task_ids that do
+    not exist are reported as dangling and, as in the scheduler, count as done.
+    """
+    graph = TaskGraph()
+    known = set()
+    open_ids = []
+    for task in tasks:
+        deps = graph.depends_on[task['task_id']] = normalize_depends_on(task.get('depends_on'))
+        known.add(task['task_id'])
+        if task.get('status') != 'completed':
+            open_ids.append((task['task_id'], deps))
+
+    unfinished = {task_id for task_id, _ in open_ids}
+    deps = {}
+    dependents = graph.dependents = defaultdict(list)
+    for task_id, task_deps in open_ids:
+        missing = [d for d in task_deps if d not in known]
+        if missing:
+            graph.dangling[task_id] = missing
+        deps[task_id] = [d for d in task_deps if d in unfinished]
+        for dep in deps[task_id]:
+            dependents[dep].append(task_id)
+
+    # Kahn: order, levels
+    indegree = {task_id: len(d) for task_id, d in deps.items()}
+    queue = deque(sorted(t for t, n in indegree.items() if n == 0))
+    while queue:
+        task_id = queue.popleft()
+        graph.order.append(task_id)
+        graph.level[task_id] = max((graph.level[d] + 1 for d in deps[task_id]), default=0)
+        for dependent in dependents[task_id]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                queue.append(dependent)
+
+    remaining = unfinished - set(graph.order)
+    if remaining:
+        graph.cycles = _cycles(remaining, deps)
+        in_cycle = {t for cycle in graph.cycles for t in cycle}
+        graph.stuck = sorted(remaining - in_cycle)
+
+    # Longest chain starting at each task, walking the order backwards
+    for task_id in reversed(graph.order):
+        graph.critical_path[task_id] = 1 + max((graph.critical_path[d] for d in dependents[task_id]
+                                                if d in graph.critical_path), default=0)
+    return graph
@@ -0,0 +1,31 @@
+# fileio.py - Crash-safe file writes
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+def atomic_write_text(path, text: str, encoding: str = 'utf-8', fsync: bool = False):
+    """Writes `text` to a temp file in the same directory and renames it over `path`.
+
+    Readers see either the old content or the new one, never a truncated file.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_json(path, obj, fsync: bool = False):
+    atomic_write_text(path, json.dumps(obj, indent=2), fsync=fsync)
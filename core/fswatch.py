@@ -0,0 +1,94 @@
+# fswatch.py - Directory change notification (Linux inotify via ctypes, no extra deps)
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+from pathlib import Path
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Watches a few directories (non-recursively) and reports changed paths."""
+
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # watch descriptor -> directory
+        try:
+            for d in dirs:
+                self.add(d)
+        except OSError:
+            self.close()
+            raise
+
+    def add(self, directory):
+        directory = Path(directory)
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._dirs[wd] = directory
+
+    def fileno(self):
+        return self.fd
+
+    def poll(self, timeout: float = 0.0):
+        """Waits up to `timeout` seconds for events and drains them.
+
+        Returns the set of changed paths (empty if nothing happened), or None
+        if the kernel queue overflowed and the caller must rescan everything.
+        """
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    changed = None
+                elif changed is not None and wd in self._dirs and name:
+                    changed.add(self._dirs[wd] / os.fsdecode(name))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(dirs):
+    """Returns an InotifyWatcher for `dirs`, or None where inotify is unavailable.
+
+    Callers fall back to stat-scanning the directories when this returns None.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return InotifyWatcher(dirs)
+    except (OSError, AttributeError):
+        return None
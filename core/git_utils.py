@@ -1,12 +1,241 @@
-# git_utils.py
+# git_utils.py - Task commits: scoped plumbing commits, optionally batched
+import os
 import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
 
 COLLAB_ROOT = Path(__file__).parent.parent
 
-def git_commit_changes(message: str, author: str = "grok-fast"):
-    """Commit all changes with proper author"""
+ZERO_SHA = "0" * 40
+
+# Serializes HEAD updates from concurrent tasks in this process; update-ref's
+# old-value check catches anyone else moving HEAD underneath us.
+ref_lock = threading.Lock()
+
+
+class GitError(RuntimeError):
+    """A git plumbing command failed."""
+
+
+@dataclass
+class CommitResult:
+    """Outcome of commit_paths(). sha is None when nothing changed; timings are seconds per phase."""
+    sha: str = None
+    paths: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+
+
+def run_git(args, root, input: str = None, env: dict = None) -> str:
+    """Runs a git command in `root` and returns its stripped stdout; raises GitError on failure."""
+    proc = subprocess.run(["git", *args], cwd=root, input=input, capture_output=True, text=True,
+                          env={**os.environ, **env} if env else None)
+    if proc.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {proc.stderr.strip()}")
+    return proc.stdout.strip()
+
+
+def _relative(path, root: Path) -> str:
+    p = Path(path)
+    if p.is_absolute():
+        p = p.resolve().relative_to(root.resolve())
+    return p.as_posix()
+
+
+def snapshot_paths(paths, root=COLLAB_ROOT) -> dict:
+    """Writes the current content of `paths` to the object store. Returns {path: index-info line}.
+
+    A path that no longer exists maps to a deletion.
+    """
+    root = Path(root)
+    rels = sorted({_relative(p, root) for p in paths})
+    present = [p for p in rels if (root / p).is_file()]
+    shas = run_git(["hash-object", "-w", "--stdin-paths"], root, input="\n".join(present) + "\n").split() if present else []
+    blobs = dict(zip(present, shas))
+    return {p: f"{'100755' if os.access(root / p, os.X_OK) else '100644'} {blobs[p]}\t{p}\n" if p in blobs
+            else f"0 {ZERO_SHA}\t{p}\n"
+            for p in rels}
+
+
+def commit_paths(paths, message: str, author: str = "grok-fast", root=COLLAB_ROOT) -> CommitResult:
+    """Commits exactly `paths` (relative to `root` or absolute inside it) on top of HEAD.
+
+    Built from plumbing: the files are hashed with hash-object, staged into a
+    temporary index seeded from HEAD's tree, and committed with commit-tree,
+    so the working tree is never scanned and unrelated changes (staged or
+    not) stay out of the commit. A path that no longer exists is deleted.
+    The real index is updated for the same paths afterwards so `git status`
+    stays clean for them.
+    """
+    started = time.perf_counter()
+    snapshot = snapshot_paths(paths, root)
+    return commit_snapshot(snapshot, message, author, root, started=started,
+                           timings={"hash": time.perf_counter() - started} if snapshot else {})
+
+
+def commit_snapshot(snapshot: dict, message: str, author: str = "grok-fast", root=COLLAB_ROOT,
+                    started: float = None, timings: dict = None) -> CommitResult:
+    """Commits the blobs recorded by snapshot_paths() on top of HEAD, whatever the files contain now."""
+    root = Path(root)
+    result = CommitResult(paths=sorted(snapshot), timings=dict(timings or {}))
+    started = started or time.perf_counter()
+    last = time.perf_counter()
+
+    def mark(phase):
+        nonlocal last
+        now = time.perf_counter()
+        result.timings[phase] = now - last
+        last = now
+
+    if not result.paths:
+        return result
+    index_info = "".join(snapshot[p] for p in result.paths)
+
+    with ref_lock:
+        fd, index_file = tempfile.mkstemp(prefix="index.", suffix=".tmp")
+        os.close(fd)
+        os.unlink(index_file)  # git refuses to read an empty index file
+        env = {"GIT_INDEX_FILE": index_file}
+        try:
+            head = _head(root)
+            run_git(["read-tree", head] if head else ["read-tree", "--empty"], root, env=env)
+            run_git(["update-index", "--index-info"], root, input=index_info, env=env)
+            tree = run_git(["write-tree"], root, env=env)
+            mark("tree")
+        finally:
+            try:
+                os.unlink(index_file)
+            except FileNotFoundError:
+                pass
+        if head and tree == run_git(["rev-parse", f"{head}^{{tree}}"], root):
+            result.timings["total"] = time.perf_counter() - started
+            return result  # nothing to commit
+
+        author_env = {"GIT_AUTHOR_NAME": author, "GIT_AUTHOR_EMAIL": f"agent@{author}.local"}
+        parents = ["-p", head] if head else []
+        sha = run_git(["commit-tree", tree, *parents], root, input=message, env=author_env)
+        run_git(["update-ref", "-m", f"commit: {message.splitlines()[0]}", "HEAD", sha, head or ZERO_SHA], root)
+        mark("commit")
+
+    try:
+        run_git(["update-index", "--add", "--remove", "--index-info"], root, input=index_info)
+    except GitError as e:
+        print(f"Git index refresh skipped: {e}")  # the commit itself is already in place
+    mark("index")
+    result.sha = sha
+    result.timings["total"] = time.perf_counter() - started
+    return result
+
+
+def _head(root):
+    """HEAD's commit sha, or None in a repository without commits."""
+    proc = subprocess.run(["git", "rev-parse", "--verify", "-q", "HEAD"], cwd=root, capture_output=True, text=True)
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+class CommitQueue:
+    """Groups the files of completed tasks into shared commits.
+
+    submit() hashes a task's files right away, so a batch commits what each
+    task wrote and not what the files hold by the time it is flushed, and
+    queues them with its message; once `batch_size` tasks are queued they are
+    committed together. flush() commits whatever is queued, e.g. at the end
+    of a run. With batch_size 1 every task gets its own commit straight away.
+
+    A batch that fails to commit raises GitError in the task that filled it;
+    the other tasks in it are listed by take_failed(), since they have
+    already returned.
+    """
+
+    def __init__(self, batch_size: int = 1, root=COLLAB_ROOT):
+        self.batch_size = max(1, batch_size)
+        self.root = root
+        self._pending = []  # (snapshot, message, author, task_id)
+        self._failed = []  # (task_id, error) of queued tasks whose batch failed to commit
+        self._lock = threading.Lock()
+        self.stats = {"tasks": 0, "commits": 0, "seconds": 0.0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, paths, message: str, author: str = "grok-fast", task_id: str = None):
+        """Queues one task's files. Returns the CommitResult if this filled a batch, else None."""
+        entry = (snapshot_paths(paths, self.root), message, author, task_id)
+        with self._lock:
+            self._pending.append(entry)
+            if len(self._pending) < self.batch_size:
+                return None
+            batch, self._pending = self._pending, []
+        return self._commit(batch, submitter=entry)
+
+    def flush(self):
+        """Commits everything queued. Returns the CommitResult, or None if nothing was queued or it failed."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        return self._commit(batch) if batch else None
+
+    def take_failed(self) -> list:
+        """(task_id, error) of queued tasks whose batch failed to commit since the last call."""
+        with self._lock:
+            failed, self._failed = self._failed, []
+        return failed
+
+    def _commit(self, batch, submitter=None):
+        snapshot = {}
+        for task_snapshot, _, _, _ in batch:
+            snapshot.update(task_snapshot)  # a later task's version of a file wins
+        if len(batch) == 1:
+            message = batch[0][1]
+        else:
+            message = f"{len(batch)} tasks\n\n" + "\n".join(f"- {m}" for _, m, _, _ in batch)
+        authors = sorted({a for _, _, a, _ in batch})
+        try:
+            result = commit_snapshot(snapshot, message, author=authors[0] if len(authors) == 1 else "agents",
+                                     root=self.root)
+        except GitError as e:
+            print(f"Git commit of {len(batch)} task(s) failed: {e}")
+            with self._lock:
+                self._failed += [(entry[3], str(e)) for entry in batch if entry is not submitter and entry[3]]
+            if submitter is not None:
+                raise
+            return None
+        with self._lock:
+            self.stats["tasks"] += len(batch)
+            self.stats["commits"] += result.sha is not None
+            self.stats["seconds"] += result.timings.get("total", 0.0)
+        timings = ", ".join(f"{phase}={secs * 1000:.0f}ms" for phase, secs in result.timings.items())
+        if result.sha:
+            print(f"Committed {result.sha[:10]} ({len(batch)} task(s), {len(result.paths)} file(s); {timings})")
+        return result
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_commit_queue() -> CommitQueue:
+    """Returns the process-wide queue configured by `git.batch_size` in core/config.yaml."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from core.config import load_config
+            settings = load_config().get("git") or {}
+            _queue = CommitQueue(batch_size=int(settings.get("batch_size", 1)))
+        return _queue
+
+
+def git_commit_changes(message: str, author: str = "grok-fast", paths=None, task_id: str = None):
+    """Commit changes with proper author. Returns False if the commit failed.
+
+    With `paths`, only those files are committed, through the shared commit
+    queue (which may hold them for a batched commit; see take_failed()).
+    Without, the whole working tree is staged with `git add .` as before.
+    """
     try:
+        if paths is not None:
+            get_commit_queue().submit(paths, message, author, task_id=task_id)
+            return True
         subprocess.run(["git", "add", "."], cwd=COLLAB_ROOT, check=True, capture_output=True)
         subprocess.run([
             "git", "commit", "-m", message,
@@ -14,6 +243,9 @@ def git_commit_changes(message: str, author: str = "grok-fast"):
         ], cwd=COLLAB_ROOT, check=True, capture_output=True)
         print(f"Committed: {message}")
         return True
+    except GitError as e:
+        print(f"Git commit failed: {e}")
+        return False
     except subprocess.CalledProcessError as e:
         print(f"Git commit failed: {e.stderr.decode()}")
-        return False
\ No newline at end of file
+        return False
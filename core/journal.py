@@ -0,0 +1,113 @@
+# journal.py - Append-only task transition log, compacted back into tasks/*.json
+import datetime
+import json
+import os
+import threading
+from pathlib import Path
+
+from core.fileio import atomic_write_json, atomic_write_text
+
+JOURNAL_NAME = ".journal.jsonl"
+
+
+class TaskJournal:
+    """Records task field updates as JSONL lines instead of rewriting task files.
+
+    The task JSON files stay the source of truth in Git: pending updates are
+    overlaid on tasks as they are loaded, and compact() folds them back into
+    the files (atomically) and empties the journal. A torn last line left by
+    a crash is ignored on replay.
+    """
+
+    def __init__(self, tasks_dir, compact_every: int = 200, fsync: bool = False):
+        self.tasks_dir = Path(tasks_dir)
+        self.path = self.tasks_dir / JOURNAL_NAME
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._pending = {}  # task_id -> fields updated since the last compaction
+        self._entries = 0
+        self._lock = threading.RLock()
+        self._replay()
+
+    def _replay(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn write from a crash
+                    self._pending.setdefault(entry['task_id'], {}).update(entry['set'])
+                    self._entries += 1
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return self._entries
+
+    def record(self, task_id: str, fields: dict):
+        self.record_many({task_id: fields})
+
+    def record_many(self, updates: dict):
+        """Appends one line per task in a single write; compacts every `compact_every` entries."""
+        if not updates:
+            return
+        ts = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        lines = "".join(json.dumps({"ts": ts, "task_id": task_id, "set": fields}) + "\n"
+                        for task_id, fields in updates.items())
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            for task_id, fields in updates.items():
+                self._pending.setdefault(task_id, {}).update(fields)
+            self._entries += len(updates)
+            if self._entries >= self.compact_every:
+                self.compact()
+
+    def supersede(self, task: dict):
+        """Called when a whole task is saved directly, so older journaled values can't win on load."""
+        fields = self._pending.get(task['task_id'])
+        if fields:
+            self.record(task['task_id'], {key: task.get(key) for key in fields})
+
+    def overlay(self, task: dict) -> dict:
+        """Applies journaled updates that are not yet compacted to a loaded task (in place)."""
+        fields = self._pending.get(task['task_id'])
+        if fields:
+            task.update(fields)
+        return task
+
+    def compact(self) -> int:
+        """Writes pending updates into the task files and empties the journal.
+
+        Returns the number of task files rewritten. Safe to interrupt: the
+        journal is only cleared after every file has been replaced, and
+        replaying it again is idempotent.
+        """
+        with self._lock:
+            written = 0
+            kept = {}
+            for task_id, fields in self._pending.items():
+                task_path = self.tasks_dir / f"{task_id}.json"
+                try:
+                    with open(task_path, 'r', encoding='utf-8') as f:
+                        task = json.load(f)
+                except FileNotFoundError:
+                    continue  # task was deleted
+                except json.JSONDecodeError:
+                    print(f"WARNING: Cannot compact journal into {task_path}, keeping its entries.")
+                    kept[task_id] = fields
+                    continue
+                task.update(fields)
+                atomic_write_json(task_path, task, fsync=self.fsync)
+                written += 1
+            if self._entries:
+                atomic_write_text(self.path, "".join(
+                    json.dumps({"task_id": task_id, "set": fields}) + "\n" for task_id, fields in kept.items()),
+                    fsync=self.fsync)
+            self._pending = kept
+            self._entries = len(kept)
+            return written
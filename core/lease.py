@@ -0,0 +1,269 @@
+# lease.py - Task leases so several orchestrators can share one tasks/ directory
+#
+# Configured under `leases:` in core/config.yaml (AIFACTORY_LEASES=1|0
+# overrides `enabled`). Before running a task a worker creates
+# tasks/.leases/<task_id>.lease with O_CREAT|O_EXCL, which succeeds for
+# exactly one process, also over NFSv3+. The lease names its owner and
+# expires `ttl` seconds later; a heartbeat thread pushes the expiry forward
+# while the worker holds it, and releasing deletes the file. A lease past its
+# expiry belongs to a worker that crashed or lost the share, and is taken
+# over.
+#
+# Renewing, releasing and taking over an existing lease are compare-and-swap
+# operations on its token: the new content is written to a temp file, which
+# is hard-linked to `<lease>.<token>.swap` (link(2) fails if the name exists,
+# also over NFS). Only the worker whose link succeeds may touch that
+# generation of the lease; it re-reads the lease, and only if the token is
+# still the one it expects does it rename the temp file over it (or delete
+# it). So a slow owner and a worker taking over its expired lease can never
+# both win, and nobody deletes or overwrites a lease they did not verify.
+# A swap name left behind by a worker that crashed mid-swap is removed once
+# it is `ttl` old. Expiry is wall-clock time, so hosts sharing a directory
+# need synced clocks (NTP), and `ttl` should be well above their skew.
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from core.fileio import atomic_write_text
+from core.metrics import TASK_LEASES
+
+LEASE_SUFFIX = ".lease"
+SWAP_RETRIES = 5  # attempts at a swap another worker is in the middle of, SWAP_BACKOFF seconds apart
+SWAP_BACKOFF = 0.01
+
+BUSY = None  # _swap() result: another worker is swapping the same lease right now
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class Lease:
+    task_id: str
+    owner: str
+    token: str       # unique per claim; renewals keep it, a takeover changes it
+    expires: float   # time.time() after which the lease may be taken over
+
+
+class LeaseManager:
+    """Claims, renews and releases the leases of one worker on a tasks directory."""
+
+    def __init__(self, tasks_dir, owner: str = None, ttl: float = 60.0, heartbeat: float = None,
+                 poll: float = 1.0, dirname: str = ".leases", fsync: bool = False, clock=time.time):
+        self.dir = Path(tasks_dir) / dirname
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.heartbeat = heartbeat or ttl / 3
+        self.poll = poll  # how often callers re-check leases held by other workers
+        self.fsync = fsync
+        self._clock = clock
+        self._held = {}  # task_id -> token
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, tasks_dir, settings: dict, **kwargs):
+        return cls(tasks_dir, ttl=float(settings.get('ttl', 60)),
+                   heartbeat=float(settings['heartbeat']) if settings.get('heartbeat') else None,
+                   poll=float(settings.get('poll', 1.0)), dirname=settings.get('dir', '.leases'),
+                   fsync=bool(settings.get('fsync', False)), **kwargs)
+
+    def _path(self, task_id) -> Path:
+        return self.dir / f"{task_id}{LEASE_SUFFIX}"
+
+    def _parse(self, path: Path):
+        """The lease in `path`, or None if there is none.
+
+        A file that is still empty (just created, not yet written) or torn
+        counts as a live lease of an unknown owner until `ttl` after its mtime.
+        """
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            return Lease(data['task_id'], data['owner'], data['token'], float(data['expires']))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                return None
+            return Lease(path.name[:-len(LEASE_SUFFIX)], "unknown", "", mtime + self.ttl)
+
+    def _body(self, task_id, token) -> str:
+        now = self._clock()
+        return json.dumps({"task_id": task_id, "owner": self.owner, "token": token,
+                           "acquired": now, "expires": now + self.ttl})
+
+    @property
+    def held(self) -> set:
+        with self._lock:
+            return set(self._held)
+
+    def read(self, task_id):
+        return self._parse(self._path(task_id))
+
+    def holder(self, task_id):
+        """The live lease on `task_id`, or None if it is free or its lease has expired."""
+        lease = self.read(task_id)
+        return lease if lease is not None and lease.expires > self._clock() else None
+
+    def owns(self, task_id) -> bool:
+        """True if this worker still holds the lease it claimed on `task_id`."""
+        with self._lock:
+            token = self._held.get(task_id)
+        lease = self.read(task_id)
+        return token is not None and lease is not None and lease.token == token
+
+    def claim(self, task_id) -> bool:
+        """Takes the lease on `task_id` if it is free or expired. Returns False if another worker holds it."""
+        path = self._path(task_id)
+        token = uuid.uuid4().hex
+        for _ in range(3):  # the file may come and go between create and read
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                current = self.read(task_id)
+                if current is None:
+                    continue
+                if current.expires > self._clock() or not self._swap(task_id, current.token,
+                                                                      self._body(task_id, token), expired=True):
+                    TASK_LEASES.inc(outcome='contended')
+                    return False
+                print(f"  [LEASE] Task {task_id}: lease of {current.owner} expired, reclaiming it")
+                TASK_LEASES.inc(outcome='reclaimed')
+                with self._lock:
+                    self._held[task_id] = token
+                return True
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self._body(task_id, token))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            with self._lock:
+                self._held[task_id] = token
+            TASK_LEASES.inc(outcome='acquired')
+            return True
+        TASK_LEASES.inc(outcome='contended')
+        return False
+
+    def _swap(self, task_id, token: str, body: str = None, expired: bool = False):
+        """Replaces the lease on `task_id` with `body` (deletes it if None) if its token is still `token`.
+
+        With `expired`, it must also still be past its expiry. Returns True if
+        it was swapped, False if the lease changed hands, or BUSY if another
+        worker is swapping it at the moment.
+        """
+        path = self._path(task_id)
+        fresh = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        marker = path.with_name(f"{path.name}.{token or 'torn'}.swap")
+        try:
+            with open(fresh, 'w', encoding='utf-8') as f:
+                f.write(body or "")
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            try:
+                os.link(fresh, marker)
+            except FileExistsError:
+                self._clear_stale(marker)
+                return BUSY
+            try:
+                current = self._parse(path)
+                if current is None or current.token != token or (expired and current.expires > self._clock()):
+                    return False
+                if body is None:
+                    path.unlink()
+                else:
+                    os.replace(fresh, path)
+                return True
+            finally:
+                marker.unlink()
+        finally:
+            try:
+                fresh.unlink()
+            except FileNotFoundError:
+                pass  # renamed into place
+
+    def _clear_stale(self, marker: Path):
+        """Removes a swap name left by a worker that died in the middle of a swap."""
+        try:
+            if marker.stat().st_mtime + self.ttl < self._clock():
+                marker.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _swap_held(self, task_id, token: str, body: str = None):
+        """_swap() on a lease this worker holds, waiting out a takeover attempt in progress (BUSY if it lasts)."""
+        for attempt in range(SWAP_RETRIES):
+            if attempt:
+                time.sleep(SWAP_BACKOFF)
+            swapped = self._swap(task_id, token, body)
+            if swapped is not BUSY:
+                return swapped
+        return BUSY
+
+    def renew(self, task_id) -> bool:
+        """Pushes the expiry of a held lease `ttl` seconds ahead. False (and forgotten) if it was lost.
+
+        If another worker keeps the lease busy, it is left as is and retried on the next heartbeat.
+        """
+        with self._lock:  # so a release cannot slip in between the check and the write
+            token = self._held.get(task_id)
+            if token is None:
+                return False
+            if self._swap_held(task_id, token, self._body(task_id, token)) is not False:
+                return True
+            del self._held[task_id]
+        lease = self.read(task_id)
+        print(f"  [LEASE] WARNING: lost the lease on task {task_id} "
+              f"(now held by {lease.owner if lease else 'nobody'})")
+        TASK_LEASES.inc(outcome='lost')
+        return False
+
+    def renew_all(self) -> list:
+        """Renews every held lease; returns the task_ids whose lease was lost."""
+        return [task_id for task_id in self.held if not self.renew(task_id)]
+
+    def release(self, task_id):
+        """Deletes the lease on `task_id` if this worker still holds it."""
+        with self._lock:
+            token = self._held.pop(task_id, None)
+            if token is not None:
+                self._swap_held(task_id, token)  # if still busy, the lease is left to expire
+
+    def release_all(self):
+        for task_id in self.held:
+            self.release(task_id)
+
+    # --- Heartbeat ---
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                self.renew_all()
+            except OSError as e:
+                print(f"  [LEASE] Heartbeat failed: {e}")
+
+    def start(self):
+        """Starts renewing held leases every `heartbeat` seconds on a daemon thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the heartbeat and releases every lease still held."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.release_all()
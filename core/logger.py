@@ -1,20 +1,27 @@
-# logger.py - Structured logging with OTLP export
+# logger.py - Structured logging and lazily initialized OpenTelemetry task spans
+#
+# Nothing is exported until the first span is started: get_tracer() then
+# builds a TracerProvider from the `telemetry:` section of core/config.yaml
+# (or AIFACTORY_TELEMETRY=none|memory|file|otlp). Spans go through a
+# BatchSpanProcessor, whose bounded queue and background thread keep
+# exporting off the task threads; when the queue is full spans are dropped.
+#
+# Each task gets one "task" span, opened by log_task_start and kept open
+# across retries; its children are the phases recorded with record_span()
+# (prompt, llm, parse, write, commit, ...) and one "retry" span per backoff
+# wait. log_success / log_error / end_task_span close it.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
 import structlog
 import logging
+from rich.console import Console
 from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.sdk.resources import Resource
-
-# Set up OTLP exporter
-resource = Resource.create({"service.name": "ai-factory-os"})
-trace.set_tracer_provider(TracerProvider(resource=resource))
-otlp_exporter = OTLPSpanExporter(endpoint="http://localhost:4317", insecure=True)
-span_processor = BatchSpanProcessor(otlp_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-tracer = trace.get_tracer(__name__)
+from opentelemetry.trace import Status, StatusCode
 
 # Configure structlog
 structlog.configure(
@@ -36,26 +43,203 @@ structlog.configure(
 )
 
 logger = structlog.get_logger()
+console = Console()
+
+# === TELEMETRY ===
+COLLAB_ROOT = Path(__file__).parent.parent
+_tracer = None
+_provider = None
+_exporter = None
+_init_lock = threading.Lock()
+
+
+class JsonlSpanExporter:
+    """Appends one JSON object per finished span to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        lines = "".join(json.dumps(_span_dict(span)) + "\n" for span in spans)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def _span_dict(span) -> dict:
+    ctx, parent = span.get_span_context(), span.parent
+    return {
+        "name": span.name,
+        "trace_id": f"{ctx.trace_id:032x}",
+        "span_id": f"{ctx.span_id:016x}",
+        "parent_id": f"{parent.span_id:016x}" if parent else None,
+        "start_ns": span.start_time,
+        "end_ns": span.end_time,
+        "duration_ms": (span.end_time - span.start_time) / 1e6 if span.end_time else None,
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+    }
+
+
+def _make_exporter(kind: str, settings: dict):
+    if kind == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        return InMemorySpanExporter()
+    if kind == "file":
+        path = settings.get("path", ".cache/telemetry/spans.jsonl")
+        return JsonlSpanExporter(os.path.join(COLLAB_ROOT, path))
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.get("endpoint", "http://localhost:4317"), insecure=True)
+    return None
+
+
+def get_tracer():
+    """Returns the tracer, building the provider and exporter on first use."""
+    global _tracer, _provider, _exporter
+    if _tracer is not None:
+        return _tracer
+    with _init_lock:
+        if _tracer is None:
+            from core.config import load_config
+            settings = load_config().get("telemetry") or {}
+            kind = os.getenv("AIFACTORY_TELEMETRY") or settings.get("exporter", "none")
+            _exporter = _make_exporter(kind, settings)
+            if _exporter is None:
+                _tracer = trace.NoOpTracer()
+            else:
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                _provider = TracerProvider(resource=Resource.create({"service.name": "ai-factory-os"}))
+                _provider.add_span_processor(BatchSpanProcessor(
+                    _exporter,
+                    max_queue_size=int(settings.get("queue_size", 2048)),
+                    schedule_delay_millis=int(settings.get("flush_interval_ms", 1000))))
+                _tracer = _provider.get_tracer(__name__)
+        return _tracer
+
+
+def get_exporter():
+    """The active span exporter (e.g. an InMemorySpanExporter to read spans back), or None."""
+    get_tracer()
+    return _exporter
+
+
+def flush_telemetry(timeout_millis: int = 5000):
+    """Exports queued spans now; call before a short-lived process exits."""
+    if _provider is not None:
+        _provider.force_flush(timeout_millis)
+
+
+def reset_telemetry():
+    """Shuts the exporter down and forgets the configuration, so the next span re-reads it."""
+    global _tracer, _provider, _exporter
+    with _init_lock:
+        if _provider is not None:
+            _provider.shutdown()
+        _tracer = _provider = _exporter = None
+    with _spans_lock:
+        _task_spans.clear()
+        _retry_spans.clear()
+
+
+# === TASK SPANS ===
+_task_spans = {}   # task_id -> open "task" span
+_retry_spans = {}  # task_id -> open "retry" span while the task waits out its backoff
+_spans_lock = threading.Lock()
+
+
+def _end_task(task_id, code, outcome, description=None):
+    with _spans_lock:
+        span = _task_spans.pop(task_id, None)
+        retry = _retry_spans.pop(task_id, None)
+    if retry is not None:
+        retry.end()
+    if span is not None:
+        span.set_attribute("task.outcome", outcome)
+        span.set_status(Status(code, description))
+        span.end()
+
+
+def task_context(task_id):
+    """Makes the task's span current in this thread (e.g. the worker running the task)."""
+    with _spans_lock:
+        span = _task_spans.get(task_id)
+    return trace.use_span(span, end_on_exit=False) if span is not None else nullcontext()
+
+
+def record_span(name: str, start_ns: int, end_ns: int = None, **attributes):
+    """Records a finished child span of the current span, e.g. one phase of a task.
+
+    Does nothing (and does not initialize telemetry) outside a recording span.
+    """
+    if not trace.get_current_span().is_recording():
+        return
+    span = get_tracer().start_span(name, start_time=start_ns,
+                                   attributes={k: v for k, v in attributes.items() if v is not None})
+    span.end(end_time=end_ns or time.time_ns())
+
+
+@contextmanager
+def phase_span(name: str, **attributes):
+    """Times the enclosed block as a child span of the current span."""
+    start = time.time_ns()
+    try:
+        yield
+    finally:
+        record_span(name, start, **attributes)
+
+
+def end_task_span(task_id, outcome: str):
+    """Closes the task's span without an error, e.g. when it is handed off for manual input."""
+    _end_task(task_id, StatusCode.UNSET, outcome)
+
 
+# === LOG HELPERS ===
 def log_task_start(task):
-    with tracer.start_as_span("task_start") as span:
-        span.set_attribute("task.id", task['task_id'])
-        span.set_attribute("task.assignee", task['assignee'])
-        logger.info("task_started", task_id=task['task_id'], assignee=task['assignee'], description=task['description'], files=task['files'])
+    with _spans_lock:
+        span = _task_spans.get(task['task_id'])
+        retry = _retry_spans.pop(task['task_id'], None)
+    if retry is not None:
+        retry.end()
+    if span is None:
+        span = get_tracer().start_span("task", attributes={
+            "task.id": task['task_id'], "task.assignee": task['assignee']})
+        with _spans_lock:
+            _task_spans[task['task_id']] = span
+    span.add_event("dispatched", {"retry_count": task.get('retry_count', 0)})
+    logger.info("task_started", task_id=task['task_id'], assignee=task['assignee'], description=task['description'], files=task['files'])
 
 def log_success(task_id, duration):
-    with tracer.start_as_span("task_success") as span:
-        span.set_attribute("task.id", task_id)
+    with _spans_lock:
+        span = _task_spans.get(task_id)
+    if span is not None:
         span.set_attribute("duration", duration)
-        logger.info("task_completed", task_id=task_id, duration=duration)
+    _end_task(task_id, StatusCode.OK, "completed")
+    logger.info("task_completed", task_id=task_id, duration=duration)
 
-def log_error(msg):
-    with tracer.start_as_span("task_error") as span:
-        span.set_attribute("error.message", msg)
-        logger.error("task_error", message=msg)
+def log_error(msg, task_id=None):
+    if task_id is not None:
+        _end_task(task_id, StatusCode.ERROR, "failed", msg)
+    logger.error("task_error", message=msg, task_id=task_id)
 
 def log_retry(task_id, attempt):
-    with tracer.start_as_span("task_retry") as span:
-        span.set_attribute("task.id", task_id)
-        span.set_attribute("retry.attempt", attempt)
-        logger.warning("task_retry", task_id=task_id, attempt=attempt)
\ No newline at end of file
+    with _spans_lock:
+        span = _task_spans.get(task_id)
+    if span is not None:
+        retry = get_tracer().start_span("retry", context=trace.set_span_in_context(span),
+                                        attributes={"retry.attempt": attempt})
+        with _spans_lock:
+            _retry_spans[task_id] = retry
+    logger.warning("task_retry", task_id=task_id, attempt=attempt)
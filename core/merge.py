@@ -0,0 +1,187 @@
+# merge.py - AST-aware merging of proposal modules into a target module
+import ast
+from dataclasses import dataclass, field
+
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+@dataclass
+class MergeStats:
+    merged: list = field(default_factory=list)   # names of proposals that were applied
+    invalid: list = field(default_factory=list)  # (name, reason) for proposals that are not valid Python
+    imports_added: int = 0
+    replaced: int = 0  # top-level functions/classes whose body changed
+    added: int = 0     # new top-level functions/classes and statements
+
+
+def proposal_source(text: str) -> str:
+    """Returns the Python code in a proposal.
+
+    A proposal is either a plain module or an LLM answer with the code in
+    fenced ```python blocks, whose bodies are joined. Raises SyntaxError if
+    neither parses.
+    """
+    try:
+        ast.parse(text)
+        return text
+    except SyntaxError as e:
+        error = e
+    from clients.stream_parser import FileBlock, Snippet, parse_events
+    bodies = [event.body for event in parse_events(text)
+              if (isinstance(event, FileBlock) and not event.is_edit and event.path.endswith(".py"))
+              or (isinstance(event, Snippet) and event.lang in ("python", "py"))]
+    if not bodies:
+        raise error
+    source = "\n\n".join(body.rstrip() + "\n" for body in bodies)
+    ast.parse(source)
+    return source
+
+
+def _spans(tree):
+    """(node, first line, last line) of each top-level statement, decorators included (1-based)."""
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        yield node, start, node.end_lineno
+
+
+def _import_keys(node):
+    if isinstance(node, ast.Import):
+        return [("import", None, 0, alias.name, alias.asname) for alias in node.names]
+    return [("from", node.module, node.level, alias.name, alias.asname) for alias in node.names]
+
+
+def _render_import(key) -> str:
+    kind, module, level, name, asname = key
+    alias = f"{name} as {asname}" if asname else name
+    if kind == "import":
+        return f"import {alias}\n"
+    return f"from {'.' * level}{module or ''} import {alias}\n"
+
+
+def _is_future(key) -> bool:
+    return key[0] == "from" and key[1] == "__future__"
+
+
+def _is_main_guard(node) -> bool:
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__")
+
+
+def _is_docstring(node) -> bool:
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def merge_sources(target: str, proposals) -> tuple:
+    """Merges proposal modules into `target`. Returns (new source, MergeStats).
+
+    `proposals` is an iterable of (name, text), applied in order. Imports are
+    split per name and only missing ones are added after the target's
+    imports (`__future__` ones right after its docstring, where Python
+    requires them). A top-level function or class replaces the target's definition
+    of the same name in place, or is added before a trailing
+    `if __name__ == "__main__":` block; if several proposals define it, the
+    last one wins. Other statements are added unless an identical one exists.
+    Everything else in the target, comments included, is kept verbatim.
+    Raises SyntaxError if the target itself does not parse. If the merged
+    module does not compile, the target is returned unchanged and every
+    proposal is reported as invalid.
+    """
+    tree = ast.parse(target)
+    lines = target.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    spans = list(_spans(tree))
+
+    imports = {key for node, _, _ in spans if isinstance(node, (ast.Import, ast.ImportFrom)) for key in _import_keys(node)}
+    defined = {node.name: (start, end) for node, start, end in spans if isinstance(node, DEFINITIONS)}
+    statements = {ast.dump(node) for node, _, _ in spans}
+    stats = MergeStats()
+    new_futures, new_imports, replacements, additions = [], [], {}, {}
+
+    for name, text in proposals:
+        try:
+            source = proposal_source(text)
+            ptree = ast.parse(source)
+        except SyntaxError as e:
+            stats.invalid.append((name, f"line {e.lineno}: {e.msg}"))
+            continue
+        plines = source.splitlines(keepends=True)
+        for node, start, end in _spans(ptree):
+            segment = "".join(plines[start - 1:end]).rstrip() + "\n"
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                for key in _import_keys(node):
+                    if key not in imports:
+                        imports.add(key)
+                        (new_futures if _is_future(key) else new_imports).append(_render_import(key))
+            elif isinstance(node, DEFINITIONS):
+                if node.name in defined:
+                    replacements[node.name] = segment
+                else:
+                    additions.pop(node.name, None)
+                    additions[node.name] = segment
+            elif not (_is_main_guard(node) or _is_docstring(node)) and ast.dump(node) not in statements:
+                statements.add(ast.dump(node))
+                additions[len(additions), ast.dump(node)] = segment
+        stats.merged.append(name)
+
+    # Line indexes (0-based) where new imports and new definitions go
+    import_ends = [end for node, _, end in spans if isinstance(node, (ast.Import, ast.ImportFrom))]
+    body = [(start, node) for node, start, _ in spans if not _is_docstring(node)]
+    if import_ends:
+        import_at = max(import_ends)
+    else:
+        import_at = body[0][0] - 1 if body else len(lines)
+    append_at = spans[-1][1] - 1 if spans and _is_main_guard(spans[-1][0]) else len(lines)
+    future_ends = [end for node, _, end in spans
+                   if isinstance(node, ast.ImportFrom) and any(_is_future(key) for key in _import_keys(node))]
+    if future_ends:
+        future_at = max(future_ends)
+    elif spans and _is_docstring(spans[0][0]):
+        future_at = spans[0][2]
+    else:
+        future_at = body[0][0] - 1 if body else len(lines)
+
+    inserts = {}  # line index -> text inserted before it
+    if new_futures:
+        inserts[future_at] = "".join(new_futures)
+    if new_imports:
+        block = "".join(new_imports)
+        if not import_ends and import_at < len(lines):
+            block += "\n"
+        inserts[import_at] = inserts.get(import_at, "") + block
+    if additions:
+        if append_at < len(lines):
+            block = "".join(segment + "\n" for segment in additions.values())
+        else:
+            block = "".join("\n" + segment for segment in additions.values())
+        inserts[append_at] = inserts.get(append_at, "") + block
+    changed = {}
+    for def_name, segment in replacements.items():
+        start, end = defined[def_name]
+        if "".join(lines[start - 1:end]).rstrip() + "\n" != segment:
+            changed[start - 1] = (end, segment)
+
+    stats.imports_added = len(new_futures) + len(new_imports)
+    stats.added = len(additions)
+    stats.replaced = len(changed)
+    if not (inserts or changed):
+        return target, stats
+
+    pieces = []
+    cursor = 0
+    for index in sorted(set(inserts) | set(changed)):
+        pieces += lines[cursor:index]
+        cursor = index
+        if index in inserts:
+            pieces.append(inserts[index])
+        if index in changed:
+            cursor, segment = changed[index]
+            pieces.append(segment)
+    pieces += lines[cursor:]
+    merged = "".join(pieces)
+    try:
+        compile(merged, "<merged>", "exec", dont_inherit=True)  # also catches misplaced __future__ imports
+    except SyntaxError as e:
+        reason = f"merged module does not compile (line {e.lineno}: {e.msg})"
+        return target, MergeStats(invalid=stats.invalid + [(name, reason) for name in stats.merged])
+    return merged, stats
@@ -0,0 +1,328 @@
+# metrics.py - In-process metrics registry with a Prometheus endpoint and JSON snapshots
+#
+# Counters, gauges and fixed-bucket histograms, each keyed by label values.
+# Updates are a dict lookup and an add under one lock, so they are cheap
+# enough for the transport and orchestrator hot paths. render_prometheus()
+# produces the text exposition format; snapshot() produces the JSON written
+# for the static dashboard (docs/metrics.html reads docs/metrics.json).
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from core.fileio import atomic_write_text
+
+COLLAB_ROOT = Path(__file__).parent.parent
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 400, 800)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = registry._lock
+        self._values = {}  # label values tuple -> value
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at collection time by set_function()."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fn = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn):
+        """fn() returns {label values tuple: value}; it replaces any set() values."""
+        self._fn = fn
+
+    def samples(self) -> dict:
+        fn = self._fn
+        if fn is None:
+            return super().samples()
+        try:
+            return {tuple(str(v) for v in key): value for key, value in fn().items()}
+        except Exception:
+            return {}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # bucket counts, sum, count
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> dict:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def quantile(self, q: float, counts: list, count: int):
+        """Estimates a quantile by linear interpolation inside its bucket (the +Inf bucket reports its lower bound)."""
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, help, labels, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(self, name, help, labels, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        out = []
+        for metric in list(self._metrics.values()):
+            out.append(f"# HELP {metric.name} {metric.help}\n# TYPE {metric.name} {metric.kind}\n")
+            for key, value in sorted(metric.samples().items()):
+                if metric.kind != "histogram":
+                    out.append(f"{metric.name}{_format_labels(metric.labels, key)} {_number(value)}\n")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, n in zip(list(metric.buckets) + ["+Inf"], counts):
+                    cumulative += n
+                    le = bound if bound == "+Inf" else _number(bound)
+                    out.append(f"{metric.name}_bucket{_format_labels(metric.labels, key, [('le', le)])} {cumulative}\n")
+                out.append(f"{metric.name}_sum{_format_labels(metric.labels, key)} {_number(total)}\n")
+                out.append(f"{metric.name}_count{_format_labels(metric.labels, key)} {count}\n")
+        return "".join(out)
+
+    def snapshot(self) -> dict:
+        """JSON-friendly view: counters and gauges by label, histograms with count, mean, p50, p90 and p99."""
+        metrics = {}
+        for metric in list(self._metrics.values()):
+            series = []
+            for key, value in sorted(metric.samples().items()):
+                labels = dict(zip(metric.labels, key))
+                if metric.kind != "histogram":
+                    series.append({"labels": labels, "value": value})
+                    continue
+                counts, total, count = value
+                series.append({"labels": labels, "count": count, "sum": total,
+                               "mean": total / count if count else None,
+                               **{f"p{round(q * 100)}": metric.quantile(q, counts, count) for q in (0.5, 0.9, 0.99)}})
+            metrics[metric.name] = {"type": metric.kind, "help": metric.help, "series": series}
+        return {"generated_at": time.time(), "metrics": metrics}
+
+
+REGISTRY = MetricsRegistry()
+
+# Fed by clients/transport.py
+LLM_LATENCY = REGISTRY.histogram("aifactory_llm_request_seconds", "LLM request latency by backend", ["backend"])
+LLM_REQUESTS = REGISTRY.counter("aifactory_llm_requests_total", "LLM requests by backend and outcome", ["backend", "outcome"])
+LLM_HEDGES = REGISTRY.counter("aifactory_llm_hedged_requests_total",
+                              "Requests that sent a hedged duplicate, by backend and which copy answered first",
+                              ["backend", "winner"])
+LLM_FAILOVERS = REGISTRY.counter("aifactory_llm_failovers_total", "Attempts moved to another endpoint after an error",
+                                 ["backend"])
+# Fed by the agents
+LLM_TOKENS = REGISTRY.counter("aifactory_llm_output_tokens_total", "Estimated completion tokens by agent", ["agent"])
+LLM_TOKEN_RATE = REGISTRY.histogram("aifactory_llm_tokens_per_second", "Estimated completion tokens per second by agent",
+                                    ["agent"], buckets=RATE_BUCKETS)
+# Fed by the orchestrator
+TASK_DURATION = REGISTRY.histogram("aifactory_task_seconds", "Task run time by assignee and outcome", ["assignee", "outcome"])
+TASK_OUTCOMES = REGISTRY.counter("aifactory_task_outcomes_total",
+                                 "Finished task runs by assignee and outcome (completed, retry, failed, handoff)",
+                                 ["assignee", "outcome"])
+TASKS = REGISTRY.gauge("aifactory_tasks", "Tasks by state: ready, blocked, running, or their status", ["state"])
+TASKS_REROUTED = REGISTRY.counter("aifactory_tasks_rerouted_total",
+                                  "Tasks sent to a fallback agent because their assignee had no capacity",
+                                  ["from_agent", "to_agent"])
+# Fed by core/lease.py
+TASK_LEASES = REGISTRY.counter("aifactory_task_leases_total",
+                               "Task lease claims by outcome (acquired, contended, reclaimed, lost)", ["outcome"])
+# Fed by core/ratelimit.py
+RATE_LIMIT_CHARGED = REGISTRY.counter("aifactory_rate_limit_charged_total",
+                                      "Requests and estimated tokens charged to rate limits at dispatch", ["agent", "limit"])
+RATE_LIMIT_DEFERRED = REGISTRY.counter("aifactory_rate_limit_deferred_total",
+                                       "Ready tasks held back because a rate limit had no room", ["agent", "limit"])
+RATE_LIMIT_AVAILABLE = REGISTRY.gauge("aifactory_rate_limit_available", "Room left in each rate limit bucket",
+                                      ["agent", "limit"])
+
+
+def record_completion(agent: str, tokens: int, seconds: float):
+    """Counts a fresh (uncached) completion's estimated tokens and its tokens/second."""
+    LLM_TOKENS.inc(tokens, agent=agent)
+    if seconds > 0:
+        LLM_TOKEN_RATE.observe(tokens / seconds, agent=agent)
+
+
+# === EXPOSITION ===
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, ctype = self.registry.render_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, ctype = json.dumps(self.registry.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    """Serves /metrics (Prometheus text) and /metrics.json on a local port and
+    rewrites a JSON snapshot file every `interval` seconds, both from daemon threads.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, port: int = None, host: str = "127.0.0.1",
+                 snapshot_path=None, interval: float = 15.0):
+        self.registry = registry
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.interval = interval
+        self._server = None
+        self._stop = threading.Event()
+        self._threads = []
+        if port is not None:
+            handler = type("Handler", (_Handler,), {"registry": registry})
+            self._server = ThreadingHTTPServer((host, port), handler)
+            self._server.daemon_threads = True
+
+    @property
+    def port(self):
+        return self._server.server_address[1] if self._server else None
+
+    def write_snapshot(self):
+        if self.snapshot_path:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.snapshot_path, json.dumps(self.registry.snapshot(), indent=1))
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"  [METRICS] Snapshot failed: {e}")
+
+    def start(self):
+        if self._server:
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True))
+        if self.snapshot_path:
+            self._threads.append(threading.Thread(target=self._snapshot_loop, name="metrics-snapshot", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        self.write_snapshot()  # final state for the dashboard
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def start_metrics():
+    """Starts the exporter configured by `metrics:` in core/config.yaml (once). Returns it, or None if disabled."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            from core.config import load_config
+            settings = load_config().get("metrics") or {}
+            if not settings.get("enabled", False):
+                return None
+            path = settings.get("snapshot_path")
+            try:
+                _exporter = MetricsExporter(port=settings.get("port"), host=settings.get("host", "127.0.0.1"),
+                                            snapshot_path=COLLAB_ROOT / path if path else None,
+                                            interval=float(settings.get("snapshot_interval", 15))).start()
+            except OSError as e:
+                print(f"  [METRICS] Exporter not started: {e}")
+                return None
+            if _exporter.port:
+                print(f"  [METRICS] Serving http://{settings.get('host', '127.0.0.1')}:{_exporter.port}/metrics")
+        return _exporter
+
+
+def stop_metrics():
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.stop()
+            _exporter = None
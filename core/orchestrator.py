@@ -2,17 +2,35 @@
 
 import json
 import os
-import subprocess
 import sys
 import time
 import datetime
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from core.logger import log_task_start, log_success, log_error, log_retry
+from core.logger import (end_task_span, flush_telemetry, log_task_start, log_success, log_error, log_retry,
+                         phase_span, task_context)
 from agents.registry import AGENTS, dispatch_task
+from clients import grok_fast_client
+from core.config import agent_config, load_config, workflow_config
+from core.dag import TaskGraph, compile_graph, normalize_depends_on
+from core.fileio import atomic_write_json, atomic_write_text
+from core.git_utils import GitError, get_commit_queue
+from core.journal import TaskJournal
+from core.lease import LeaseManager
+from core.merge import merge_sources
+from core.metrics import TASK_DURATION, TASK_OUTCOMES, TASKS, TASKS_REROUTED, start_metrics, stop_metrics
+from core.ratelimit import Cost, get_rate_limiters
+from core.retry import RetryQueue
+from core.scheduler import TaskScheduler
+from core.snapshot import assemble_context, get_snapshot
+from core.task_store import TaskStore
+from core.worktree import MergeConflict, get_worktree_pool
 
 # --- Configuration ---
 import pathlib
@@ -52,82 +70,209 @@ def setup_environment():
     print(f"  - Created/Ensured Prompts Dir: {PROMPTS_DIR}/")
 
 def load_task(task_id: str) -> dict:
-    """Loads a single task by its task_id."""
+    """Loads a single task by its task_id, including journaled updates."""
     task_file_path = TASKS_DIR / f"{task_id}.json"
     try:
         with open(task_file_path, 'r') as f:
-            return json.load(f)
+            return get_journal().overlay(json.load(f))
     except FileNotFoundError:
         # This might happen if a task file is deleted or not yet created
         return None
     except json.JSONDecodeError:
-        print(f"ERROR: Task file {task_file_path} contains invalid JSON.")
-        sys.exit(1)
+        print(f"ERROR: Task file {task_file_path} contains invalid JSON, skipping.")
+        return None
 
 def save_task(task: dict):
-    """Saves a single task to its JSON file."""
+    """Saves a single task to its JSON file (atomically, via temp file + rename)."""
     task_file_path = TASKS_DIR / f"{task['task_id']}.json"
-    with open(task_file_path, 'w') as f:
-        json.dump(task, f, indent=2)
+    atomic_write_json(task_file_path, task)
+    get_journal().supersede(task)
+
+_task_stores = {}
+_journals = {}
+_leases = {}
+
+def get_journal() -> TaskJournal:
+    """Returns the status-transition journal for the current TASKS_DIR."""
+    journal = _journals.get(TASKS_DIR)
+    if journal is None:
+        settings = load_config().get('journal') or {}
+        journal = _journals[TASKS_DIR] = TaskJournal(
+            TASKS_DIR,
+            compact_every=int(settings.get('compact_every', 200)),
+            fsync=bool(settings.get('fsync', False)))
+    return journal
+
+def get_task_store() -> TaskStore:
+    """Returns the cached TaskStore for the current TASKS_DIR."""
+    store = _task_stores.get(TASKS_DIR)
+    if store is None:
+        # inotify does not see files written by other hosts on a network share, so stat-scan when sharing
+        store = _task_stores[TASKS_DIR] = TaskStore(TASKS_DIR, watch=get_leases() is None)
+    return store
+
+def lease_settings() -> dict:
+    """The `leases` section, with AIFACTORY_LEASES=1|0 overriding `enabled`."""
+    settings = dict(load_config().get('leases') or {})
+    override = os.getenv('AIFACTORY_LEASES')
+    if override is not None:
+        settings['enabled'] = override.strip().lower() in ('1', 'true', 'yes', 'on')
+    return settings
+
+def get_leases():
+    """Returns the LeaseManager for the current TASKS_DIR, or None unless `leases.enabled`."""
+    if TASKS_DIR not in _leases:
+        settings = lease_settings()
+        _leases[TASKS_DIR] = LeaseManager.from_config(TASKS_DIR, settings) if settings.get('enabled') else None
+    return _leases[TASKS_DIR]
 
 def load_all_tasks() -> list:
-    """Loads all task files from the TASKS_DIR."""
-    tasks = []
+    """Loads all task files from the TASKS_DIR (re-parsing only files that changed)."""
     if not TASKS_DIR.exists():
         TASKS_DIR.mkdir(parents=True) # Ensure TASKS_DIR exists
         return []
-        
-    for filename in TASKS_DIR.iterdir():
-        if filename.suffix == ".json":
-            task_id = filename.stem
-            task = load_task(task_id)
-            if task:
-                tasks.append(task)
-    # Sort tasks by task_id to ensure consistent processing order
-    return sorted(tasks, key=lambda t: t['task_id'])
+    # Sorted by task_id to ensure consistent processing order
+    journal = get_journal()
+    return [journal.overlay(t) for t in get_task_store().load_all()]
+
+_reported_issues = set()
 
+def plan_tasks(tasks: list) -> TaskGraph:
+    """Compiles the task graph (normalizing depends_on in place) and warns once about each problem in it."""
+    graph = compile_graph(tasks)
+    for issue in graph.issues():
+        if issue not in _reported_issues:
+            _reported_issues.add(issue)
+            print(f"  [PLAN] WARNING: {issue}")
+    return graph
+
+def build_scheduler(tasks: list) -> TaskScheduler:
+    """A scheduler over `tasks` that starts the longest dependency chains first among equal priorities."""
+    graph = plan_tasks(tasks)
+    scheduler = TaskScheduler(tasks)
+    scheduler.set_ranks(graph.critical_path)
+    return scheduler
+
+def sync_scheduler(scheduler: TaskScheduler):
+    """Feeds task files added, changed or removed since the last refresh into the scheduler."""
+    changed, removed = get_task_store().refresh()
+    if not changed and not removed:
+        return
+    journal = get_journal()
+    changed = [journal.overlay(t) for t in changed]
+    # Critical paths only move when tasks appear, disappear, are re-wired or re-opened,
+    # not on the status change every completion writes
+    reshaped = any(task_id in scheduler for task_id in removed) or any(
+        t['task_id'] not in scheduler
+        or scheduler.deps_of(t['task_id']) != set(normalize_depends_on(t.get('depends_on')))
+        or scheduler.get(t['task_id'])['status'] == 'completed' and t['status'] != 'completed'
+        for t in changed)
+    scheduler.apply(changed, removed)
+    if reshaped:
+        scheduler.set_ranks(plan_tasks(scheduler.tasks()).critical_path)
 
 def get_next_task(tasks: list) -> dict:
-    """Finds the next ready task with status 'pending', considering dependencies."""
-    pending = [t for t in tasks if t['status'] == 'pending']
-    ready = [t for t in pending if all(dep['status'] == 'completed'
-            for dep_id in t.get('depends_on', [])
-            for dep in tasks if dep['task_id'] == dep_id)]
-    return min(ready, key=lambda t: t.get('priority', 10), default=None)
+    """Finds the next ready task with status 'pending', considering dependencies.
+
+    One-shot helper; the run loops keep a TaskScheduler across iterations instead.
+    """
+    return build_scheduler(tasks).peek()
+
+def print_plan(workers: int = 1):
+    """Prints the dependency levels, the critical path and the expected parallelism of the pending work."""
+    tasks = load_all_tasks()
+    graph = plan_tasks(tasks)
+    done = sum(1 for t in tasks if t.get('status') == 'completed')
+    print(f"Task graph: {len(graph.order) + len(graph.stuck) + sum(map(len, graph.cycles))} unfinished task(s), "
+          f"{done} completed")
+    for depth, ids in enumerate(graph.levels()):
+        shown = ", ".join(ids[:8]) + (f", ... (+{len(ids) - 8})" if len(ids) > 8 else "")
+        print(f"  Level {depth}: {len(ids)} task(s): {shown}")
+    chain = graph.critical_chain()
+    if chain:
+        print(f"Critical path ({len(chain)} task(s)): {' -> '.join(chain)}")
+        widest = max(map(len, graph.levels()))
+        rounds = max(graph.span, -(-len(graph.order) // workers))
+        print(f"Expected parallelism: {graph.parallelism:.1f} on average, {widest} at most; "
+              f"at least {rounds} round(s) of tasks with {workers} worker(s)")
+    if graph.issues():
+        print("Problems (see warnings above): tasks in or behind a cycle will never run.")
+
+def update_task_status(task: dict, new_status: str, **fields):
+    """Updates the status (and any extra fields) of a task and journals the change.
+
+    The task file itself is rewritten when the journal is compacted.
+    """
+    update_task_statuses([task], new_status, **fields)
 
-def update_task_status(task: dict, new_status: str):
-    """Updates the status of a specific task, updates timestamp, and saves it."""
-    task['status'] = new_status
-    task['updated_at'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    save_task(task)
+def update_task_statuses(tasks: list, new_status: str, **fields):
+    """Bulk version of update_task_status: one journal write for all tasks."""
+    fields = {'status': new_status,
+              'updated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+              **fields}
+    for task in tasks:
+        task.update(fields)
+    record_task_fields(tasks, fields)
+
+def record_task_fields(tasks: list, fields: dict):
+    """Persists `fields`, already set on `tasks`: in the journal, or with leases in the task files.
+
+    Workers sharing tasks/ only see each other's updates in the task files,
+    so those are rewritten (atomically) before the task's lease is released.
+    """
+    if get_leases() is not None:
+        for task in tasks:
+            save_task(task)
+    else:
+        get_journal().record_many({task['task_id']: fields for task in tasks})
 
 
 # --- 2. Protocol Enforcement ---
 
+_rejected_proposals = set()  # (name, mtime_ns, size) of proposals that did not parse
+
 def merge_proposals():
-    """Merges proposals from shared/proposals/ into shared/app/main.py."""
+    """Merges proposals from shared/proposals/ into shared/app/main.py.
+
+    Proposals are merged with core.merge (imports deduped, top-level
+    functions and classes replaced or added by name) and deleted once
+    applied. Ones that are not valid Python, or together would leave main.py
+    unable to compile, are left in place and skipped until they change. main.py is only rewritten, atomically, if it changes.
+    """
     proposals_dir = COLLABORATION_ROOT / 'shared' / 'proposals'
     if not proposals_dir.exists():
         proposals_dir.mkdir(parents=True)
-    proposals = [f for f in proposals_dir.iterdir() if f.suffix in ['.py', '.json']]
+    proposals = []
+    for prop in sorted(proposals_dir.iterdir()):
+        if prop.suffix not in ('.py', '.json'):
+            continue
+        st = prop.stat()
+        if (prop.name, st.st_mtime_ns, st.st_size) not in _rejected_proposals:
+            proposals.append((prop, (prop.name, st.st_mtime_ns, st.st_size)))
     if not proposals:
         return
-    # Simple merge: append all proposals with headers
-    merged_code = ""
-    for prop in sorted(proposals):
-        content = prop.read_text(encoding='utf-8')
-        header = f"# >>>>>>> PROPOSAL {prop.name}\n"
-        footer = f"# <<<<<<< END {prop.name}\n"
-        merged_code += header + content + footer + "\n\n"
 
     main_path = COLLABORATION_ROOT / 'shared' / 'app' / 'main.py'
     original = main_path.read_text(encoding='utf-8') if main_path.exists() else ""
-    new_content = original.rstrip() + "\n\n# === AUTO-MERGED PROPOSALS ===\n" + merged_code
-    main_path.write_text(new_content, encoding='utf-8')
-    # Clear proposals
-    for prop in proposals:
-        prop.unlink()
-    print(f"  [MERGE] Merged {len(proposals)} proposals into shared/app/main.py")
+    try:
+        merged, stats = merge_sources(original, [(prop.name, prop.read_text(encoding='utf-8')) for prop, _ in proposals])
+    except SyntaxError as e:
+        log_error(f"Cannot merge proposals: shared/app/main.py does not parse (line {e.lineno}: {e.msg})")
+        return
+    if merged != original:
+        main_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(main_path, merged)
+
+    invalid = dict(stats.invalid)
+    for prop, signature in proposals:
+        if prop.name in invalid:
+            _rejected_proposals.add(signature)
+            print(f"  [MERGE] Skipping {prop.name}: not valid Python ({invalid[prop.name]})")
+        else:
+            prop.unlink()
+    if stats.merged:
+        print(f"  [MERGE] Merged {len(stats.merged)} proposals into shared/app/main.py "
+              f"({stats.replaced} replaced, {stats.added} added, {stats.imports_added} imports)")
 
 def check_protocol(task):
     for file_path in task['files']:
@@ -135,12 +280,22 @@ def check_protocol(task):
         top_dir = rel.parts[0]
         if top_dir not in ALLOWED_TOP_DIRS:
             return False
-        if top_dir == ".github" and task['assignee'] != "grok-fast":
+        if top_dir == ".github" and runs_on(task) != "grok-fast":
             return False
     return True
 
 # --- 3. Agent Execution Functions ---
 
+def file_context(paths) -> str:
+    """Renders the task's files for a handoff prompt from the shared repository snapshot."""
+    ctx = assemble_context(
+        get_snapshot(COLLABORATION_ROOT), paths,
+        render=lambda rel, content: f"--- START OF {rel} ---\n```{content}\n```\n--- END OF {rel} ---\n\n",
+        missing=lambda rel: f"--- NOTE: File '{rel}' not found. Please create it. ---\n\n")
+    for rel in ctx.skipped:
+        print(f"  [HANDOFF] Skipping non-text file {rel}; attach it instead.")
+    return ctx.text
+
 def handle_gemini_handoff(task):
     """
     Generates a prompt for Gemini and provides instructions to the user.
@@ -153,14 +308,7 @@ def handle_gemini_handoff(task):
     prompt_filepath = PROMPTS_DIR / prompt_filename
     
     # Read the content of the files to be edited for the prompt
-    file_contents_for_prompt = ""
-    for relative_path in task['files']:
-        full_path = COLLABORATION_ROOT / relative_path
-        try:
-            content = full_path.read_text(encoding='utf-8')
-            file_contents_for_prompt += f"--- START OF {relative_path} ---\n```{content}\n```\n--- END OF {relative_path} ---\n\n"
-        except FileNotFoundError:
-            file_contents_for_prompt += f"--- NOTE: File '{relative_path}' not found. Please create it. ---\n\n"
+    file_contents_for_prompt = file_context(task['files'])
 
     # Construct the final prompt for the user/Gemini
     prompt_content = f"""
@@ -216,15 +364,8 @@ def handle_grok_4_1_handoff(task):
     prompt_filepath = PROMPTS_DIR / prompt_filename
     
     # Read the content of the files to be edited/referenced for the prompt
-    file_contents_for_prompt = ""
     if 'files' in task and task['files']:
-        for relative_path in task['files']:
-            full_path = COLLABORATION_ROOT / relative_path
-            try:
-                content = full_path.read_text(encoding='utf-8')
-                file_contents_for_prompt += f"--- START OF {relative_path} ---\n```{content}\n```\n--- END OF {relative_path} ---\n\n"
-            except FileNotFoundError:
-                file_contents_for_prompt += f"--- NOTE: File '{relative_path}' not found. Please create it. ---\n\n"
+        file_contents_for_prompt = file_context(task['files'])
     else:
         file_contents_for_prompt = "No specific files are referenced in this task. Grok 4.1 might be expected to generate new content."
 
@@ -273,12 +414,36 @@ def handle_grok_4_1_handoff(task):
     return False # Return False to indicate the orchestrator should stop
 
 def execute_grok_fast_task(task):
-    """Executes tasks assigned to 'grok-fast' by calling the client script."""
-    print(f"  [Grok-Fast] Delegating task {task['task_id']} to client script...")
-    
-    # Construct full paths for the client script
-    full_file_paths = [str(COLLABORATION_ROOT / fp) for fp in task['files']]
-    
+    """Executes tasks assigned to 'grok-fast' in-process via clients.grok_fast_client.
+
+    With `workflow.isolation: worktree` the task runs in its own git worktree
+    and its commit is merged back into the main branch on success.
+    """
+    if workflow_config().get('isolation') == 'worktree':
+        pool = get_worktree_pool()
+        worktree = pool.acquire(task['task_id'])
+        try:
+            if not run_grok_fast(task, worktree.path):
+                return False
+            with phase_span("merge", worktree=str(worktree.path)):
+                head = pool.integrate(worktree)
+            if head:
+                print(f"  [Grok-Fast] Task {task['task_id']} merged into main at {head[:10]}.")
+            return True
+        except MergeConflict as e:
+            print(f"  [Grok-Fast] ERROR: task {task['task_id']} not merged: {e}")
+            return False
+        finally:
+            pool.release(worktree)
+    return run_grok_fast(task, COLLABORATION_ROOT)
+
+def run_grok_fast(task, root) -> bool:
+    """Runs a grok-fast task against the checkout at `root` (committing there). Returns success."""
+    print(f"  [Grok-Fast] Running task {task['task_id']} in-process...")
+
+    # Construct full paths for the client
+    full_file_paths = [str(Path(root) / fp) for fp in task['files']]
+
     # Ensure directories exist for Grok's target files
     for full_path in full_file_paths:
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
@@ -286,35 +451,21 @@ def execute_grok_fast_task(task):
         if not os.path.exists(full_path):
             with open(full_path, 'w') as f: f.write(f"# Initial file for task {task['task_id']} by Orchestrator\n")
 
-    command = [
-        sys.executable,
-        str(SCRIPT_DIR.parent / 'clients' / 'grok_fast_client.py'),
-        '--description', task['description'],
-        '--task-id', task['task_id']
-    ]
-
-    # Only add the --files argument if the list of files is not empty
-    if full_file_paths:
-        command.extend(['--files'] + full_file_paths)
-    
-    print(f"  [DEBUG] Running command: {' '.join(command)}") # Added for debugging
-
+    # Shares the pooled LLM transport (and its keep-alive connections) across all tasks
     try:
-        # We don't capture output so the client can print directly to the console for debugging
-        result = subprocess.run(command, text=True, check=True, encoding='utf-8')
-        print(f"  [Grok-Fast] Task {task['task_id']} complete.")
-        return True
-            
-    except subprocess.CalledProcessError as e:
-        print(f"  [Grok-Fast] ERROR: Client script failed for task {task['task_id']}.")
-        if e.stderr:
-            print("  --- Grok-Fast Client STDERR ---\n" + e.stderr.strip() + "\n  ---------------------------------")
-        else:
-            print("  --- No stderr output ---")
-        return False
-    except FileNotFoundError:
-        print(f"  [Grok-Fast] ERROR: 'grok_fast_client.py' not found at {SCRIPT_DIR.parent / 'clients' / 'grok_fast_client.py'}.")
+        result = grok_fast_client.run_task(task['task_id'], task['description'], full_file_paths,
+                                           root=None if Path(root) == COLLABORATION_ROOT else root)
+    except GitError as e:
+        print(f"  [Grok-Fast] ERROR: task {task['task_id']} could not be committed: {e}")
         return False
+    timings = ", ".join(f"{phase}={secs:.2f}s" for phase, secs in result.timings.items())
+    if result.ok:
+        saved = f", ~{result.edits.tokens_saved} tokens saved by edits" if result.edits.edit_blocks else ""
+        print(f"  [Grok-Fast] Task {task['task_id']} {result.status} ({timings}{saved}).")
+        return True
+
+    print(f"  [Grok-Fast] ERROR: task {task['task_id']} {result.status}: {result.error}")
+    return False
 
 # Set up agent registry
 AGENTS["grok-fast"]["executor"] = execute_grok_fast_task
@@ -367,7 +518,515 @@ def create_pr(proposals):
 
 # --- 5. Main Workflow ---
 
-def main_workflow():
+def run_task(task):
+    """Dispatches a task to its agent. Returns (success, duration in seconds)."""
+    success = False
+    start_time = time.time()
+
+    try:
+        with task_context(task['task_id']):
+            success = dispatch_task(task, runs_on(task))
+    except ValueError as e:
+        print(f"  ERROR: {e}")
+
+    return success, time.time() - start_time
+
+def finish_task(task, success, duration, max_retries: int = 3) -> str:
+    """Records the outcome of a dispatched task.
+
+    Returns 'completed', 'handoff' (parked for manual input), 'retry'
+    (back to pending with retry_count incremented) or 'failed'.
+    """
+    outcome = _finish_task(task, success, duration, max_retries)
+    TASK_OUTCOMES.inc(assignee=task['assignee'], outcome=outcome)
+    TASK_DURATION.observe(duration, assignee=task['assignee'], outcome=outcome)
+    return outcome
+
+def _finish_task(task, success, duration, max_retries):
+    if success:
+        log_success(task['task_id'], duration)
+        update_task_status(task, 'completed')
+        return 'completed'
+    if task['status'].startswith('awaiting_'):
+        # Handoffs return False but have already parked the task for manual input
+        end_task_span(task['task_id'], 'handoff')
+        return 'handoff'
+    if task.get("retry_count", 0) < max_retries:
+        retry_count = task.get("retry_count", 0) + 1
+        update_task_status(task, 'pending', retry_count=retry_count)
+        log_retry(task['task_id'], retry_count)
+        return 'retry'
+    log_error(f"Task {task['task_id']} failed after {max_retries} retries; its dependents will not run.",
+              task_id=task['task_id'])
+    update_task_status(task, 'failed')
+    return 'failed'
+
+def agent_limits(workers: int) -> dict:
+    """Per-assignee concurrency limits from `agents.<name>.max_concurrency` in config.yaml."""
+    return {name: int(agent_config(name).get('max_concurrency', workers)) for name in AGENTS}
+
+_reported_fallbacks = set()
+
+def agent_fallbacks() -> dict:
+    """Agents that may take an assignee's ready tasks while it is at capacity, from `agents.<name>.fallback`.
+
+    Fallbacks without an executor or handoff (e.g. the agent-N placeholders) are dropped with a warning.
+    """
+    fallbacks = {}
+    for name in AGENTS:
+        fallbacks[name] = []
+        for agent in agent_config(name).get('fallback') or []:
+            handler = AGENTS.get(agent) or {}
+            if handler.get('executor') or handler.get('handoff'):
+                fallbacks[name].append(agent)
+            elif (name, agent) not in _reported_fallbacks:
+                _reported_fallbacks.add((name, agent))
+                print(f"  [CONFIG] WARNING: agents.{name}.fallback lists {agent}, which has no executor or "
+                      "handoff; ignoring it")
+    return fallbacks
+
+def runs_on(task) -> str:
+    """The agent a task is dispatched to: its assignee, unless it was rerouted to a fallback."""
+    return task.get('rerouted_to') or task['assignee']
+
+PROMPT_OVERHEAD_TOKENS = 500  # system prompt and instructions around the task
+MIN_OUTPUT_TOKENS = 256
+
+def estimate_cost(task) -> Cost:
+    """Rough LLM cost of one run of `task`: description and files in, the files rewritten out.
+
+    A task can override the output side with `estimated_output_tokens`.
+    """
+    bytes_per_token = int((load_config().get('context') or {}).get('bytes_per_token', 4))
+    file_bytes = 0
+    for rel in task.get('files', []):
+        try:
+            file_bytes += (WORKSPACE_DIR / rel).stat().st_size
+        except OSError:
+            pass  # not created yet
+    prompt_tokens = (len(task.get('description', '')) + file_bytes) // bytes_per_token + PROMPT_OVERHEAD_TOKENS
+    output_tokens = task.get('estimated_output_tokens', file_bytes // bytes_per_token + MIN_OUTPUT_TOKENS)
+    return Cost(requests=1, input_tokens=prompt_tokens, output_tokens=int(output_tokens))
+
+class TaskRunner:
+    """Dispatches ready tasks onto a thread pool and applies their outcomes.
+
+    Each assignee is capped by its `max_concurrency` and by its rate limits
+    (core/ratelimit.py), which are charged with the task's estimated cost on
+    dispatch. A ready task that does not fit its assignee goes to the first
+    `fallback` agent with room (recorded as `rerouted_to`; the assignee is
+    kept), or waits while smaller or other agents' tasks are dispatched past
+    it. Once a rate-limited task has been passed over `reserve_after_skips`
+    times, the budgets it waits for are reserved for it: nothing else is
+    charged to those agents until it fits. A completion immediately makes its dependents
+    eligible. A failed task is parked in a RetryQueue
+    (still claimed, so it is not dispatched) until its backoff delay passes,
+    while other ready tasks keep running. A task that fails for good only
+    blocks its own dependents.
+
+    With `leases.enabled`, several runners (processes or hosts) can share
+    tasks/: a popped task only runs once its lease (core/lease.py) is
+    claimed and its file still says 'pending'. Tasks leased by another
+    worker stay claimed here and are re-read once that lease is released
+    or expires, which is how a crashed worker's tasks are taken over.
+    """
+
+    def __init__(self, workers: int, scheduler: TaskScheduler, on_done=None, retries: RetryQueue = None):
+        self.workers = workers
+        self.scheduler = scheduler
+        self.retries = retries or RetryQueue.from_config(workflow_config())
+        self.limits = agent_limits(workers)
+        self.rate_limits = get_rate_limiters()
+        self.fallbacks = agent_fallbacks()
+        self.throttled_for = None  # seconds until a rate-limited ready task may fit, if any
+        self.reserve_after = int(workflow_config().get('reserve_after_skips', 3))
+        self._costs = {}  # task_id -> (task, estimated Cost), until the task is dispatched
+        self._deferred = set()  # (task_id, agent) already counted as deferred this round
+        self._skips = Counter()  # task_id -> dispatch rounds it was held back by a rate limit
+        self._skipped = set()  # task_ids already counted this round
+        self.reserved = {}  # agent -> task_id its rate-limit budget is held for
+        self.running = {}  # future -> task
+        self.per_agent = Counter()
+        self.failed = []  # task_ids that failed for good
+        self.leases = get_leases()
+        self.held_elsewhere = set()  # task_ids leased by other workers, claimed here until they are released
+        self.lease_wait = None  # seconds until those leases are checked again, if any
+        if self.leases is not None:
+            self.leases.start()
+        self._on_done = on_done  # called from the worker thread when a task finishes
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent')
+        TASKS.set_function(self.task_states)
+
+    def task_states(self) -> dict:
+        """Queue depth for the metrics gauge: tasks by status, ready, blocked, running and retrying."""
+        counts = self.scheduler.state_counts()
+        counts['running'] = len(self.running)
+        counts['retrying'] = len(self.retries)
+        if self.held_elsewhere:
+            counts['leased_elsewhere'] = len(self.held_elsewhere)
+        return {(state,): n for state, n in counts.items()}
+
+    @property
+    def busy(self) -> bool:
+        """True while tasks are running, waiting to be retried, for a rate limit to refill or for another worker."""
+        return bool(self.running or self.retries or self.throttled_for is not None or self.held_elsewhere)
+
+    def _cost(self, task) -> Cost:
+        """The task's estimated cost, stat'ed once per version of the task rather than on every dispatch pass."""
+        cached = self._costs.get(task['task_id'])
+        if cached is None or cached[0] is not task:  # a reload replaces the dict, and may change its files
+            cached = self._costs[task['task_id']] = (task, estimate_cost(task))
+        return cached[1]
+
+    def _pick_agent(self, task):
+        """The assignee, or else the first fallback, with a free slot and room in its rate limits; None if none has."""
+        candidates = [task['assignee'], *self.fallbacks.get(task['assignee'], [])]
+        throttled = False
+        for agent in candidates:
+            if agent not in AGENTS or self.per_agent[agent] >= self.limits.get(agent, self.workers):
+                continue
+            if self.reserved.get(agent, task['task_id']) != task['task_id']:
+                continue  # its budget is held for a task that has waited longer
+            limiter = self.rate_limits.get(agent)
+            if limiter is not None:
+                wait = limiter.wait_time(self._cost(task))
+                if wait > 0:
+                    if (task['task_id'], agent) not in self._deferred:
+                        self._deferred.add((task['task_id'], agent))
+                        limiter.defer(self._cost(task))
+                    self.throttled_for = wait if self.throttled_for is None else min(self.throttled_for, wait)
+                    throttled = True
+                    continue
+            return agent
+        if throttled and task['task_id'] not in self._skipped:
+            self._skipped.add(task['task_id'])
+            self._skips[task['task_id']] += 1
+            if self._skips[task['task_id']] >= self.reserve_after:
+                for agent in candidates:
+                    if agent in self.rate_limits:
+                        self.reserved.setdefault(agent, task['task_id'])
+        return None
+
+    def _has_capacity(self, task):
+        return self._pick_agent(task) is not None
+
+    def _assignee_open(self, assignee) -> bool:
+        """False while the assignee and all its fallbacks are at max_concurrency, so its tasks are skipped unseen."""
+        return any(agent in AGENTS and self.per_agent[agent] < self.limits.get(agent, self.workers)
+                   for agent in [assignee, *self.fallbacks.get(assignee, [])])
+
+    def _claim_agent(self, task):
+        """Charges the task to the agent picked for it, noting a reroute if that is not its assignee."""
+        agent = self._pick_agent(task) or task['assignee']
+        limiter = self.rate_limits.get(agent)
+        if limiter is not None:
+            limiter.try_acquire(self._cost(task))
+        self._forget(task['task_id'])
+        rerouted_to = agent if agent != task['assignee'] else None
+        if rerouted_to:
+            print(f"  [DISPATCH] Task {task['task_id']}: {task['assignee']} is at capacity, sending it to {agent}")
+            TASKS_REROUTED.inc(from_agent=task['assignee'], to_agent=agent)
+        if task.get('rerouted_to') != rerouted_to:
+            task['rerouted_to'] = rerouted_to
+            record_task_fields([task], {'rerouted_to': rerouted_to})
+
+    def _forget(self, task_id):
+        """Drops a task's cached cost, skip count and reservations (it was dispatched or left the queue)."""
+        self._costs.pop(task_id, None)
+        self._skips.pop(task_id, None)
+        self.reserved = {agent: held for agent, held in self.reserved.items() if held != task_id}
+
+    def _settle(self, task):
+        self.scheduler.release(task['task_id'])
+        self.scheduler.update(task)
+        if self.leases is not None:
+            self.leases.release(task['task_id'])  # after its outcome is in the task file
+
+    def _reload(self, task_id, current):
+        """Replaces the scheduler's copy of a task with `current`, as read from its file (None if deleted)."""
+        self.scheduler.release(task_id)
+        if current is None:
+            self.scheduler.remove(task_id)
+            self._forget(task_id)
+        else:
+            self.scheduler.update(current)
+
+    def _lease(self, task) -> bool:
+        """Claims the lease on a popped task. False if another worker holds it or has already run it."""
+        task_id = task['task_id']
+        if not self.leases.claim(task_id):
+            self.held_elsewhere.add(task_id)
+            return False
+        current = load_task(task_id)  # it may have been finished since the last refresh
+        if current is None or current.get('status') != 'pending':
+            self.leases.release(task_id)
+            self._reload(task_id, current)
+            return False
+        task.update(current)
+        return True
+
+    def check_leases(self):
+        """Re-reads tasks whose lease another worker has released or let expire, making them schedulable again."""
+        for task_id in list(self.held_elsewhere):
+            if self.leases.holder(task_id) is None:
+                self.held_elsewhere.discard(task_id)
+                self._reload(task_id, load_task(task_id))
+        self.lease_wait = self.leases.poll if self.held_elsewhere else None
+
+    def release_due_retries(self):
+        for task_id in self.retries.pop_due():
+            self.scheduler.release(task_id)
+
+    def fail_uncommitted(self):
+        """Marks completed tasks failed whose files were in a batched commit (git.batch_size) that failed."""
+        for task_id, error in get_commit_queue().take_failed():
+            task = self.scheduler.get(task_id)
+            if task is None or task.get('status') != 'completed':
+                continue
+            log_error(f"Task {task_id} failed: its batched commit did not go through ({error})", task_id=task_id)
+            update_task_status(task, 'failed')
+            self.failed.append(task_id)
+            self.scheduler.update(task)
+
+    def dispatch_ready(self) -> int:
+        """Starts as many ready tasks as there are free slots. Returns how many started."""
+        self.fail_uncommitted()
+        self.release_due_retries()
+        if self.leases is not None:
+            self.check_leases()
+        self.throttled_for = None
+        self._deferred.clear()
+        self._skipped.clear()
+        for task_id in set(self.reserved.values()):
+            if not self.scheduler.is_ready(task_id):  # removed, edited or run elsewhere meanwhile
+                self._forget(task_id)
+        started = 0
+        while len(self.running) < self.workers:
+            task = self.scheduler.pop_ready(accept=self._has_capacity, is_open=self._assignee_open)
+            if task is None:
+                break
+            if self.leases is not None and not self._lease(task):
+                continue
+
+            self._claim_agent(task)
+            log_task_start(task)
+            if not check_protocol(task):
+                log_error(f"Task {task['task_id']} failed due to protocol violation; its dependents will not run.",
+                          task_id=task['task_id'])
+                update_task_status(task, 'failed')
+                self.failed.append(task['task_id'])
+                self._settle(task)
+                continue
+
+            self.per_agent[runs_on(task)] += 1
+            future = self._pool.submit(run_task, task)
+            if self._on_done:
+                future.add_done_callback(self._on_done)
+            self.running[future] = task
+            started += 1
+        return started
+
+    def reap(self, timeout=None) -> int:
+        """Waits up to `timeout` (or the next retry, rate limit refill or lease check, if sooner) for running tasks
+        and records them."""
+        for wake in (self.retries.next_due_in(), self.throttled_for, self.lease_wait):
+            if wake is not None:
+                timeout = wake if timeout is None else min(timeout, wake)
+        if not self.running:
+            if timeout:
+                time.sleep(timeout)
+            return 0
+
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            task = self.running.pop(future)
+            self.per_agent[runs_on(task)] -= 1
+            success, duration = future.result()
+            if self.leases is not None and not self.leases.owns(task['task_id']):
+                # Stalled past the TTL and taken over: the new holder's run counts, not this one
+                print(f"  [LEASE] Task {task['task_id']} lost its lease while running; leaving it to the new holder")
+                end_task_span(task['task_id'], 'lease_lost')
+                self.held_elsewhere.add(task['task_id'])
+                continue
+            outcome = finish_task(task, success, duration, self.retries.max_retries)
+            if outcome == 'retry':
+                self.scheduler.update(task)  # stays claimed until the backoff passes
+                delay = self.retries.park(task['task_id'], task['retry_count'])
+                print(f"  [RETRY] Task {task['task_id']} will be retried in {delay:.1f}s")
+                continue
+            if outcome == 'failed':
+                self.failed.append(task['task_id'])
+            self._settle(task)
+        return len(done)
+
+    def drain(self):
+        """Waits for every running task to finish (parked retries are left pending)."""
+        while self.running:
+            self.reap()
+
+    def shutdown(self):
+        self.drain()
+        self._pool.shutdown(wait=True)
+        get_commit_queue().flush()  # commit any partially filled batch
+        self.fail_uncommitted()
+        if self.leases is not None:
+            self.leases.stop()  # hands parked retries back to the other workers
+
+def run_tasks(workers: int = 1):
+    """Runs ready tasks on up to `workers` threads until nothing is left to do."""
+    runner = TaskRunner(workers, build_scheduler(load_all_tasks()))
+    try:
+        while True:
+            runner.dispatch_ready()
+            if not runner.busy:
+                break
+            runner.reap()
+            # Pick up tasks created by agents (e.g. help requests);
+            # tasks still in flight keep their in-memory state.
+            sync_scheduler(runner.scheduler)
+    finally:
+        runner.shutdown()
+
+    blocked = runner.scheduler.blocked()
+    never, waiting_on = set(), Counter()
+    if blocked:
+        graph = compile_graph(runner.scheduler.tasks())
+        never = set(blocked) & set(graph.stuck).union(*graph.cycles)
+        for task_id in set(blocked) - never:
+            for dep in graph.depends_on[task_id]:
+                dep_task = runner.scheduler.get(dep)
+                if dep_task is not None and dep_task['status'] not in ('completed', 'pending'):
+                    waiting_on[dep_task['status']] += 1
+    if runner.failed:
+        print(f"\nFinished with {len(runner.failed)} failed task(s): {', '.join(runner.failed)}. "
+              "Tasks depending on them were not run.")
+    elif never:
+        print(f"\nStopped with {len(never)} pending task(s) whose dependencies can never finish "
+              "(see the [PLAN] warnings; run with --plan for the task graph).")
+    elif blocked:
+        statuses = ", ".join(f"{status} ({n})" for status, n in sorted(waiting_on.items())) or "unfinished"
+        print(f"\nStopped with {len(blocked)} pending task(s) waiting on tasks that are {statuses}; "
+              "they run once those are completed (e.g. after a handoff is ingested).")
+    else:
+        print("\nAll tasks completed. Exiting.")
+
+class OrchestratorDaemon:
+    """Long-lived orchestrator: keeps tasks in memory and wakes on file changes.
+
+    Blocks in select() on inotify events for tasks/ and shared/proposals/ and
+    on a self-pipe that task completions, signals and stop() write to, so an
+    idle daemon uses no CPU. Bursts of events are debounced for `debounce`
+    seconds before the task store is refreshed. Without inotify the
+    directories are stat-scanned every `poll_interval` seconds instead.
+    Stopping lets running tasks finish and compacts the journal.
+    """
+
+    def __init__(self, workers: int = 1, debounce: float = 0.1, poll_interval: float = 1.0):
+        self.workers = workers
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.proposals_dir = COLLABORATION_ROOT / 'shared' / 'proposals'
+        self._stop_requested = False
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    def wake(self, *_):
+        try:
+            os.write(self._wake_w, b'x')
+        except BlockingIOError:
+            pass  # pipe already full, the loop is awake anyway
+
+    def stop(self):
+        self._stop_requested = True
+        self.wake()
+
+    def _on_signal(self, signum, _frame):
+        print(f"\n  [DAEMON] Received signal {signum}, shutting down after running tasks finish...")
+        self.stop()
+
+    def _drain_wake_pipe(self):
+        try:
+            while os.read(self._wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _collect_events(self, watcher) -> set:
+        """Debounce: keep collecting events until the directories are quiet."""
+        changed = set()
+        while True:
+            events = watcher.poll(self.debounce)
+            if events is None:
+                changed.add(self.proposals_dir)  # queue overflow: assume anything changed
+                continue
+            if not events:
+                return changed
+            changed |= events
+
+    def run(self):
+        import select
+        import signal
+        from core.fswatch import open_watcher
+
+        setup_environment()
+        self.proposals_dir.mkdir(parents=True, exist_ok=True)
+        get_journal().compact()  # Fold in anything left by a crashed run
+        merge_proposals()
+        start_metrics()
+
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous_handlers[signum] = signal.signal(signum, self._on_signal)
+
+        watcher = open_watcher([TASKS_DIR, self.proposals_dir])
+        runner = TaskRunner(self.workers, build_scheduler(load_all_tasks()), on_done=self.wake)
+        mode = "inotify" if watcher else f"polling every {self.poll_interval}s"
+        print(f"  [DAEMON] Watching {TASKS_DIR} and {self.proposals_dir} ({mode}), workers={self.workers}")
+
+        try:
+            while not self._stop_requested:
+                runner.dispatch_ready()
+                if not runner.running:
+                    get_journal().compact()  # idle: make the task files current
+                    get_commit_queue().flush()
+
+                # Sleep until a file event, a completion, a signal, the next retry, a rate limit refill
+                # or, when sharing tasks/ with other workers, the next look at their task files and leases
+                timeout = None if watcher else self.poll_interval
+                lease_poll = runner.leases.poll if runner.leases is not None else None
+                for wake in (runner.retries.next_due_in(), runner.throttled_for, lease_poll):
+                    if wake is not None:
+                        timeout = wake if timeout is None else min(timeout, wake)
+                fds = [self._wake_r] + ([watcher.fileno()] if watcher else [])
+                readable, _, _ = select.select(fds, [], [], timeout)
+                if self._wake_r in readable:
+                    self._drain_wake_pipe()
+                runner.reap(timeout=0)
+
+                changed = self._collect_events(watcher) if watcher and watcher.fileno() in readable else set()
+                if not watcher or any(p == self.proposals_dir or p.parent == self.proposals_dir for p in changed):
+                    merge_proposals()
+                sync_scheduler(runner.scheduler)
+        finally:
+            runner.shutdown()
+            get_journal().compact()
+            flush_telemetry()  # as main_workflow does, or spans still buffered are lost on shutdown
+            stop_metrics()
+            if watcher:
+                watcher.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            print("  [DAEMON] Stopped.")
+
+def run_daemon(workers: int = 1, debounce: float = 0.1, poll_interval: float = 1.0):
+    """Runs the orchestrator as a daemon until SIGINT/SIGTERM."""
+    OrchestratorDaemon(workers, debounce, poll_interval).run()
+
+def main_workflow(workers: int = 1):
     """The main execution loop of the orchestrator."""
     print("====================================================")
     print("  Multi-Agent Orchestrator (Protocol Version 4.0)  ")
@@ -375,68 +1034,49 @@ def main_workflow():
 
     setup_environment()
     merge_proposals()  # Merge any pending proposals
-    tasks = load_all_tasks()
+    get_journal().compact()  # Fold in anything left by a crashed run
+    start_metrics()
 
-    while True:
-        current_task = get_next_task(tasks)
-
-        if not current_task:
-            print("\nAll tasks completed. Exiting.")
-            break
-
-        log_task_start(current_task)
+    try:
+        run_tasks(workers)
+    finally:
+        get_journal().compact()  # Task files in Git always reflect the final state
+        flush_telemetry()
+        stop_metrics()
 
-        # PROTOCOL ENFORCEMENT
-        if not check_protocol(current_task):
-            success = False
-            new_status = 'failed'
-            log_error("Task failed due to protocol violation. Stopping orchestrator.")
-        else:
-            # If protocol check passes, execute the task
-            success = False
-            start_time = time.time()
-
-            try:
-                success = dispatch_task(current_task)
-            except ValueError as e:
-                print(f"  ERROR: {e}")
-
-            end_time = time.time()
-
-            if success:
-                new_status = 'completed'
-                log_success(current_task['task_id'], end_time - start_time)
-            else:
-                # Retry logic
-                if current_task.get("retry_count", 0) < 3:
-                    current_task["retry_count"] = current_task.get("retry_count", 0) + 1
-                    new_status = 'pending'  # retry next loop
-                    log_retry(current_task['task_id'], current_task['retry_count'])
-                    success = True  # Don't break the loop
-                else:
-                    new_status = 'failed'
-                    log_error(f"Task {current_task['task_id']} failed after retries. Stopping orchestrator.")
-
-        # Update and save the specific task file
-        update_task_status(current_task, new_status)
-
-        if not success:
-            break # Stop the loop if a task fails
-
-        # Re-load all tasks to reflect changes (e.g., status update) and get new tasks if any were added
-        # This is important if task dependencies or new tasks are created during execution
-        tasks = load_all_tasks()
-            
     print("\n========================================\n  Orchestrator run finished.\n========================================")
 
+def positive_int(value: str) -> int:
+    """argparse type for counts such as --workers: a usage error unless it is a whole number of at least 1."""
+    import argparse
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--create-pr', action='store_true', help='Create a PR from proposals')
     parser.add_argument('--proposal', nargs='*', help='Proposal files to include in PR')
+    parser.add_argument('--workers', type=positive_int, default=1, help='Run up to N ready tasks concurrently')
+    parser.add_argument('--daemon', action='store_true', help='Keep running and react to new tasks/proposals')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore cached LLM responses (fresh ones are still stored)')
+    parser.add_argument('--plan', action='store_true', help='Print the task graph schedule and expected parallelism, then exit')
     args = parser.parse_args()
 
-    if args.create_pr:
+    if args.no_cache:
+        from clients.cache import get_cache
+        get_cache().bypass = True
+
+    if args.plan:
+        print_plan(workers=args.workers)
+    elif args.create_pr:
         create_pr(args.proposal or [])
+    elif args.daemon:
+        run_daemon(workers=args.workers)
     else:
-        main_workflow()
\ No newline at end of file
+        main_workflow(workers=args.workers)
\ No newline at end of file
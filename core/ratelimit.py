@@ -0,0 +1,124 @@
+# ratelimit.py - Per-agent token buckets for requests and tokens per minute
+#
+# Configured under `agents.<name>.rate_limits` in core/config.yaml:
+#
+#   rate_limits:
+#     requests_per_minute: 60
+#     input_tokens_per_minute: 200000
+#     output_tokens_per_minute: 40000
+#
+# The orchestrator charges a task's estimated cost when it dispatches it
+# (one request, its prompt and its expected output), so it can pick a
+# smaller ready task, or a fallback agent, while a budget refills instead of
+# running into provider 429s and burning retries.
+import threading
+import time
+from dataclasses import dataclass
+
+from core.metrics import RATE_LIMIT_AVAILABLE, RATE_LIMIT_CHARGED, RATE_LIMIT_DEFERRED
+
+LIMITS = {"requests": "requests_per_minute",
+          "input_tokens": "input_tokens_per_minute",
+          "output_tokens": "output_tokens_per_minute"}
+
+
+class TokenBucket:
+    """Holds up to `capacity` units and refills at `rate_per_minute`.
+
+    A cost larger than the capacity is clamped to it, so it waits for a full
+    bucket rather than forever.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._stamp = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` units are available (0 if they are now)."""
+        missing = min(cost, self.capacity) - self.available
+        return max(0.0, missing / self.rate) if self.rate else (0.0 if missing <= 0 else float("inf"))
+
+    def take(self, cost: float):
+        self._refill()
+        self._tokens -= min(cost, self.capacity)
+
+
+@dataclass
+class Cost:
+    requests: int = 1
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class AgentRateLimiter:
+    """One bucket per configured limit of an agent; a task is admitted only if every bucket has room."""
+
+    def __init__(self, agent: str, clock=time.monotonic, **per_minute):
+        self.agent = agent
+        self.buckets = {limit: TokenBucket(float(per_minute[key]), clock=clock)
+                        for limit, key in LIMITS.items() if per_minute.get(key)}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, agent: str, settings: dict, clock=time.monotonic):
+        return cls(agent, clock=clock, **{key: settings.get(key) for key in LIMITS.values()})
+
+    def wait_time(self, cost: Cost) -> float:
+        """Seconds until `cost` fits every bucket; 0 if it fits now."""
+        with self._lock:
+            return max((bucket.wait_time(getattr(cost, limit)) for limit, bucket in self.buckets.items()), default=0.0)
+
+    def short_limits(self, cost: Cost) -> list:
+        """The limits that have no room for `cost` right now."""
+        with self._lock:
+            return [limit for limit, bucket in self.buckets.items() if bucket.wait_time(getattr(cost, limit)) > 0]
+
+    def defer(self, cost: Cost):
+        """Counts a task held back because `cost` did not fit."""
+        for limit in self.short_limits(cost):
+            RATE_LIMIT_DEFERRED.inc(agent=self.agent, limit=limit)
+
+    def try_acquire(self, cost: Cost) -> bool:
+        """Charges `cost` if it fits every bucket now."""
+        with self._lock:
+            if any(bucket.wait_time(getattr(cost, limit)) > 0 for limit, bucket in self.buckets.items()):
+                return False
+            for limit, bucket in self.buckets.items():
+                bucket.take(getattr(cost, limit))
+                RATE_LIMIT_CHARGED.inc(getattr(cost, limit), agent=self.agent, limit=limit)
+            return True
+
+    def available(self) -> dict:
+        with self._lock:
+            return {limit: bucket.available for limit, bucket in self.buckets.items()}
+
+
+_limiters = None
+_lock = threading.Lock()
+
+def get_rate_limiters() -> dict:
+    """Process-wide limiters for every agent with `rate_limits` in core/config.yaml, by agent name."""
+    global _limiters
+    with _lock:
+        if _limiters is None:
+            from core.config import load_config
+            agents = load_config().get("agents") or {}
+            _limiters = {name: AgentRateLimiter.from_config(name, settings["rate_limits"])
+                         for name, settings in agents.items() if (settings or {}).get("rate_limits")}
+            RATE_LIMIT_AVAILABLE.set_function(lambda: {
+                (name, limit): tokens for name, limiter in _limiters.items()
+                for limit, tokens in limiter.available().items()})
+        return _limiters
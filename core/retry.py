@@ -0,0 +1,64 @@
+# retry.py - Delayed retry queue with exponential backoff and jitter
+import heapq
+import random
+import time
+
+
+class RetryQueue:
+    """Parks failed tasks until their backoff delay has passed.
+
+    The delay for attempt n is base_delay * 2**(n-1), capped at max_delay,
+    with the top `jitter` fraction randomized so that tasks failing together
+    against the same endpoint do not all come back at once.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 5.0, max_delay: float = 300.0,
+                 jitter: float = 0.5, clock=time.monotonic, rng=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._heap = []  # (due time, task_id)
+        self._parked = set()
+
+    @classmethod
+    def from_config(cls, workflow: dict):
+        return cls(max_retries=int(workflow.get('max_retries', 3)),
+                   base_delay=float(workflow.get('retry_base_delay', 5.0)),
+                   max_delay=float(workflow.get('retry_max_delay', 300.0)),
+                   jitter=float(workflow.get('retry_jitter', 0.5)))
+
+    def __len__(self):
+        return len(self._parked)
+
+    def __contains__(self, task_id):
+        return task_id in self._parked
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** max(attempt - 1, 0))
+        return delay * (1 - self.jitter * self._rng.random())
+
+    def park(self, task_id: str, attempt: int) -> float:
+        """Schedules a retry. Returns the delay in seconds."""
+        delay = self.backoff(attempt)
+        heapq.heappush(self._heap, (self._clock() + delay, task_id))
+        self._parked.add(task_id)
+        return delay
+
+    def pop_due(self) -> list:
+        """Returns the task_ids whose delay has passed, earliest first."""
+        now = self._clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id = heapq.heappop(self._heap)
+            self._parked.discard(task_id)
+            due.append(task_id)
+        return due
+
+    def next_due_in(self):
+        """Seconds until the next retry is due (0 if overdue), or None if nothing is parked."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
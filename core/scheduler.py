@@ -0,0 +1,261 @@
+# scheduler.py - Incremental ready-queue over the task DAG
+import heapq
+from collections import defaultdict
+
+from core.dag import normalize_depends_on
+
+DEFAULT_PRIORITY = 10
+
+
+class TaskScheduler:
+    """Keeps pending tasks in a priority heap, ordered like get_next_task.
+
+    A task is ready when its status is 'pending', it is not claimed (i.e.
+    already dispatched), and every dependency that exists is 'completed'.
+    Dependencies that are not in the scheduler count as satisfied, as they
+    always have in the orchestrator.
+
+    Ties on `priority` are broken by rank (set_ranks(), e.g. the critical
+    path lengths from core.dag, highest first) and then by task_id, which
+    is the order load_all_tasks() returns them in. Every update touches
+    only the task and its direct dependents, so picking the next task is
+    O(log n). Ready tasks are kept in one heap per assignee, so pop_ready()
+    can skip every task of a saturated assignee at once.
+    """
+
+    def __init__(self, tasks=()):
+        self._tasks = {}                     # task_id -> task dict
+        self._indegree = {}                  # task_id -> number of unfinished dependencies
+        self._dependents = defaultdict(set)  # dep task_id -> task_ids that depend on it
+        self._heaps = defaultdict(list)      # assignee -> heap of (priority, -rank, task_id)
+        self._in_heap = {}                   # task_id -> (assignee, priority, -rank) of its live heap entry
+        self._ranks = {}                     # task_id -> tie-breaking rank
+        self._claimed = set()
+        # Status and deps as last seen by update(); callers often mutate the
+        # task dict in place before calling update(), so never read them back
+        self._open = set()                   # task_ids present and not 'completed'
+        self._dep_ids = {}                   # task_id -> set of dependency ids
+        for task in tasks:
+            self.update(task)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def tasks(self) -> list:
+        return list(self._tasks.values())
+
+    @staticmethod
+    def _deps(task):
+        return set(normalize_depends_on(task.get('depends_on')))
+
+    @staticmethod
+    def _priority(task):
+        return task.get('priority', DEFAULT_PRIORITY)
+
+    def state_counts(self) -> dict:
+        """Task counts by status, plus 'ready' and 'blocked' (pending but waiting on dependencies).
+
+        O(n); meant for metrics collection, not the dispatch loop.
+        """
+        counts = {}
+        for task_id, task in list(self._tasks.items()):
+            status = task.get('status', 'unknown')
+            counts[status] = counts.get(status, 0) + 1
+            if status == 'pending' and task_id not in self._claimed:
+                state = 'ready' if self._indegree.get(task_id, 0) == 0 else 'blocked'
+                counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def deps_of(self, task_id) -> set:
+        """Normalized dependencies of a task as last seen by update(), or None if it is not here."""
+        return self._dep_ids.get(task_id)
+
+    def is_ready(self, task_id) -> bool:
+        task = self._tasks.get(task_id)
+        return (task is not None and task['status'] == 'pending'
+                and task_id not in self._claimed and self._indegree[task_id] == 0)
+
+    def _push(self, task_id):
+        if not self.is_ready(task_id):
+            return
+        task = self._tasks[task_id]
+        key = (task.get('assignee'), self._priority(task), -self._ranks.get(task_id, 0))
+        if self._in_heap.get(task_id) != key:
+            heap = self._heaps[key[0]]
+            heapq.heappush(heap, (*key[1:], task_id))
+            self._in_heap[task_id] = key
+            if len(heap) > 64 and len(heap) > 4 * len(self._in_heap):
+                self._compact(key[0])
+
+    def _live(self, assignee, entry) -> bool:
+        priority, rank, task_id = entry
+        return self._in_heap.get(task_id) == (assignee, priority, rank) and self.is_ready(task_id)
+
+    def _compact(self, assignee):
+        """Drops stale entries (claimed, re-prioritized or moved tasks) from one heap."""
+        heap = self._heaps[assignee]
+        heap[:] = [entry for entry in heap if self._live(assignee, entry)]
+        heapq.heapify(heap)
+
+    def _shift_dependents(self, task_id, delta):
+        for dependent in self._dependents.get(task_id, ()):
+            # A self-dependency is already counted when the task's in-degree is computed
+            if dependent != task_id and dependent in self._tasks:
+                self._indegree[dependent] += delta
+                self._push(dependent)
+
+    # --- Mutations ---
+
+    def update(self, task: dict):
+        """Adds a task or replaces the stored copy (status, deps or priority changed)."""
+        task_id = task['task_id']
+        for dep in self._dep_ids.get(task_id, ()):
+            self._dependents[dep].discard(task_id)
+
+        was_unfinished = task_id in self._open
+        is_unfinished = task['status'] != 'completed'
+        if is_unfinished:
+            self._open.add(task_id)
+        else:
+            self._open.discard(task_id)
+
+        self._tasks[task_id] = task
+        deps = self._deps(task)
+        self._dep_ids[task_id] = deps
+        for dep in deps:
+            self._dependents[dep].add(task_id)
+        self._indegree[task_id] = len(deps & self._open)
+
+        if was_unfinished != is_unfinished:
+            self._shift_dependents(task_id, 1 if is_unfinished else -1)
+        self._push(task_id)
+
+    def set_status(self, task_id, status):
+        task = self._tasks[task_id]
+        task['status'] = status
+        self.update(task)
+
+    def remove(self, task_id):
+        if task_id not in self._tasks:
+            return
+        was_unfinished = task_id in self._open
+        for dep in self._dep_ids.pop(task_id):
+            self._dependents[dep].discard(task_id)
+        del self._tasks[task_id]
+        del self._indegree[task_id]
+        self._open.discard(task_id)
+        self._claimed.discard(task_id)
+        if was_unfinished:
+            self._shift_dependents(task_id, -1)
+
+    def apply(self, changed=(), removed=()):
+        """Applies an incremental change set, e.g. from TaskStore.refresh().
+
+        Claimed tasks keep their in-memory copy until they are released.
+        """
+        for task in changed:
+            if task['task_id'] not in self._claimed:
+                self.update(task)
+        for task_id in removed:
+            if task_id not in self._claimed:
+                self.remove(task_id)
+
+    def sync(self, tasks):
+        """Reconciles with a freshly loaded task list.
+
+        Claimed tasks keep their in-memory copy; everything else is replaced
+        only if it changed, and tasks that disappeared are removed.
+        """
+        seen = set()
+        for task in tasks:
+            task_id = task['task_id']
+            seen.add(task_id)
+            if task_id not in self._claimed and self._tasks.get(task_id) != task:
+                self.update(task)
+        for task_id in [t for t in self._tasks if t not in seen and t not in self._claimed]:
+            self.remove(task_id)
+
+    def set_ranks(self, ranks: dict):
+        """Replaces the tie-breaking ranks (task_id -> number, higher runs first among equal priorities).
+
+        Only ready tasks whose rank changed are re-queued.
+        """
+        old, self._ranks = self._ranks, dict(ranks)
+        for task_id in [t for t in self._in_heap if old.get(t, 0) != self._ranks.get(t, 0)]:
+            self._push(task_id)
+
+    def release(self, task_id):
+        """Un-claims a dispatched task (call update() afterwards with its new status)."""
+        self._claimed.discard(task_id)
+        if task_id in self._tasks:
+            self._push(task_id)
+
+    # --- Queries ---
+
+    def _clean_top(self, assignee):
+        heap = self._heaps[assignee]
+        while heap and not self._live(assignee, heap[0]):
+            priority, rank, task_id = heapq.heappop(heap)
+            if self._in_heap.get(task_id) == (assignee, priority, rank):  # its live entry, but no longer ready
+                del self._in_heap[task_id]
+
+    def _walk(self, assignee):
+        """Yields the live entries of one heap in order without popping them: k entries cost O(k log k)."""
+        heap = self._heaps[assignee]
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            entry, i = heapq.heappop(frontier)
+            if self._live(assignee, entry):
+                yield entry
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def _candidates(self, is_open=None):
+        """Ready entries of the assignees `is_open` accepts (all by default), best first."""
+        walks = []
+        for assignee in list(self._heaps):
+            self._clean_top(assignee)
+            if not self._heaps[assignee]:
+                del self._heaps[assignee]
+            elif is_open is None or is_open(assignee):
+                walks.append(self._walk(assignee))
+        return heapq.merge(*walks)
+
+    def peek(self):
+        """Returns the next ready task without claiming it, or None."""
+        for _, _, task_id in self._candidates():
+            return self._tasks[task_id]
+        return None
+
+    def pop_ready(self, accept=None, is_open=None):
+        """Claims and returns the best ready task, or None.
+
+        If `is_open` is given, assignees it rejects (e.g. at capacity) are
+        skipped without looking at their tasks. If `accept` is given, ready
+        tasks it rejects are skipped (and stay queued) so a lower-priority
+        task that is acceptable can be returned.
+        """
+        for _, _, task_id in self._candidates(is_open):
+            task = self._tasks[task_id]
+            if accept is not None and not accept(task):
+                continue
+            # Its heap entry goes stale and is dropped when it reaches the top
+            del self._in_heap[task_id]
+            self._claimed.add(task_id)
+            return task
+        return None
+
+    def blocked(self) -> list:
+        """task_ids that are pending and unclaimed but still wait on a dependency. O(n)."""
+        return [task_id for task_id, task in self._tasks.items()
+                if task['status'] == 'pending' and task_id not in self._claimed and self._indegree[task_id]]
+
+    def ready_count(self) -> int:
+        return sum(1 for task_id in self._in_heap if self.is_ready(task_id))
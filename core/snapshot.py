@@ -0,0 +1,233 @@
+# snapshot.py - Cached, incrementally updated view of repository files for prompt context
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from core.config import load_config
+from core.fswatch import open_watcher
+
+SKIP_DIRS = {".git", "__pycache__", ".cache", ".worktrees", ".pytest_cache", ".mypy_cache", ".venv", "venv", "node_modules"}
+DEFAULT_MAX_TOKENS = 200_000
+DEFAULT_BYTES_PER_TOKEN = 4
+
+
+@dataclass
+class FileEntry:
+    stamp: tuple   # (mtime_ns, size)
+    digest: str    # sha256 of the raw bytes
+    text: str      # decoded UTF-8, None for binary files
+
+
+class RepoSnapshot:
+    """Index of files under `root` by path, (mtime, size) stamp and content hash.
+
+    read() re-stats the file and only re-reads it when the stamp moved; if
+    the bytes hash the same as before, the previously decoded text is kept.
+    files() caches directory walks per top-level directory. With inotify
+    available a cached walk is reused until a file is created, deleted or
+    renamed underneath it; otherwise each call re-walks (but still reads
+    nothing that did not change).
+    """
+
+    def __init__(self, root, watch=True):
+        self.root = Path(root)
+        self._entries = {}   # relative posix path -> FileEntry
+        self._listings = {}  # top-level dir -> sorted relative paths of every file under it
+        self._lock = threading.Lock()
+        self._watcher = open_watcher([]) if watch else None
+        self.stats = {"reads": 0, "hits": 0, "walks": 0}
+
+    @property
+    def watching(self) -> bool:
+        return self._watcher is not None
+
+    def close(self):
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+
+    def _rel(self, path) -> str:
+        path = Path(path)
+        if path.is_absolute():
+            path = path.relative_to(self.root)
+        return path.as_posix()
+
+    # --- Files ---
+
+    def _load(self, rel):
+        """Returns the up-to-date entry for `rel`, or None if it does not exist."""
+        path = self.root / rel
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            self._entries.pop(rel, None)
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(rel)
+        if entry and entry.stamp == stamp:
+            self.stats["hits"] += 1
+            return entry
+        try:
+            data = path.read_bytes()
+        except (FileNotFoundError, IsADirectoryError):
+            self._entries.pop(rel, None)
+            return None
+        self.stats["reads"] += 1
+        digest = hashlib.sha256(data).hexdigest()
+        if entry and entry.digest == digest:
+            text = entry.text  # touched but not changed
+        else:
+            try:
+                text = data.decode("utf-8")
+            except UnicodeDecodeError:
+                text = None
+        entry = self._entries[rel] = FileEntry(stamp, digest, text)
+        return entry
+
+    def entry(self, path) -> FileEntry:
+        with self._lock:
+            return self._load(self._rel(path))
+
+    def read(self, path) -> str:
+        """Returns the file's text, or None if it is missing or not UTF-8."""
+        entry = self.entry(path)
+        return entry.text if entry else None
+
+    # --- Directory walks ---
+
+    def _drain_events(self):
+        if self._watcher is None:
+            self._listings.clear()
+            return
+        events = self._watcher.poll(0)
+        if events is None:  # queue overflow: trust nothing
+            self._listings.clear()
+            return
+        for path in events:
+            try:
+                rel = path.relative_to(self.root)
+            except ValueError:
+                continue
+            # A content change to a known file keeps the listing valid; anything
+            # else (create, delete, rename, new directory) invalidates it
+            if rel.as_posix() in self._entries and path.is_file():
+                continue
+            self._listings.pop(rel.parts[0] if rel.parts else "", None)
+            self._listings.pop("", None)
+
+    def _walk(self, top):
+        listing = []
+        base = self.root / top if top else self.root
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            if self._watcher:
+                try:
+                    self._watcher.add(dirpath)
+                except OSError:
+                    pass
+            rel_dir = Path(dirpath).relative_to(self.root)
+            listing.extend((rel_dir / name).as_posix() for name in filenames)
+        self.stats["walks"] += 1
+        return sorted(listing)
+
+    def files(self, dirs, suffix: str = None) -> list:
+        """Sorted relative paths of the files under the top-level `dirs`, optionally by suffix."""
+        with self._lock:
+            self._drain_events()
+            found = []
+            for top in dirs:
+                top = Path(top).as_posix().strip("/")
+                if top in self._listings:
+                    found.extend(self._listings[top])
+                    continue
+                listing = self._walk(top)
+                if (self.root / top).is_dir():  # nothing would tell us when it appears
+                    self._listings[top] = listing
+                found.extend(listing)
+        if suffix:
+            found = [rel for rel in found if rel.endswith(suffix)]
+        return sorted(set(found))
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(root) -> RepoSnapshot:
+    """Returns the shared snapshot for `root`."""
+    root = Path(root)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(root)
+        if snapshot is None:
+            snapshot = _snapshots[root] = RepoSnapshot(root)
+        return snapshot
+
+
+# --- Context assembly ---
+
+@dataclass
+class Context:
+    text: str = ""
+    included: list = field(default_factory=list)   # files rendered in full
+    truncated: list = field(default_factory=list)  # files cut to fit the budget
+    omitted: list = field(default_factory=list)    # files left out once the budget ran out
+    missing: list = field(default_factory=list)    # files that do not exist
+    skipped: list = field(default_factory=list)    # files that are not UTF-8 text
+    budget: int = 0                                # in bytes
+
+    @property
+    def bytes(self) -> int:
+        return len(self.text.encode("utf-8"))
+
+
+def context_budget(max_tokens: int = None) -> int:
+    """Byte budget for `max_tokens` (default: `context.max_tokens` in config.yaml)."""
+    settings = load_config().get("context") or {}
+    max_tokens = max_tokens or int(settings.get("max_tokens", DEFAULT_MAX_TOKENS))
+    return max_tokens * int(settings.get("bytes_per_token", DEFAULT_BYTES_PER_TOKEN))
+
+
+def assemble_context(snapshot: RepoSnapshot, paths, render, missing=None, max_tokens: int = None,
+                     max_bytes: int = None) -> Context:
+    """Renders `paths` in order with render(rel, text) until the budget is spent.
+
+    The file that crosses the budget is truncated (if a useful amount still
+    fits) and the rest are listed in a closing note instead of being read.
+    missing(rel), if given, renders a note for files that do not exist.
+    """
+    budget = max_bytes or context_budget(max_tokens)
+    ctx = Context(budget=budget)
+    parts = []
+    used = 0
+    for rel in paths:
+        if used >= budget:
+            ctx.omitted.append(rel)
+            continue
+        entry = snapshot.entry(rel)
+        if entry is None:
+            ctx.missing.append(rel)
+            block = missing(rel) if missing else ""
+        elif entry.text is None:
+            ctx.skipped.append(rel)
+            continue
+        else:
+            block = render(rel, entry.text)
+        size = len(block.encode("utf-8"))
+        if used + size > budget and entry is not None:
+            room = budget - used - len(render(rel, "").encode("utf-8")) - 64
+            if room < min(1024, budget // 8):
+                ctx.omitted.append(rel)
+                continue
+            head = entry.text.encode("utf-8")[:room].decode("utf-8", "ignore")
+            block = render(rel, f"{head}\n... [truncated {len(entry.text.encode('utf-8')) - room} bytes]\n")
+            size = len(block.encode("utf-8"))
+            ctx.truncated.append(rel)
+        elif entry is not None:
+            ctx.included.append(rel)
+        parts.append(block)
+        used += size
+    if ctx.omitted:
+        parts.append(f"--- NOTE: Context budget reached; not included: {', '.join(ctx.omitted)} ---\n")
+    ctx.text = "".join(parts)
+    return ctx
@@ -0,0 +1,104 @@
+# task_store.py - Cached view of tasks/*.json that only re-parses changed files
+import json
+import os
+from pathlib import Path
+
+from core.fswatch import open_watcher
+
+
+class TaskStore:
+    """Keeps parsed task files keyed by path, with their (mtime, size) stamp.
+
+    refresh() re-parses only files that were added or changed and drops the
+    ones that were removed. With inotify available it only looks at the
+    paths the kernel reported; otherwise it stat-scans the directory, which
+    still avoids opening unchanged files. Files written by other processes
+    (e.g. help-request tasks from grok_fast_client) are picked up either way.
+    """
+
+    def __init__(self, tasks_dir, watch=True):
+        self.tasks_dir = Path(tasks_dir)
+        self._entries = {}   # path -> ((mtime_ns, size), task)
+        self._sorted = None  # cached load order, invalidated on change
+        # Watch before the first scan so nothing written during it is missed
+        self._watcher = open_watcher([self.tasks_dir]) if watch else None
+        self._scanned = False
+
+    @property
+    def watching(self) -> bool:
+        return self._watcher is not None
+
+    def close(self):
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+
+    def _load(self, path, stamp):
+        """Parses one file. Returns the changed task, or None if unchanged/unreadable."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                task = json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            # Possibly half-written by another process; keep the last good copy
+            # and leave the stamp stale so the next refresh tries again
+            print(f"WARNING: Task file {path} contains invalid JSON, skipping.")
+            return None
+        self._entries[path] = (stamp, task)
+        return task
+
+    def _check(self, path, force=False):
+        """Re-stats one path. Returns ('changed', task), ('removed', task_id) or None."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            entry = self._entries.pop(path, None)
+            return ('removed', entry[1]['task_id']) if entry else None
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(path)
+        if entry and entry[0] == stamp and not force:
+            return None
+        task = self._load(path, stamp)
+        return ('changed', task) if task else None
+
+    def _scan_paths(self):
+        try:
+            with os.scandir(self.tasks_dir) as it:
+                return {Path(e.path) for e in it if e.name.endswith('.json') and e.is_file()}
+        except FileNotFoundError:
+            return set()
+
+    def refresh(self):
+        """Brings the cache up to date. Returns (changed_tasks, removed_task_ids)."""
+        if self._watcher and self._scanned:
+            events = self._watcher.poll(0)
+            if events is None:
+                paths, force = self._scan_paths() | set(self._entries), False
+            else:
+                # mtime granularity can hide a same-size rewrite, so trust the event
+                paths, force = {p for p in events if p.suffix == '.json'}, True
+        else:
+            paths, force = self._scan_paths() | set(self._entries), False
+        self._scanned = True
+
+        changed, removed = [], []
+        for path in paths:
+            result = self._check(path, force)
+            if result is None:
+                continue
+            kind, value = result
+            (changed if kind == 'changed' else removed).append(value)
+        if changed or removed:
+            self._sorted = None
+        return changed, removed
+
+    def tasks(self) -> list:
+        """All cached tasks, sorted by task_id."""
+        if self._sorted is None:
+            self._sorted = sorted((task for _, task in self._entries.values()), key=lambda t: t['task_id'])
+        return list(self._sorted)
+
+    def load_all(self) -> list:
+        self.refresh()
+        return self.tasks()
@@ -0,0 +1,157 @@
+# worktree.py - Per-task git worktrees, pooled and merged back into the main branch
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from core.git_utils import COLLAB_ROOT, GitError, ref_lock, run_git
+
+
+class MergeConflict(GitError):
+    """A task branch could not be rebased onto, or fast-forwarded into, the main branch."""
+
+
+@dataclass
+class Worktree:
+    path: Path
+    branch: str = None  # task branch checked out, None while idle
+    base: str = None    # main-branch commit the task started from
+
+
+class WorktreePool:
+    """Hands each task its own `git worktree` on a task/<task_id> branch.
+
+    acquire() checks the branch out at the current main commit, reusing an
+    idle worktree when there is one (only the files that differ are
+    rewritten) and creating one under `directory` otherwise. integrate()
+    rebases the task's commits onto main if main has moved on, then
+    fast-forwards the main checkout; a conflict in either step raises
+    MergeConflict and leaves main untouched. release() returns the worktree
+    to the pool, keeping at most `max_idle`. Worktrees left under `directory`
+    by an earlier run are adopted on start-up.
+    """
+
+    def __init__(self, root=COLLAB_ROOT, directory=None, max_idle: int = 4):
+        self.root = Path(root).resolve()
+        self.directory = Path(directory) if directory else self.root / ".worktrees"
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._names = itertools.count()
+        self.stats = {"created": 0, "reused": 0, "merged": 0, "conflicts": 0, "merge_seconds": 0.0}
+        self._adopt()
+
+    def _adopt(self):
+        try:
+            listing = run_git(["worktree", "list", "--porcelain"], self.root)
+        except GitError:
+            return
+        for line in listing.splitlines():
+            if line.startswith("worktree "):
+                path = Path(line[len("worktree "):])
+                if path.parent == self.directory.resolve() and path.exists() and len(self._idle) < self.max_idle:
+                    self._idle.append(Worktree(path))
+
+    def __len__(self):
+        return len(self._idle)
+
+    def acquire(self, task_id: str) -> Worktree:
+        """Returns a clean worktree on task/<task_id>, branched from the current main commit."""
+        branch = f"task/{task_id}"
+        base = run_git(["rev-parse", "HEAD"], self.root)
+        with self._lock:
+            wt = self._idle.pop() if self._idle else None
+        if wt is not None:
+            run_git(["checkout", "-q", "-f", "-B", branch, base], wt.path)
+            run_git(["clean", "-q", "-fd"], wt.path)
+            self.stats["reused"] += 1
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            while True:
+                path = self.directory / f"wt-{next(self._names)}"
+                if not path.exists():
+                    break
+            run_git(["worktree", "add", "-q", "-B", branch, str(path), base], self.root)
+            wt = Worktree(path.resolve())
+            self.stats["created"] += 1
+        wt.branch, wt.base = branch, base
+        return wt
+
+    def integrate(self, wt: Worktree):
+        """Brings the task branch into main. Returns the new main commit, or None if the task committed nothing."""
+        started = time.perf_counter()
+        tip = run_git(["rev-parse", "HEAD"], wt.path)
+        if tip == wt.base:
+            return None
+        with ref_lock:
+            main = run_git(["rev-parse", "HEAD"], self.root)
+            if main != wt.base:
+                try:
+                    run_git(["rebase", "-q", main], wt.path)
+                except GitError as e:
+                    try:
+                        run_git(["rebase", "--abort"], wt.path)
+                    except GitError:
+                        pass
+                    self.stats["conflicts"] += 1
+                    raise MergeConflict(f"{wt.branch} conflicts with the main branch: {e}") from e
+            try:
+                # Also refuses when uncommitted changes in the main checkout would be overwritten
+                run_git(["merge", "-q", "--ff-only", wt.branch], self.root)
+            except GitError as e:
+                self.stats["conflicts"] += 1
+                raise MergeConflict(f"Cannot fast-forward to {wt.branch}: {e}") from e
+            head = run_git(["rev-parse", "HEAD"], self.root)
+        self.stats["merged"] += 1
+        self.stats["merge_seconds"] += time.perf_counter() - started
+        return head
+
+    def release(self, wt: Worktree):
+        """Detaches the worktree, deletes its task branch and pools it (or removes it if the pool is full)."""
+        branch, wt.branch, wt.base = wt.branch, None, None
+        try:
+            run_git(["checkout", "-q", "-f", "--detach"], wt.path)
+            if branch:
+                run_git(["branch", "-q", "-D", branch], self.root)
+        except GitError as e:
+            print(f"  [WORKTREE] Dropping {wt.path}: {e}")
+            self._remove(wt)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(wt)
+                return
+        self._remove(wt)
+
+    def _remove(self, wt: Worktree):
+        try:
+            run_git(["worktree", "remove", "--force", str(wt.path)], self.root)
+        except GitError as e:
+            print(f"  [WORKTREE] Could not remove {wt.path}: {e}")
+
+    def close(self):
+        """Removes every idle worktree."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for wt in idle:
+            self._remove(wt)
+        try:
+            run_git(["worktree", "prune"], self.root)
+        except GitError:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worktree_pool() -> WorktreePool:
+    """Returns the process-wide pool configured by `worktrees:` in core/config.yaml."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from core.config import load_config
+            settings = load_config().get("worktrees") or {}
+            _pool = WorktreePool(directory=COLLAB_ROOT / settings.get("dir", ".worktrees"),
+                                 max_idle=int(settings.get("max_idle", 4)))
+        return _pool
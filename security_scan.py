@@ -1,50 +1,175 @@
 #!/usr/bin/env python3
 # security_scan.py - Security scanner using bandit + custom rules
+#
+#   python security_scan.py                 # whole tree
+#   python security_scan.py core/x.py ...   # just these files, e.g. after an agent commit
+#
+# Files come from `git ls-files` (tracked plus untracked-but-not-ignored), so
+# .gitignore applies and .git/ is never walked; `security.ignore` globs in
+# core/config.yaml drop more (generated prompts). Files are read and hashed
+# on a thread pool, and findings are cached by content hash in
+# .cache/security_scan.json: an unchanged (mtime, size) stamp skips the read,
+# an unchanged hash skips the key check, and bandit only runs on .py files
+# whose hash it has not seen.
 
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
 import subprocess
 import sys
-import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def run_bandit_scan():
-    """Run bandit security scan on the codebase"""
+from core.config import load_config
+from core.fileio import atomic_write_text
+from core.git_utils import GitError, run_git
+from core.snapshot import SKIP_DIRS
+
+ROOT = Path(__file__).parent
+SCAN_SUFFIXES = ('.py', '.md', '.txt', '.yml', '.yaml')
+SUSPICIOUS_PATTERNS = ('API_KEY', 'SECRET', 'TOKEN', 'PASSWORD')
+SUSPICIOUS = re.compile("|".join(SUSPICIOUS_PATTERNS), re.IGNORECASE)
+CACHE_VERSION = 1
+
+
+def scan_settings() -> dict:
+    return load_config().get("security") or {}
+
+
+class ScanCache:
+    """Per-path (mtime_ns, size, sha256) stamps plus key-check and bandit findings by sha256."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.stamps = {}  # relative path -> [mtime_ns, size, sha256]
+        self.keys = {}    # sha256 -> suspicious patterns found
+        self.bandit = {}  # sha256 -> bandit issues, without the filename
+        self._lock = threading.Lock()
+        if self.path:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = {}
+            if data.get("version") == CACHE_VERSION:
+                self.stamps, self.keys, self.bandit = data["stamps"], data["keys"], data["bandit"]
+
+    def digest(self, path: Path, rel: str):
+        """Returns (sha256, bytes or None if the stamp was current), or (None, None) if unreadable."""
+        try:
+            st = path.stat()
+            stamp = self.stamps.get(rel)
+            if stamp and stamp[:2] == [st.st_mtime_ns, st.st_size]:
+                return stamp[2], None
+            data = path.read_bytes()
+        except OSError:
+            return None, None
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.stamps[rel] = [st.st_mtime_ns, st.st_size, sha]
+        return sha, data
+
+    def save(self, live_paths=None):
+        """Writes the cache, dropping stamps for files not in `live_paths` and findings nothing refers to."""
+        if not self.path:
+            return
+        if live_paths is not None:
+            self.stamps = {rel: s for rel, s in self.stamps.items() if rel in live_paths}
+            live = {s[2] for s in self.stamps.values()}
+            self.keys = {sha: v for sha, v in self.keys.items() if sha in live}
+            self.bandit = {sha: v for sha, v in self.bandit.items() if sha in live}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.path, json.dumps(
+            {"version": CACHE_VERSION, "stamps": self.stamps, "keys": self.keys, "bandit": self.bandit}))
+
+
+def list_files(root=ROOT) -> list:
+    """Relative paths of the files to scan, honouring .gitignore and `security.ignore`."""
     try:
-        result = subprocess.run([
-            sys.executable, '-m', 'bandit', '-r', '.', '-f', 'json'
-        ], capture_output=True, text=True, cwd=Path(__file__).parent)
-
-        if result.returncode == 0:
-            print("✓ No security issues found by bandit")
-        else:
-            print("⚠ Security issues detected:")
-            print(result.stdout)
+        out = run_git(["ls-files", "-z", "--cached", "--others", "--exclude-standard"], root)
+        paths = sorted(set(p for p in out.split("\0") if p))
+    except (GitError, FileNotFoundError):  # not a checkout, or no git: walk, skipping the usual dirs
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            rel_dir = Path(dirpath).relative_to(root)
+            paths.extend((rel_dir / name).as_posix() for name in sorted(filenames))
+    ignore = scan_settings().get("ignore") or []
+    return [p for p in paths
+            if p.endswith(SCAN_SUFFIXES) and not any(fnmatch.fnmatch(p, g) for g in ignore)]
+
+
+def _key_findings(text: str) -> list:
+    """Patterns present (in any case) that are not just read from the environment."""
+    found = {m.group().upper() for m in SUSPICIOUS.finditer(text)}
+    return sorted(p for p in found
+                  if f'os.getenv("{p}' not in text and f'os.environ.get("{p}' not in text)
+
+
+def _hash_files(files, cache, root, workers):
+    """Hashes `files` on a thread pool; returns {rel: sha256} and the key findings of new content."""
+    def one(rel):
+        sha, data = cache.digest(root / rel, rel)
+        if sha is None or sha in cache.keys:
+            return rel, sha, None
+        if data is None:  # stamp current but findings were pruned
+            try:
+                data = (root / rel).read_bytes()
+            except OSError:
+                return rel, None, None
+        return rel, sha, _key_findings(data.decode("utf-8", errors="replace"))
+
+    hashes = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rel, sha, findings in pool.map(one, files):
+            if sha is None:
+                continue
+            hashes[rel] = sha
+            if findings is not None:
+                cache.keys[sha] = findings
+    return hashes
+
+
+def run_bandit_scan(hashes: dict, cache: ScanCache, root=ROOT):
+    """Run bandit on the .py files whose content it has not seen yet"""
+    pending = sorted(rel for rel, sha in hashes.items() if rel.endswith('.py') and sha not in cache.bandit)
+    if pending:
+        try:
+            result = subprocess.run([sys.executable, '-m', 'bandit', '-q', '-f', 'json', *pending],
+                                    capture_output=True, text=True, cwd=root)
+            report = json.loads(result.stdout or "{}")
+        except json.JSONDecodeError:
+            report = {}
+        if "results" not in report:
+            print("Bandit not installed. Run: pip install bandit")
             return False
-    except FileNotFoundError:
-        print("Bandit not installed. Run: pip install bandit")
+        by_file = {rel: [] for rel in pending}
+        for issue in report.get("results", []):
+            rel = Path(issue["filename"]).as_posix().removeprefix("./")
+            by_file.setdefault(rel, []).append({k: issue.get(k) for k in
+                                                ("test_id", "issue_severity", "issue_confidence", "issue_text", "line_number")})
+        failed = {Path(e["filename"]).as_posix().removeprefix("./") for e in report.get("errors", [])}
+        for rel in pending:
+            if rel not in failed:  # retry files bandit could not parse next time
+                cache.bandit[hashes[rel]] = by_file[rel]
+
+    issues = [(rel, issue) for rel, sha in sorted(hashes.items()) for issue in cache.bandit.get(sha, [])]
+    if issues:
+        print("⚠ Security issues detected:")
+        for rel, issue in issues:
+            print(f"  - {rel}:{issue['line_number']} [{issue['test_id']} {issue['issue_severity']}] {issue['issue_text']}")
         return False
+    print(f"✓ No security issues found by bandit ({len(pending)} file(s) scanned, {len(hashes) - len(pending)} cached)")
     return True
 
-def check_api_keys():
-    """Check for hardcoded API keys"""
-    suspicious_patterns = [
-        'API_KEY', 'SECRET', 'TOKEN', 'PASSWORD'
-    ]
-
-    issues = []
-    for root, dirs, files in os.walk('.'):
-        for file in files:
-            if file.endswith(('.py', '.md', '.txt', '.yml', '.yaml')):
-                path = Path(root) / file
-                try:
-                    content = path.read_text()
-                    for pattern in suspicious_patterns:
-                        if pattern in content.upper():
-                            # Check if it's in env var context
-                            if f'os.getenv("{pattern}' not in content and f'os.environ.get("{pattern}' not in content:
-                                issues.append(f"Potential API key in {path}")
-                except:
-                    pass
 
+def check_api_keys(hashes: dict, cache: ScanCache):
+    """Check for hardcoded API keys"""
+    issues = [f"Potential API key in {rel} ({', '.join(cache.keys[sha])})"
+              for rel, sha in sorted(hashes.items()) if cache.keys.get(sha)]
     if issues:
         print("⚠ Potential API key exposures:")
         for issue in issues:
@@ -54,22 +179,44 @@ def check_api_keys():
         print("✓ No hardcoded API keys detected")
         return True
 
+
 def check_file_permissions():
     """Check file permissions (basic)"""
     # On Windows, permissions are different, but check for obvious issues
     print("✓ File permissions check (skipped on Windows)")
     return True
 
-if __name__ == "__main__":
-    print("Running security scan...")
+
+def scan(paths=None, root=ROOT, use_cache=True, workers=None) -> bool:
+    """Scans `paths` (relative to `root`), or every file list_files() returns; True if nothing was found."""
+    settings = scan_settings()
+    root = Path(root)
+    cache = ScanCache(root / settings.get("cache", ".cache/security_scan.json") if use_cache else None)
+    if paths is None:
+        files = list_files(root)
+    else:
+        files = [(Path(p).resolve().relative_to(root.resolve()) if Path(p).is_absolute() else Path(p)).as_posix()
+                 for p in paths if str(p).endswith(SCAN_SUFFIXES)]
+    hashes = _hash_files(files, cache, root, workers or int(settings.get("workers", 8)))
     all_good = True
-    all_good &= run_bandit_scan()
-    all_good &= check_api_keys()
+    all_good &= run_bandit_scan(hashes, cache, root)
+    all_good &= check_api_keys(hashes, cache)
     all_good &= check_file_permissions()
+    cache.save(live_paths=set(hashes) if paths is None else None)
+    return all_good
 
-    if all_good:
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Security scan: bandit plus hardcoded-key checks")
+    ap.add_argument("paths", nargs="*", help="Files to scan (default: the whole tree)")
+    ap.add_argument("--no-cache", action="store_true", help="Ignore and do not update the findings cache")
+    ap.add_argument("--workers", type=int, help="Threads reading and hashing files")
+    args = ap.parse_args()
+
+    print("Running security scan...")
+    if scan(args.paths or None, use_cache=not args.no_cache, workers=args.workers):
         print("\n🎉 Security scan passed!")
         sys.exit(0)
     else:
         print("\n❌ Security issues found!")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
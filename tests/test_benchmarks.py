@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks.backlog import SHAPES, generate
+from benchmarks.mock_llm import MockLLMServer
+from clients import cache, grok_fast_client
+from core.scheduler import TaskScheduler
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_generated_backlog_drains_in_dependency_order(shape):
+    tasks = generate(shape, 40, width=3)
+    scheduler = TaskScheduler(tasks)
+    done = set()
+    while (task := scheduler.pop_ready()) is not None:
+        assert set(task['depends_on']) <= done
+        scheduler.release(task['task_id'])
+        task['status'] = 'completed'
+        scheduler.update(task)
+        done.add(task['task_id'])
+    assert len(done) == 40
+
+
+def test_diamond_joins_wait_for_their_layer():
+    tasks = {t['task_id']: t for t in generate("diamond", 9, width=3)}
+    assert tasks["task_000005"]['depends_on'] == ["task_000002", "task_000003", "task_000004"]
+    assert tasks["task_000006"]['depends_on'] == ["task_000005"]
+
+
+def test_mock_llm_answers_grok_fast_tasks(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_cache", cache.ResponseCache(tmp_path / "llm-cache"))
+    server = MockLLMServer(failure_rate=0.0).start()
+    monkeypatch.setenv("OPENCODE_GROK_URL", server.url)
+    root = tmp_path / "repo"
+    try:
+        result = grok_fast_client.run_task("task_000001", "Implement handler", [str(root / "shared/bench/mod_1.py")],
+                                           root=root, commit=False)
+    finally:
+        server.stop()
+    assert result.ok
+    assert "def handler" in (root / "shared/bench/mod_1.py").read_text()
+    assert server.stats["requests"] == 1
@@ -0,0 +1,64 @@
+import os
+import time
+
+from clients.cache import ResponseCache
+
+
+def test_key_depends_on_every_field():
+    base = ResponseCache.key("http://a", "sys", "user", 0.15, 100)
+    assert base == ResponseCache.key("http://a", "sys", "user", 0.15, 100)
+    variants = [("http://b", "sys", "user", 0.15, 100), ("http://a", "other", "user", 0.15, 100),
+                ("http://a", "sys", "user2", 0.15, 100), ("http://a", "sys", "user", 0.2, 100),
+                ("http://a", "sys", "user", 0.15, 200)]
+    assert len({ResponseCache.key(*v) for v in variants} | {base}) == len(variants) + 1
+
+
+def test_fetch_hits_after_first_compute(tmp_path):
+    cache = ResponseCache(tmp_path)
+    calls = []
+    compute = lambda: calls.append(1) or "answer"
+
+    assert cache.fetch("k" * 64, compute) == "answer"
+    assert cache.fetch("k" * 64, compute) == "answer"
+    assert len(calls) == 1
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1 and cache.stats["stores"] == 1
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResponseCache(tmp_path, max_age=0.05)
+    cache.put("a" * 64, "old")
+    time.sleep(0.1)
+    assert cache.get("a" * 64) is None
+    assert not list(tmp_path.glob("*/*.json"))
+
+
+def test_bypass_skips_lookups_but_still_stores(tmp_path):
+    cache = ResponseCache(tmp_path, bypass=True)
+    cache.put("b" * 64, "fresh")
+    assert cache.get("b" * 64) is None
+    assert cache.stats["bypassed"] == 1
+
+    cache.bypass = False
+    assert cache.get("b" * 64) == "fresh"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=300)
+    keys = [c * 64 for c in "cdef"]
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, "x" * 50)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    cache.get(keys[0])  # touch the oldest so it survives
+
+    cache.put(keys[3], "x" * 50)
+
+    assert cache.stats["evictions"] >= 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "x" * 50
+    assert cache.get(keys[3]) == "x" * 50
+
+
+def test_disabled_cache_never_stores(tmp_path):
+    cache = ResponseCache(tmp_path, enabled=False)
+    assert cache.fetch("c" * 64, lambda: "v") == "v"
+    assert not list(tmp_path.glob("*/*.json"))
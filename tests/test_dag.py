@@ -0,0 +1,60 @@
+from core.dag import compile_graph, normalize_depends_on
+from core.scheduler import TaskScheduler
+
+
+def task(task_id, deps=None, status="pending", **fields):
+    return {"task_id": task_id, "status": status, "depends_on": deps, **fields}
+
+
+def test_normalize_depends_on():
+    assert normalize_depends_on(None) == []
+    assert normalize_depends_on("task_001") == ["task_001"]
+    assert normalize_depends_on("task_001, task_002,task_001") == ["task_001", "task_002"]
+    assert normalize_depends_on(["task_002", "task_002", ""]) == ["task_002"]
+
+
+def test_string_dependency_is_not_iterated_character_by_character():
+    tasks = [task("task_001"), task("task_002", "task_001")]
+    graph = compile_graph(tasks)
+    assert graph.depends_on["task_002"] == ["task_001"]
+    assert tasks[1]["depends_on"] == "task_001"  # task dicts are left alone
+    assert graph.level == {"task_001": 0, "task_002": 1}
+    # The scheduler normalizes too, so the dependency is honoured even without compiling
+    scheduler = TaskScheduler([task("task_001"), task("task_002", "task_001")])
+    assert scheduler.pop_ready()["task_id"] == "task_001"
+    assert scheduler.pop_ready() is None
+
+
+def test_levels_critical_path_and_parallelism():
+    tasks = [task("a", status="completed"), task("b", ["a"]), task("c", ["b"]), task("d", ["c"]),
+             task("e"), task("f", ["e", "b"])]
+    graph = compile_graph(tasks)
+    assert graph.levels() == [["b", "e"], ["c", "f"], ["d"]]
+    assert graph.critical_path == {"b": 3, "c": 2, "d": 1, "e": 2, "f": 1}
+    assert graph.critical_chain() == ["b", "c", "d"]
+    assert graph.span == 3 and graph.parallelism == 5 / 3
+    assert graph.issues() == []
+
+
+def test_cycles_stuck_tasks_and_dangling_references():
+    tasks = [task("a", ["c"]), task("b", ["a"]), task("c", ["b"]), task("d", ["a"]),
+             task("e", ["e"]), task("f", ["task_999"]), task("g")]
+    graph = compile_graph(tasks)
+    assert graph.cycles == [["a", "b", "c"], ["e"]]
+    assert graph.stuck == ["d"]
+    assert graph.dangling == {"f": ["task_999"]}
+    assert graph.order == ["f", "g"]
+    assert len(graph.issues()) == 4
+
+
+def test_scheduler_starts_longer_chains_first_among_equal_priorities():
+    tasks = [task("task_001"), task("task_002"), task("task_003", ["task_002"]), task("task_004", priority=0)]
+    scheduler = TaskScheduler(tasks)
+    scheduler.set_ranks(compile_graph(tasks).critical_path)
+    order = []
+    while (t := scheduler.pop_ready()) is not None:
+        order.append(t["task_id"])
+        scheduler.release(t["task_id"])
+        t["status"] = "completed"
+        scheduler.update(t)
+    assert order == ["task_004", "task_002", "task_001", "task_003"]
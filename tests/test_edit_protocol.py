@@ -0,0 +1,38 @@
+import pytest
+
+from clients.edit_protocol import EditError, Hunk, apply_hunks, parse_hunks
+
+
+def test_parse_hunks():
+    body = "<<<<<<< SEARCH\na = 1\n=======\na = 2\n>>>>>>> REPLACE\n\n<<<<<<< SEARCH\nb\n=======\n>>>>>>> REPLACE"
+    assert parse_hunks(body) == [Hunk("a = 1", "a = 2"), Hunk("b", "")]
+    with pytest.raises(EditError):
+        parse_hunks("<<<<<<< SEARCH\na\n=======\nb\n")
+    with pytest.raises(EditError):
+        parse_hunks("just some prose")
+
+
+def test_exact_hunks_apply_in_order():
+    text = "x = 1\ny = 2\nx = 1\n"
+    new, fuzzy = apply_hunks(text, [Hunk("x = 1", "x = 10"), Hunk("x = 1", "x = 11")])
+    assert new == "x = 10\ny = 2\nx = 11\n" and fuzzy == 0
+
+
+def test_reindented_search_is_matched_and_replacement_shifted():
+    text = "class A:\n    def f(self):\n        return 1\n"
+    new, fuzzy = apply_hunks(text, [Hunk("def f(self):\n    return 1", "def f(self):\n    return 2")])
+    assert new == "class A:\n    def f(self):\n        return 2\n" and fuzzy == 1
+
+
+def test_near_miss_matches_fuzzily():
+    text = "def total(items):\n    s = 0\n    for item in items:\n        s += item.price\n    return s\n"
+    search = "def total(items):\n    s = 0\n    for item in items:\n        s += item.prce\n    return s"
+    new, fuzzy = apply_hunks(text, [Hunk(search, "def total(items):\n    return sum(i.price for i in items)")])
+    assert new == "def total(items):\n    return sum(i.price for i in items)\n" and fuzzy == 1
+
+
+def test_unmatched_hunk_raises_and_empty_search_appends():
+    with pytest.raises(EditError):
+        apply_hunks("a = 1\n", [Hunk("completely different\ncode here", "x")])
+    assert apply_hunks("", [Hunk("", "NEW = 1")])[0] == "NEW = 1\n"
+    assert apply_hunks("a = 1\n", [Hunk("", "b = 2")])[0] == "a = 1\nb = 2\n"
@@ -0,0 +1,78 @@
+import subprocess
+
+import pytest
+
+from core.git_utils import CommitQueue, commit_paths
+
+
+def git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def make_repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "config", "user.name", "test")
+    git(tmp_path, "config", "user.email", "test@example.com")
+    (tmp_path / "keep.py").write_text("keep\n")
+    (tmp_path / "old.py").write_text("old\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "init")
+    return tmp_path
+
+
+def test_commit_paths_commits_only_the_given_files(tmp_path):
+    repo = make_repo(tmp_path)
+    (repo / "shared").mkdir()
+    (repo / "shared" / "a.py").write_text("a\n")
+    (repo / "unrelated.py").write_text("not mine\n")
+    (repo / "old.py").unlink()
+
+    result = commit_paths(["shared/a.py", repo / "old.py"], "Task task_001: a", author="grok-fast", root=repo)
+
+    assert result.sha == git(repo, "rev-parse", "HEAD")
+    assert {"hash", "tree", "commit", "total"} <= set(result.timings)
+    assert git(repo, "ls-tree", "-r", "--name-only", "HEAD").split() == ["keep.py", "shared/a.py"]
+    assert git(repo, "log", "-1", "--format=%an <%ae>|%s") == "grok-fast <agent@grok-fast.local>|Task task_001: a"
+    # The committed paths are clean; the unrelated file is left alone
+    assert git(repo, "status", "--porcelain") == "?? unrelated.py"
+
+    assert commit_paths(["shared/a.py"], "again", root=repo).sha is None
+
+
+def test_queue_groups_tasks_into_one_commit(tmp_path):
+    repo = make_repo(tmp_path)
+    queue = CommitQueue(batch_size=3, root=repo)
+    for name in ("a", "b"):
+        (repo / f"{name}.py").write_text(name)
+        assert queue.submit([f"{name}.py"], f"Task {name}") is None
+    assert len(queue) == 2
+
+    result = queue.flush()
+    assert len(queue) == 0
+    assert result.paths == ["a.py", "b.py"]
+    assert git(repo, "rev-list", "--count", "HEAD") == "2"
+    assert git(repo, "log", "-1", "--format=%B").splitlines() == ["2 tasks", "", "- Task a", "- Task b"]
+    assert queue.stats["commits"] == 1 and queue.stats["tasks"] == 2
+    assert queue.flush() is None
+
+
+def test_queue_commits_what_each_task_wrote_and_reports_failed_batches(tmp_path, monkeypatch):
+    from core import git_utils
+
+    repo = make_repo(tmp_path)
+    queue = CommitQueue(batch_size=2, root=repo)
+    (repo / "a.py").write_text("task a\n")
+    queue.submit(["a.py"], "Task a", task_id="task_a")
+    (repo / "a.py").write_text("edited after task a\n")  # not part of any task yet
+    queue.flush()
+    assert git(repo, "show", "HEAD:a.py") == "task a"
+
+    def broken(*args, **kwargs):
+        raise git_utils.GitError("git update-ref failed: locked")
+
+    monkeypatch.setattr(git_utils, "commit_snapshot", broken)
+    queue.submit(["a.py"], "Task b", task_id="task_b")
+    with pytest.raises(git_utils.GitError):
+        queue.submit(["keep.py"], "Task c", task_id="task_c")  # fills the batch: its own commit failed
+    assert queue.take_failed() == [("task_b", "git update-ref failed: locked")]
+    assert queue.take_failed() == []
@@ -0,0 +1,39 @@
+import json
+
+from core.journal import TaskJournal
+
+
+def write(path, **task):
+    path.write_text(json.dumps(task))
+
+
+def test_overlay_replay_and_compact(tmp_path):
+    write(tmp_path / "task_001.json", task_id="task_001", status="pending")
+    write(tmp_path / "task_002.json", task_id="task_002", status="pending")
+
+    journal = TaskJournal(tmp_path, compact_every=100)
+    journal.record_many({"task_001": {"status": "completed"}, "task_002": {"status": "failed", "retry_count": 3}})
+    # Task files are untouched until compaction
+    assert json.loads((tmp_path / "task_001.json").read_text())["status"] == "pending"
+
+    # Simulate a crash that left a torn last line, then restart
+    with open(journal.path, "a") as f:
+        f.write('{"task_id": "task_001", "se')
+    journal = TaskJournal(tmp_path)
+    assert len(journal) == 2
+    assert journal.overlay({"task_id": "task_002", "status": "pending"}) == {
+        "task_id": "task_002", "status": "failed", "retry_count": 3}
+
+    assert journal.compact() == 2
+    assert json.loads((tmp_path / "task_002.json").read_text())["retry_count"] == 3
+    assert journal.path.read_text() == ""
+    assert TaskJournal(tmp_path).overlay({"task_id": "task_001", "status": "x"})["status"] == "x"
+
+
+def test_compacts_automatically(tmp_path):
+    write(tmp_path / "task_001.json", task_id="task_001", status="pending")
+    journal = TaskJournal(tmp_path, compact_every=2)
+    journal.record("task_001", {"status": "in_progress"})
+    journal.record("task_001", {"status": "completed"})
+    assert len(journal) == 0
+    assert json.loads((tmp_path / "task_001.json").read_text())["status"] == "completed"
@@ -0,0 +1,97 @@
+import json
+import time
+
+from core.lease import LeaseManager
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_only_one_worker_holds_a_lease(tmp_path):
+    a = LeaseManager(tmp_path, owner="a")
+    b = LeaseManager(tmp_path, owner="b")
+
+    assert a.claim("task_001")
+    assert not b.claim("task_001")
+    assert b.holder("task_001").owner == "a"
+
+    a.release("task_001")
+    assert b.holder("task_001") is None
+    assert b.claim("task_001")
+    assert not a.owns("task_001") and b.owns("task_001")
+
+
+def test_expired_lease_is_reclaimed_and_its_owner_notices(tmp_path):
+    clock = Clock()
+    crashed = LeaseManager(tmp_path, owner="crashed", ttl=10, clock=clock)
+    other = LeaseManager(tmp_path, owner="other", ttl=10, clock=clock)
+    assert crashed.claim("task_001")
+
+    clock.now += 5
+    assert not other.claim("task_001")
+    clock.now += 6
+    assert other.claim("task_001")
+    assert other.holder("task_001").owner == "other"
+    assert list(tmp_path.joinpath(".leases").iterdir()) == [tmp_path / ".leases" / "task_001.lease"]  # no tombstones
+
+    assert crashed.renew_all() == ["task_001"]
+    crashed.release("task_001")  # no longer its lease: left alone
+    assert other.owns("task_001")
+
+
+def test_lease_renewed_after_being_read_as_expired_is_not_taken_over(tmp_path, monkeypatch):
+    clock = Clock()
+    slow = LeaseManager(tmp_path, owner="slow", ttl=10, clock=clock)
+    other = LeaseManager(tmp_path, owner="other", ttl=10, clock=clock)
+    assert slow.claim("task_001")
+    clock.now += 11
+    expired = other.read("task_001")
+    assert slow.renew("task_001")  # lands between the other worker's read and its takeover
+    monkeypatch.setattr(other, "read", lambda task_id: expired)
+
+    assert not other.claim("task_001")
+    assert slow.owns("task_001") and slow.holder("task_001").owner == "slow"
+    assert sorted(p.name for p in (tmp_path / ".leases").iterdir()) == ["task_001.lease"]
+
+
+def test_a_swap_in_progress_blocks_a_takeover_but_does_not_lose_the_lease(tmp_path):
+    clock = Clock()
+    owner = LeaseManager(tmp_path, owner="a", ttl=10, clock=clock)
+    other = LeaseManager(tmp_path, owner="b", ttl=10, clock=clock)
+    assert owner.claim("task_001")
+    token = owner.read("task_001").token
+    marker = tmp_path / ".leases" / f"task_001.lease.{token}.swap"
+    marker.write_text("")  # another worker is in the middle of taking it over
+    clock.now += 11
+
+    assert not other.claim("task_001")
+    assert owner.renew("task_001") and owner.owns("task_001")  # retried on the next heartbeat
+    owner.release("task_001")
+    assert owner.read("task_001") is not None  # left to expire rather than deleted unverified
+
+
+def test_half_written_lease_counts_as_live(tmp_path):
+    manager = LeaseManager(tmp_path, owner="a", ttl=10)
+    (tmp_path / ".leases" / "task_001.lease").write_text("")  # created, not yet written
+
+    assert not manager.claim("task_001")
+    assert manager.holder("task_001").owner == "unknown"
+
+
+def test_heartbeat_keeps_a_lease_alive(tmp_path):
+    holder = LeaseManager(tmp_path, owner="a", ttl=0.3, heartbeat=0.05).start()
+    other = LeaseManager(tmp_path, owner="b", ttl=0.3)
+    try:
+        assert holder.claim("task_001")
+        time.sleep(0.6)
+        assert not other.claim("task_001")
+        lease = json.loads((tmp_path / ".leases" / "task_001.lease").read_text())
+        assert lease["expires"] > time.time()
+    finally:
+        holder.stop()
+    assert other.claim("task_001")  # stop() released it
@@ -0,0 +1,50 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from core import logger
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    monkeypatch.setenv("AIFACTORY_TELEMETRY", "memory")
+    logger.reset_telemetry()
+    yield lambda: (logger.flush_telemetry(), logger.get_exporter().get_finished_spans())[1]
+    logger.reset_telemetry()
+
+
+def test_import_has_no_exporter_side_effects():
+    code = "import sys; import core.logger as l; print(l._tracer is None, 'opentelemetry.exporter.otlp.proto.grpc' in str(list(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.split() == ["True", "False"]
+
+
+def test_one_parent_span_per_task_across_retries(spans):
+    task = {"task_id": "task_001", "assignee": "grok-fast", "description": "d", "files": []}
+    logger.log_task_start(task)
+    with logger.task_context("task_001"):
+        logger.record_span("prompt", time.time_ns())
+    logger.log_retry("task_001", 1)
+    logger.log_task_start({**task, "retry_count": 1})
+    with logger.task_context("task_001"):
+        with logger.phase_span("llm", agent="grok-fast"):
+            pass
+    logger.log_success("task_001", 0.5)
+    logger.record_span("orphan", time.time_ns())  # outside a task: ignored
+
+    finished = {s.name: s for s in spans()}
+    assert set(finished) == {"task", "prompt", "retry", "llm"}
+    root = finished["task"]
+    assert root.parent is None and root.attributes["task.outcome"] == "completed"
+    for name in ("prompt", "retry", "llm"):
+        assert finished[name].parent.span_id == root.context.span_id
+    assert finished["llm"].attributes["agent"] == "grok-fast"
+
+
+def test_failed_task_span_has_error_status(spans):
+    logger.log_task_start({"task_id": "task_002", "assignee": "gemini", "description": "d", "files": []})
+    logger.log_error("boom", task_id="task_002")
+    (span,) = spans()
+    assert span.status.status_code.name == "ERROR" and span.status.description == "boom"
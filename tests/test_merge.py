@@ -0,0 +1,111 @@
+from core import orchestrator
+from core.merge import merge_sources
+
+TARGET = '''# main.py - entry point
+import os
+
+def helper():
+    return 1
+
+def main():
+    print(helper())
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def test_replaces_adds_and_dedupes():
+    proposal = '''import os
+import sys, json
+from pathlib import Path
+
+def helper():
+    return 2
+
+@staticmethod
+def extra():
+    return sys.argv
+
+VERSION = 1
+'''
+    merged, stats = merge_sources(TARGET, [("p1.py", proposal), ("p2.py", "import json\nVERSION = 1\n")])
+    assert merged == '''# main.py - entry point
+import os
+import sys
+import json
+from pathlib import Path
+
+def helper():
+    return 2
+
+def main():
+    print(helper())
+
+@staticmethod
+def extra():
+    return sys.argv
+
+VERSION = 1
+
+if __name__ == "__main__":
+    main()
+'''
+    assert (stats.imports_added, stats.replaced, stats.added) == (3, 1, 2)
+    # Merging the same proposal again changes nothing
+    assert merge_sources(merged, [("p1.py", proposal)])[0] == merged
+
+
+def test_last_proposal_wins_and_fenced_answers_are_accepted():
+    fenced = "Here you go:\n```python:shared/proposals/g.py\ndef helper():\n    return 3\n```\n"
+    merged, stats = merge_sources(TARGET, [("a.py", "def helper():\n    return 2\n"), ("g.py", fenced),
+                                           ("bad.py", "def broken(:\n")])
+    assert "return 3" in merged and "return 2" not in merged
+    assert stats.merged == ["a.py", "g.py"]
+    assert stats.invalid[0][0] == "bad.py"
+
+
+def test_merge_proposals_consumes_valid_proposals(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator, "COLLABORATION_ROOT", tmp_path)
+    monkeypatch.setattr(orchestrator, "_rejected_proposals", set())
+    (tmp_path / "shared" / "app").mkdir(parents=True)
+    main = tmp_path / "shared" / "app" / "main.py"
+    main.write_text(TARGET)
+    proposals = tmp_path / "shared" / "proposals"
+    proposals.mkdir()
+    (proposals / "good.py").write_text("def helper():\n    return 5\n")
+    (proposals / "bad.py").write_text("not python at all\n")
+
+    orchestrator.merge_proposals()
+    assert "return 5" in main.read_text()
+    assert [p.name for p in proposals.iterdir()] == ["bad.py"]
+
+    mtime = main.stat().st_mtime_ns
+    orchestrator.merge_proposals()  # nothing new: main.py is not touched
+    assert main.stat().st_mtime_ns == mtime
+
+
+def test_future_imports_go_after_the_docstring():
+    target = '"""App."""\n# comment\nimport os\n\ndef main():\n    pass\n'
+    proposal = "from __future__ import annotations\nimport sys\n\ndef extra() -> list:\n    return sys.argv\n"
+    merged, stats = merge_sources(target, [("p.py", proposal)])
+    assert merged.startswith('"""App."""\nfrom __future__ import annotations\n# comment\nimport os\nimport sys\n')
+    compile(merged, "main.py", "exec")
+    assert merge_sources(TARGET, [("p.py", proposal)])[0].startswith(
+        "# main.py - entry point\nfrom __future__ import annotations\nimport os\n")
+
+
+def test_proposals_that_break_the_merged_module_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator, "COLLABORATION_ROOT", tmp_path)
+    monkeypatch.setattr(orchestrator, "_rejected_proposals", set())
+    (tmp_path / "shared" / "app").mkdir(parents=True)
+    main = tmp_path / "shared" / "app" / "main.py"
+    main.write_text(TARGET)
+    proposals = tmp_path / "shared" / "proposals"
+    proposals.mkdir()
+    (proposals / "good.py").write_text("def helper():\n    return 5\n")
+    (proposals / "stray.py").write_text("return 1\n")  # parses, but cannot compile
+
+    orchestrator.merge_proposals()
+    assert main.read_text() == TARGET
+    assert sorted(p.name for p in proposals.iterdir()) == ["good.py", "stray.py"]
@@ -0,0 +1,44 @@
+import json
+import urllib.request
+
+from core.metrics import MetricsExporter, MetricsRegistry
+from core.scheduler import TaskScheduler
+
+
+def test_histogram_exposition_and_quantiles():
+    registry = MetricsRegistry()
+    latency = registry.histogram("llm_seconds", "latency", ["backend"], buckets=(1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        latency.observe(value, backend="grok-fast")
+    registry.counter("requests_total", "requests", ["backend"]).inc(3, backend='a"b')
+
+    text = registry.render_prometheus()
+    assert '# TYPE llm_seconds histogram' in text
+    assert 'llm_seconds_bucket{backend="grok-fast",le="2"} 3' in text
+    assert 'llm_seconds_bucket{backend="grok-fast",le="+Inf"} 5' in text
+    assert 'llm_seconds_sum{backend="grok-fast"} 16.5' in text
+    assert 'requests_total{backend="a\\"b"} 3' in text
+
+    (series,) = registry.snapshot()["metrics"]["llm_seconds"]["series"]
+    assert series["count"] == 5 and series["p50"] == 1.75 and series["p99"] == 4
+
+
+def test_exporter_serves_and_snapshots(tmp_path):
+    registry = MetricsRegistry()
+    scheduler = TaskScheduler([
+        {"task_id": "task_001", "status": "pending"},
+        {"task_id": "task_002", "status": "pending", "depends_on": ["task_001"]},
+        {"task_id": "task_003", "status": "awaiting_gemini_input"},
+    ])
+    registry.gauge("tasks", "tasks", ["state"]).set_function(
+        lambda: {(state,): n for state, n in scheduler.state_counts().items()})
+
+    exporter = MetricsExporter(registry, port=0, snapshot_path=tmp_path / "metrics.json", interval=60).start()
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics").read().decode()
+        assert 'tasks{state="ready"} 1' in body and 'tasks{state="blocked"} 1' in body
+        assert 'tasks{state="awaiting_gemini_input"} 1' in body
+    finally:
+        exporter.stop()
+    snapshot = json.loads((tmp_path / "metrics.json").read_text())
+    assert {"labels": {"state": "pending"}, "value": 2} in snapshot["metrics"]["tasks"]["series"]
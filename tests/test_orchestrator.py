@@ -0,0 +1,360 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from core import orchestrator
+
+
+def write_task(tasks_dir, task_id, **fields):
+    task = {"task_id": task_id, "description": task_id, "assignee": "grok-fast",
+            "files": [], "status": "pending", **fields}
+    (tasks_dir / f"{task_id}.json").write_text(json.dumps(task, indent=2))
+    return task
+
+
+@pytest.fixture
+def tasks_dir(tmp_path, monkeypatch):
+    d = tmp_path / "tasks"
+    d.mkdir()
+    monkeypatch.setattr(orchestrator, "TASKS_DIR", d)
+    for name in ("log_task_start", "log_success", "log_error", "log_retry"):
+        monkeypatch.setattr(orchestrator, name, lambda *a, **k: None)
+    # No metrics port or docs/metrics.json snapshot from the daemon and workflow tests
+    monkeypatch.setattr(orchestrator, "start_metrics", lambda: None)
+    monkeypatch.setattr(orchestrator, "stop_metrics", lambda: None)
+    return d
+
+
+def test_get_next_task_priority_and_order():
+    tasks = [
+        {"task_id": "task_001", "status": "pending", "priority": 5},
+        {"task_id": "task_002", "status": "pending", "priority": 1},
+        {"task_id": "task_003", "status": "pending", "priority": 1},
+        {"task_id": "task_004", "status": "pending", "priority": 0, "depends_on": ["task_001"]},
+    ]
+    assert orchestrator.get_next_task(tasks)["task_id"] == "task_002"
+
+
+def test_run_tasks_respects_dependencies_and_limits(tasks_dir, monkeypatch):
+    write_task(tasks_dir, "task_001")
+    write_task(tasks_dir, "task_002")
+    write_task(tasks_dir, "task_003")
+    write_task(tasks_dir, "task_004", depends_on=["task_001", "task_002"])
+
+    lock = threading.Lock()
+    active, peak, order = [0], [0], []
+
+    def executor(task):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            order.append(task["task_id"])
+        return True
+
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", executor)
+    monkeypatch.setattr(orchestrator, "agent_limits", lambda workers: {"grok-fast": 2})
+
+    orchestrator.run_tasks(workers=4)
+
+    assert peak[0] == 2
+    assert order.index("task_004") > max(order.index("task_001"), order.index("task_002"))
+    statuses = {t["task_id"]: t["status"] for t in orchestrator.load_all_tasks()}
+    assert set(statuses.values()) == {"completed"}
+
+
+def test_failures_back_off_and_only_block_their_dependents(tasks_dir, monkeypatch):
+    write_task(tasks_dir, "task_001")
+    write_task(tasks_dir, "task_002", depends_on=["task_001"])
+    write_task(tasks_dir, "task_003")
+    write_task(tasks_dir, "task_004")
+    monkeypatch.setattr(orchestrator, "workflow_config",
+                        lambda: {"max_retries": 2, "retry_base_delay": 0.05, "retry_jitter": 0})
+
+    calls = []
+
+    def executor(task):
+        calls.append((task["task_id"], time.monotonic()))
+        if task["task_id"] == "task_001":
+            return False  # fails for good
+        if task["task_id"] == "task_003":
+            return sum(1 for tid, _ in calls if tid == "task_003") > 1  # flaky once
+        return True
+
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", executor)
+    orchestrator.run_tasks(workers=1)
+
+    statuses = {t["task_id"]: t["status"] for t in orchestrator.load_all_tasks()}
+    assert statuses == {"task_001": "failed", "task_002": "pending",
+                        "task_003": "completed", "task_004": "completed"}
+    first = [tid for tid, _ in calls]
+    # task_004 ran while task_001 and task_003 were waiting out their backoff
+    assert first.index("task_004") < first.index("task_003", first.index("task_003") + 1)
+    t001 = [t for tid, t in calls if tid == "task_001"]
+    assert len(t001) == 3
+    assert t001[2] - t001[1] >= 0.1  # second retry waits 2x the base delay
+
+
+def test_daemon_dispatches_new_task_files_quickly(tmp_path, tasks_dir, monkeypatch):
+    monkeypatch.setattr(orchestrator, "COLLABORATION_ROOT", tmp_path)
+    monkeypatch.setattr(orchestrator, "PROMPTS_DIR", tmp_path / "prompts")
+    started = threading.Event()
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", lambda task: started.set() or True)
+    flushed = []
+    monkeypatch.setattr(orchestrator, "flush_telemetry", lambda: flushed.append(True))
+
+    daemon = orchestrator.OrchestratorDaemon(workers=2, debounce=0.02)
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    try:
+        time.sleep(0.2)
+        landed = time.monotonic()
+        write_task(tasks_dir, "task_001")
+        assert started.wait(5)
+        assert time.monotonic() - landed < 1.0
+    finally:
+        daemon.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert json.loads((tasks_dir / "task_001.json").read_text())["status"] == "completed"
+    assert flushed  # buffered spans are exported on shutdown
+
+
+def test_rate_limits_pick_tasks_that_fit_and_reroute_to_fallbacks(tasks_dir, monkeypatch):
+    from core.ratelimit import AgentRateLimiter
+
+    write_task(tasks_dir, "task_001", priority=1, estimated_output_tokens=900)
+    write_task(tasks_dir, "task_002", priority=2, estimated_output_tokens=100)
+    write_task(tasks_dir, "task_003", priority=3, estimated_output_tokens=100)
+    limiter = AgentRateLimiter("grok-fast", output_tokens_per_minute=1000, requests_per_minute=1000)
+    limiter.try_acquire(orchestrator.Cost(requests=0, output_tokens=800))  # 200 left
+    monkeypatch.setattr(orchestrator, "get_rate_limiters", lambda: {"grok-fast": limiter})
+    monkeypatch.setattr(orchestrator, "agent_fallbacks", lambda: {"grok-fast": ["agent-4"]})
+
+    ran = []
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", lambda task: ran.append(task["task_id"]) or True)
+    monkeypatch.setitem(orchestrator.AGENTS["agent-4"], "executor",
+                        lambda task: ran.append(f"{task['task_id']}@agent-4") or True)
+    monkeypatch.setattr(orchestrator, "agent_limits", lambda workers: {"grok-fast": 4, "agent-4": 1})
+
+    runner = orchestrator.TaskRunner(4, orchestrator.TaskScheduler(orchestrator.load_all_tasks()))
+    try:
+        assert runner.dispatch_ready() == 3
+        runner.drain()
+    finally:
+        runner.shutdown()
+
+    # The big task went to the fallback; the small ones still fit grok-fast's budget
+    assert sorted(ran) == ["task_001@agent-4", "task_002", "task_003"]
+    task = orchestrator.load_task("task_001")
+    assert (task["assignee"], task["rerouted_to"]) == ("grok-fast", "agent-4")
+    assert limiter.available()["output_tokens"] < 1
+
+
+def test_a_task_skipped_for_its_rate_limit_gets_the_budget_reserved(tasks_dir, monkeypatch):
+    from core.ratelimit import AgentRateLimiter
+
+    write_task(tasks_dir, "task_001", priority=1, estimated_output_tokens=500)
+    for n in range(2, 6):
+        write_task(tasks_dir, f"task_00{n}", priority=n, estimated_output_tokens=50)
+    clock = [0.0]
+    limiter = AgentRateLimiter("grok-fast", clock=lambda: clock[0], output_tokens_per_minute=600)  # 10 a second
+    limiter.try_acquire(orchestrator.Cost(requests=0, output_tokens=500))  # 100 left
+    monkeypatch.setattr(orchestrator, "get_rate_limiters", lambda: {"grok-fast": limiter})
+    monkeypatch.setattr(orchestrator, "agent_fallbacks", lambda: {})
+    ran = []
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", lambda task: ran.append(task["task_id"]) or True)
+
+    runner = orchestrator.TaskRunner(4, orchestrator.TaskScheduler(orchestrator.load_all_tasks()))
+    runner.reserve_after = 2
+    try:
+        assert runner.dispatch_ready() == 2  # the small tasks drain what is left
+        runner.drain()
+        clock[0] += 5
+        assert runner.dispatch_ready() == 0  # task_004 would fit, but task_001 has now waited twice
+        assert runner.reserved == {"grok-fast": "task_001"}
+        clock[0] += 45
+        assert runner.dispatch_ready() == 1
+        runner.drain()
+    finally:
+        runner.shutdown()
+
+    assert ran == ["task_002", "task_003", "task_001"]
+    assert runner.reserved == {"grok-fast": "task_004"}  # next in line once it has waited as long
+
+
+def test_fallbacks_without_a_handler_are_ignored(monkeypatch, capsys):
+    monkeypatch.setattr(orchestrator, "agent_config",
+                        lambda name: {"fallback": ["agent-4", "gemini"]} if name == "grok-fast" else {})
+
+    assert orchestrator.agent_fallbacks()["grok-fast"] == ["gemini"]
+    assert "agents.grok-fast.fallback lists agent-4" in capsys.readouterr().out
+
+
+def test_rate_limited_tasks_wait_for_the_budget_to_refill(tasks_dir, monkeypatch):
+    from core.ratelimit import AgentRateLimiter
+
+    write_task(tasks_dir, "task_001", estimated_output_tokens=10)
+    write_task(tasks_dir, "task_002", estimated_output_tokens=10)
+    limiter = AgentRateLimiter("grok-fast", requests_per_minute=600)  # one every 0.1s
+    limiter.buckets["requests"].take(600 - 1)
+    monkeypatch.setattr(orchestrator, "get_rate_limiters", lambda: {"grok-fast": limiter})
+    started = []
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", lambda task: started.append(time.monotonic()) or True)
+
+    orchestrator.run_tasks(workers=2)
+
+    assert len(started) == 2
+    assert started[1] - started[0] >= 0.08
+    assert {t["status"] for t in orchestrator.load_all_tasks()} == {"completed"}
+
+
+def test_cycles_are_reported_instead_of_claiming_success(tasks_dir, monkeypatch, capsys):
+    write_task(tasks_dir, "task_001", depends_on=["task_002"])
+    write_task(tasks_dir, "task_002", depends_on="task_001")
+    write_task(tasks_dir, "task_003")
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", lambda task: True)
+
+    orchestrator.run_tasks(workers=2)
+
+    out = capsys.readouterr().out
+    assert "Dependency cycle among task_001, task_002" in out
+    assert "Stopped with 2 pending task(s)" in out
+    assert "All tasks completed" not in out
+
+
+LEASED_WORKER = """
+import os, sys, time
+from pathlib import Path
+from core import orchestrator
+
+tasks_dir, log, ready, workers = Path(sys.argv[1]), Path(sys.argv[2]), Path(sys.argv[3]), int(sys.argv[4])
+orchestrator.TASKS_DIR = tasks_dir
+orchestrator.lease_settings = lambda: {"enabled": True, "ttl": 5, "poll": 0.05}
+for name in ("log_task_start", "log_success", "log_error", "log_retry"):
+    setattr(orchestrator, name, lambda *a, **k: None)
+
+def executor(task):
+    with open(log, "a") as f:
+        f.write(f"{task['task_id']} {os.getpid()}\\n")
+    time.sleep(0.05)
+    return True
+
+orchestrator.AGENTS["grok-fast"]["executor"] = executor
+(ready / str(os.getpid())).touch()
+while len(list(ready.iterdir())) < workers:  # start together
+    time.sleep(0.01)
+orchestrator.run_tasks(workers=2)
+"""
+
+
+def test_processes_sharing_tasks_run_each_task_once(tmp_path, tasks_dir):
+    for i in range(24):
+        write_task(tasks_dir, f"task_{i:03d}")
+    write_task(tasks_dir, "task_100", depends_on=[f"task_{i:03d}" for i in range(24)])
+    log, ready = tmp_path / "runs.log", tmp_path / "ready"
+    ready.mkdir()
+
+    root = Path(orchestrator.__file__).parent.parent
+    workers = [subprocess.Popen([sys.executable, "-c", LEASED_WORKER, str(tasks_dir), str(log), str(ready), "3"],
+                                cwd=root, stdout=subprocess.DEVNULL) for _ in range(3)]
+    assert [w.wait(60) for w in workers] == [0, 0, 0]
+
+    runs = [line.split() for line in log.read_text().splitlines()]
+    assert sorted(task_id for task_id, _ in runs) == sorted([f"task_{i:03d}" for i in range(24)] + ["task_100"])
+    assert len({pid for _, pid in runs}) > 1
+    assert runs[-1][0] == "task_100"
+    assert {json.loads(p.read_text())["status"] for p in tasks_dir.glob("*.json")} == {"completed"}
+    assert not list((tasks_dir / ".leases").iterdir())
+
+
+def test_tasks_of_a_crashed_worker_are_reclaimed(tasks_dir, monkeypatch, capsys):
+    write_task(tasks_dir, "task_001")
+    write_task(tasks_dir, "task_002", depends_on=["task_001"])
+    (tasks_dir / ".leases").mkdir()
+    (tasks_dir / ".leases" / "task_001.lease").write_text(json.dumps(
+        {"task_id": "task_001", "owner": "deadhost:4242", "token": "x", "expires": time.time() + 0.3}))
+    monkeypatch.setattr(orchestrator, "lease_settings", lambda: {"enabled": True, "ttl": 5, "poll": 0.05})
+    started = time.monotonic()
+    ran = []
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor",
+                        lambda task: ran.append((task["task_id"], time.monotonic() - started)) or True)
+
+    orchestrator.run_tasks(workers=2)
+
+    assert [task_id for task_id, _ in ran] == ["task_001", "task_002"]
+    assert ran[0][1] >= 0.25  # waited for the dead worker's lease to expire
+    assert "lease of deadhost:4242 expired, reclaiming it" in capsys.readouterr().out
+    assert {json.loads(p.read_text())["status"] for p in tasks_dir.glob("*.json")} == {"completed"}
+
+
+def test_tasks_waiting_on_a_handoff_are_not_reported_as_stuck(tasks_dir, monkeypatch, capsys):
+    write_task(tasks_dir, "task_001")
+    write_task(tasks_dir, "task_002", depends_on="task_001")
+
+    def hand_off(task):
+        orchestrator.update_task_status(task, "awaiting_gemini_input")
+        return False
+
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", hand_off)
+    orchestrator.run_tasks(workers=1)
+
+    out = capsys.readouterr().out
+    assert "waiting on tasks that are awaiting_gemini_input (1)" in out
+    assert "can never finish" not in out
+    assert json.loads((tasks_dir / "task_002.json").read_text())["depends_on"] == "task_001"  # not rewritten
+
+
+def test_status_changes_do_not_recompile_the_task_graph(tasks_dir, monkeypatch):
+    write_task(tasks_dir, "task_001")
+    write_task(tasks_dir, "task_002", depends_on=["task_001"])
+    scheduler = orchestrator.build_scheduler(orchestrator.load_all_tasks())
+    compiles = []
+    real_plan = orchestrator.plan_tasks
+    monkeypatch.setattr(orchestrator, "plan_tasks", lambda tasks: compiles.append(1) or real_plan(tasks))
+
+    time.sleep(0.01)
+    write_task(tasks_dir, "task_001", status="completed")
+    orchestrator.sync_scheduler(scheduler)
+    assert compiles == [] and scheduler.peek()["task_id"] == "task_002"
+
+    write_task(tasks_dir, "task_003", depends_on=["task_002"])
+    orchestrator.sync_scheduler(scheduler)
+    assert compiles == [1]
+
+
+def test_tasks_whose_batched_commit_failed_are_marked_failed(tasks_dir, monkeypatch):
+    from core.git_utils import CommitQueue
+
+    write_task(tasks_dir, "task_001", status="completed")
+    write_task(tasks_dir, "task_002", depends_on=["task_001"])
+    queue = CommitQueue()
+    queue._failed = [("task_001", "git update-ref failed")]
+    monkeypatch.setattr(orchestrator, "get_commit_queue", lambda: queue)
+    ran = []
+    monkeypatch.setitem(orchestrator.AGENTS["grok-fast"], "executor", lambda task: ran.append(task["task_id"]) or True)
+
+    runner = orchestrator.TaskRunner(2, orchestrator.TaskScheduler(orchestrator.load_all_tasks()))
+    try:
+        assert runner.dispatch_ready() == 0
+    finally:
+        runner.shutdown()
+
+    assert runner.failed == ["task_001"] and ran == []
+    assert runner.scheduler.get("task_001")["status"] == "failed"
+
+
+def test_worker_counts_must_be_positive():
+    import argparse
+
+    assert orchestrator.positive_int("3") == 3
+    for value in ("0", "-1", "two"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            orchestrator.positive_int(value)
@@ -0,0 +1,43 @@
+from core.metrics import RATE_LIMIT_DEFERRED
+from core.ratelimit import AgentRateLimiter, Cost, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)  # one per second, 60 max
+    bucket.take(60)
+    assert bucket.wait_time(3) == 3.0
+    clock.now = 2.0
+    assert bucket.available == 2.0
+    clock.now = 1000.0
+    assert bucket.available == 60.0
+    # A cost above the capacity waits for a full bucket instead of forever
+    bucket.take(30)
+    assert bucket.wait_time(500) == 30.0
+
+
+def test_limiter_admits_only_when_every_limit_has_room():
+    clock = FakeClock()
+    limiter = AgentRateLimiter("agent-x", clock=clock, requests_per_minute=60, output_tokens_per_minute=600)
+    big = Cost(requests=1, input_tokens=10_000, output_tokens=500)
+    assert limiter.try_acquire(big)  # no input limit configured
+    small = Cost(requests=1, output_tokens=100)
+    assert limiter.try_acquire(small)
+    assert not limiter.try_acquire(small)  # output budget exhausted, requests still fine
+    assert limiter.short_limits(small) == ["output_tokens"]
+    assert limiter.wait_time(small) == 10.0
+
+    before = RATE_LIMIT_DEFERRED.samples().get(("agent-x", "output_tokens"), 0)
+    limiter.defer(small)
+    assert RATE_LIMIT_DEFERRED.samples()[("agent-x", "output_tokens")] == before + 1
+
+    clock.now = 10.0
+    assert limiter.try_acquire(small)
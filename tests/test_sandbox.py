@@ -0,0 +1,120 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from agents.sandbox import ProcessBackend, ResourceLimits, SandboxError, SandboxPool
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(ProcessBackend(), workers=2, limits=ResourceLimits(timeout=30))
+    yield pool
+    pool.shutdown()
+
+
+def test_jobs_queue_onto_warm_workers_and_are_reset(pool, tmp_path):
+    script = "import os, sys; print(sorted(os.listdir(os.environ['TMPDIR']))); open(os.path.join(os.environ['TMPDIR'], 'x'), 'w')"
+    futures = [pool.submit([sys.executable, "-c", script], cwd=tmp_path) for _ in range(5)]
+    results = [f.result() for f in futures]
+    assert all(r.returncode == 0 and r.stdout == "[]\n" for r in results)  # scratch is wiped between jobs
+    assert pool.stats["jobs"] == 5 and pool.stats["replaced"] == 0
+    assert pool._idle.qsize() == 2
+
+
+def test_limits_are_enforced_per_job(pool):
+    slow = pool.run([sys.executable, "-c", "import time; time.sleep(10)"], timeout=0.3)
+    assert slow.timed_out and slow.returncode != 0
+
+    hog = pool.run([sys.executable, "-c", "b = bytearray(512 * 1024 * 1024)"], memory_mb=128)
+    assert hog.returncode != 0 and "MemoryError" in hog.stderr
+
+    assert pool.run(["true"]).returncode == 0  # the workers survive both
+
+
+def test_jobs_can_only_write_their_cwd_and_scratch(pool, tmp_path):
+    work, outside = tmp_path / "work", tmp_path / "outside"
+    work.mkdir()
+    outside.mkdir()
+    script = ("import os, sys\n"
+              "for path in ('out.txt', os.path.join(os.environ['TMPDIR'], 'x'), sys.argv[1] + '/leak.txt'):\n"
+              "    try:\n"
+              "        open(path, 'w').close(); print('ok')\n"
+              "    except OSError as e:\n"
+              "        print(e.strerror)\n")
+    result = pool.run([sys.executable, "-c", script, str(outside)], cwd=work)
+    assert result.stdout.splitlines() == ["ok", "ok", "Read-only file system"]
+    assert (work / "out.txt").exists() and not list(outside.iterdir())
+
+
+class FlakyBackend:
+    """Starts workers until `fail_after` have been started, then raises like a missing docker binary."""
+
+    def __init__(self, fail_after: int):
+        self.fail_after = fail_after
+        self.started, self.closed = 0, 0
+        self.go = threading.Event()
+        self.go.set()
+
+    def start_worker(self, limits):
+        if self.started >= self.fail_after:
+            raise SandboxError("docker worker failed to start: docker is not installed")
+        self.started += 1
+        backend = self
+
+        class Worker:
+            def run(self, args, cwd, limits, env=None):
+                backend.go.wait()
+                raise SandboxError("worker died")
+
+            def close(self):
+                backend.closed += 1
+
+        return Worker()
+
+
+def test_a_pool_that_fails_to_start_closes_its_workers_and_can_retry():
+    backend = FlakyBackend(fail_after=1)
+    pool = SandboxPool(backend, workers=2)
+    with pytest.raises(SandboxError):
+        pool.run(["true"])
+    assert backend.closed == 1
+    with pytest.raises(SandboxError):  # started afresh, not stuck behind the lost worker
+        pool.run(["true"])
+    pool.shutdown()
+
+
+def test_queued_jobs_fail_once_no_replacement_worker_starts():
+    backend = FlakyBackend(fail_after=2)
+    pool = SandboxPool(backend, workers=2)
+    backend.go.clear()
+    futures = [pool.submit(["true"]) for _ in range(5)]
+    backend.go.set()
+    for future in futures:
+        with pytest.raises(SandboxError):
+            future.result(timeout=10)
+    pool.shutdown()
+
+
+def test_docker_worker_is_read_only_and_applies_per_job_limits(monkeypatch, tmp_path):
+    from agents import sandbox
+
+    commands = []
+
+    def fake_run(args, **kwargs):
+        commands.append(args)
+        return subprocess.CompletedProcess(args, 0, "container-id\n", "")
+
+    monkeypatch.setattr(sandbox.subprocess, "run", fake_run)
+    worker = sandbox.DockerWorker(tmp_path, "python:3.12-slim", ResourceLimits(memory_mb=256))
+    assert "--read-only" in commands[0] and f"{sandbox.DOCKER_HOME}:rw,exec,mode=1777" in commands[0]
+
+    worker.run(["pytest", "-q"], str(tmp_path), ResourceLimits(memory_mb=256, cpu_seconds=5, max_file_mb=1))
+    assert commands[1][-3:] == ["sh", "pytest", "-q"]
+    assert "SANDBOX_CPU=5" in commands[1] and "SANDBOX_FSIZE=2048" in commands[1]
+    with pytest.raises(ValueError, match="memory_mb"):
+        worker.run(["true"], str(tmp_path), ResourceLimits(memory_mb=512))
+
+    worker.reset()
+    assert f"{sandbox.DOCKER_HOME}/*" in commands[-1][-1]
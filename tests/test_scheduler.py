@@ -0,0 +1,75 @@
+import random
+
+from core.scheduler import TaskScheduler
+
+
+def reference_next_task(tasks):
+    # The original quadratic get_next_task, kept here as the ordering oracle
+    pending = [t for t in tasks if t['status'] == 'pending']
+    ready = [t for t in pending if all(dep['status'] == 'completed'
+            for dep_id in t.get('depends_on', [])
+            for dep in tasks if dep['task_id'] == dep_id)]
+    return min(ready, key=lambda t: t.get('priority', 10), default=None)
+
+
+def random_tasks(rng, n):
+    tasks = []
+    for i in range(n):
+        task = {"task_id": f"task_{i:03d}", "status": rng.choice(["pending", "pending", "completed", "failed"])}
+        if rng.random() < 0.7:
+            task["priority"] = rng.randint(0, 3)
+        if i and rng.random() < 0.6:
+            task["depends_on"] = [f"task_{rng.randrange(n + 5):03d}" for _ in range(rng.randint(1, 3))]
+        tasks.append(task)
+    return tasks
+
+
+def test_matches_reference_ordering_through_completions():
+    rng = random.Random(7)
+    for _ in range(50):
+        tasks = random_tasks(rng, 40)
+        scheduler = TaskScheduler(tasks)
+        while True:
+            expected = reference_next_task(tasks)
+            task = scheduler.pop_ready()
+            assert (task and task['task_id']) == (expected and expected['task_id'])
+            if task is None:
+                break
+            task['status'] = rng.choice(["completed", "completed", "failed"])
+            scheduler.release(task['task_id'])
+            scheduler.update(task)
+
+
+def test_new_dependency_blocks_and_completion_unblocks():
+    scheduler = TaskScheduler([{"task_id": "task_002", "status": "pending", "depends_on": ["task_001"]}])
+    assert scheduler.peek()['task_id'] == "task_002"  # missing deps count as satisfied
+
+    scheduler.update({"task_id": "task_001", "status": "pending", "priority": 20})
+    assert scheduler.pop_ready()['task_id'] == "task_001"
+    assert scheduler.pop_ready() is None
+
+    scheduler.set_status("task_001", "completed")
+    assert scheduler.pop_ready()['task_id'] == "task_002"
+
+
+def test_pop_ready_skips_rejected_tasks_without_dropping_them():
+    scheduler = TaskScheduler([
+        {"task_id": "task_001", "status": "pending", "priority": 0, "assignee": "gemini"},
+        {"task_id": "task_002", "status": "pending", "priority": 1, "assignee": "grok-fast"},
+    ])
+    task = scheduler.pop_ready(accept=lambda t: t['assignee'] == "grok-fast")
+    assert task['task_id'] == "task_002"
+    assert scheduler.pop_ready()['task_id'] == "task_001"
+
+
+def test_pop_ready_skips_closed_assignees_without_looking_at_their_tasks():
+    tasks = [{"task_id": f"task_{i:03d}", "status": "pending", "priority": 0, "assignee": "gemini"} for i in range(50)]
+    tasks.append({"task_id": "task_100", "status": "pending", "priority": 5, "assignee": "grok-fast"})
+    scheduler = TaskScheduler(tasks)
+    seen = []
+
+    task = scheduler.pop_ready(accept=lambda t: seen.append(t['task_id']) or True,
+                               is_open=lambda assignee: assignee != "gemini")
+    assert task['task_id'] == "task_100" and seen == ["task_100"]
+    assert scheduler.pop_ready()['task_id'] == "task_000"  # still queued, in order
+    assert scheduler.ready_count() == 49
@@ -0,0 +1,67 @@
+import subprocess
+
+import security_scan
+
+
+def git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def make_tree(tmp_path, monkeypatch):
+    git(tmp_path, "init", "-q")
+    (tmp_path / ".gitignore").write_text("build/\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "leak.py").write_text("SECRET = 'x'\n")
+    (tmp_path / "prompts").mkdir()
+    (tmp_path / "prompts" / "reply.txt").write_text("token: abc\n")
+    (tmp_path / "env.py").write_text('import os\nkey = os.getenv("API_KEY")\n')
+    (tmp_path / "plain.py").write_text("def f():\n    return 1\n")
+    monkeypatch.setattr(security_scan, "scan_settings",
+                        lambda: {"cache": ".cache/scan.json", "ignore": ["prompts/*"]})
+    return tmp_path
+
+
+def count_bandit_runs(monkeypatch):
+    runs = []
+    real_run = subprocess.run
+
+    def run(cmd, *args, **kwargs):
+        if "bandit" in cmd:
+            runs.append([c for c in cmd if c.endswith(".py")])
+        return real_run(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(security_scan.subprocess, "run", run)
+    return runs
+
+
+def test_files_honour_gitignore_and_ignore_globs(tmp_path, monkeypatch):
+    root = make_tree(tmp_path, monkeypatch)
+    assert security_scan.list_files(root) == ["env.py", "plain.py"]
+
+
+def test_key_check_skips_environment_reads():
+    assert security_scan._key_findings('x = os.getenv("API_KEY")') == []
+    assert security_scan._key_findings("password = 'hunter2'\ntoken = 1") == ["PASSWORD", "TOKEN"]
+
+
+def test_bandit_only_sees_changed_python_files(tmp_path, monkeypatch, capsys):
+    root = make_tree(tmp_path, monkeypatch)
+    runs = count_bandit_runs(monkeypatch)
+
+    assert security_scan.scan(root=root)
+    assert runs == [["env.py", "plain.py"]]
+
+    assert security_scan.scan(root=root)
+    assert len(runs) == 1  # everything cached
+
+    (root / "plain.py").write_text("def f():\n    return 2\n")
+    (root / "creds.py").write_text("PASSWORD = 'hunter2'\n")
+    assert not security_scan.scan(root=root)
+    assert runs[1:] == [["creds.py", "plain.py"]]
+    assert "Potential API key in creds.py (PASSWORD)" in capsys.readouterr().out
+
+    # Deleted files drop out of the scan and the cache without a new bandit run
+    (root / "creds.py").unlink()
+    assert security_scan.scan(root=root)
+    assert len(runs) == 2
+    assert set(security_scan.ScanCache(root / ".cache/scan.json").stamps) == {"env.py", "plain.py"}
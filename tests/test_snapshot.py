@@ -0,0 +1,61 @@
+import os
+
+from core.snapshot import RepoSnapshot, assemble_context
+
+render = lambda rel, text: f"## {rel}\n{text}\n"
+
+
+def test_unchanged_files_are_not_reread(tmp_path):
+    (tmp_path / "a.py").write_text("A = 1\n")
+    snapshot = RepoSnapshot(tmp_path)
+
+    assert snapshot.read("a.py") == "A = 1\n"
+    assert snapshot.read(tmp_path / "a.py") == "A = 1\n"
+    assert snapshot.stats["reads"] == 1
+
+    (tmp_path / "a.py").write_text("A = 22\n")
+    assert snapshot.read("a.py") == "A = 22\n"
+    assert snapshot.stats["reads"] == 2
+
+
+def test_missing_and_binary_files(tmp_path):
+    (tmp_path / "blob.bin").write_bytes(b"\xff\xfe\x00")
+    snapshot = RepoSnapshot(tmp_path)
+    assert snapshot.read("nope.py") is None
+    assert snapshot.entry("blob.bin").text is None
+
+    ctx = assemble_context(snapshot, ["nope.py", "blob.bin"], render, missing=lambda rel: f"missing {rel}\n",
+                           max_bytes=1000)
+    assert ctx.missing == ["nope.py"] and ctx.skipped == ["blob.bin"]
+    assert ctx.text == "missing nope.py\n"
+
+
+def test_walk_is_cached_until_a_file_appears(tmp_path):
+    (tmp_path / "shared" / "pkg").mkdir(parents=True)
+    (tmp_path / "shared" / "pkg" / "m.py").write_text("")
+    (tmp_path / "shared" / "notes.md").write_text("")
+    (tmp_path / "shared" / "__pycache__").mkdir()
+    (tmp_path / "shared" / "__pycache__" / "m.py").write_text("")
+    snapshot = RepoSnapshot(tmp_path)
+
+    assert snapshot.files(["shared", "gemini"], suffix=".py") == ["shared/pkg/m.py"]
+    snapshot.files(["shared"])
+    if snapshot.watching:
+        assert snapshot.stats["walks"] == 2  # shared once, plus the missing "gemini"
+
+    (tmp_path / "shared" / "pkg" / "n.py").write_text("")
+    assert snapshot.files(["shared"], suffix=".py") == ["shared/pkg/m.py", "shared/pkg/n.py"]
+    os.remove(tmp_path / "shared" / "pkg" / "m.py")
+    assert snapshot.files(["shared"], suffix=".py") == ["shared/pkg/n.py"]
+
+
+def test_budget_truncates_then_omits(tmp_path):
+    for name, size in (("a.py", 3000), ("b.py", 3000), ("c.py", 3000)):
+        (tmp_path / name).write_text("x" * size)
+    snapshot = RepoSnapshot(tmp_path)
+
+    ctx = assemble_context(snapshot, ["a.py", "b.py", "c.py"], render, max_bytes=5000)
+
+    assert ctx.included == ["a.py"] and ctx.truncated == ["b.py"] and ctx.omitted == ["c.py"]
+    assert ctx.bytes <= 5000 + 200  # plus the closing note
+    assert "[truncated" in ctx.text and "not included: c.py" in ctx.text
@@ -0,0 +1,61 @@
+from clients.stream_parser import (FenceStreamParser, FileBlock, HelpRequest, InvalidBlock, Prose, Snippet,
+                                   parse_events)
+
+RESPONSE = """Plan: touch two files.
+```python:shared/a.py
+A = 1
+```
+Some notes.
+```python
+print("not a file")
+```
+```request_help
+Question for Grok 4.1: which cache?
+Context files: shared/a.py grok/b.py
+```
+"""
+
+
+def test_typed_events_in_order():
+    events = parse_events(RESPONSE)
+    assert [type(e) for e in events] == [Prose, FileBlock, Prose, Snippet, HelpRequest]
+    assert events[1] == FileBlock("shared/a.py", "python", "A = 1", "python:shared/a.py")
+    assert events[3].lang == "python"
+    assert events[4].question == "Question for Grok 4.1: which cache?"
+    assert events[4].context_files == ["shared/a.py", "grok/b.py"]
+
+
+def test_chunked_input_matches_whole_string():
+    for size in (1, 3, 7, 64):
+        chunks = [RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)]
+        assert parse_events(chunks) == parse_events(RESPONSE)
+
+
+def test_nested_fences_stay_inside_the_block():
+    text = "````markdown:docs/README.md\n# Usage\n```bash\nmake test\n```\nDone.\n````\n"
+    assert parse_events(text) == [FileBlock("docs/README.md", "markdown", "# Usage\n```bash\nmake test\n```\nDone.",
+                                            "markdown:docs/README.md")]
+    text = "```markdown:docs/GUIDE.md\n```python\nx = 1\n```\nafter\n```\n"
+    assert parse_events(text)[0].body == "```python\nx = 1\n```\nafter"
+
+
+def test_paths_are_validated():
+    text = "".join(f"```python:{p}\nX = 1\n```\n" for p in ("../etc/passwd", "/abs.py", "tasks/t.json", "./shared/ok.py"))
+    events = parse_events(text, allowed_top_dirs={"shared"})
+    assert [type(e) for e in events] == [InvalidBlock, InvalidBlock, InvalidBlock, FileBlock]
+    assert events[3].path == "shared/ok.py"
+
+
+def test_blocks_complete_as_soon_as_their_fence_closes():
+    parser = FenceStreamParser()
+    assert parser.feed("```edit:shared/x.py\n<<<<<<< SEARCH\n") == []
+    assert parser.in_block
+    events = parser.feed("=======\n>>>>>>> REPLACE\n```")
+    assert events == []  # the closing line has not ended yet
+    events = parser.close()
+    assert len(events) == 1 and events[0].is_edit
+
+
+def test_unterminated_block_is_reported():
+    events = parse_events("```python:shared/x.py\nX = 1\n")
+    assert len(events) == 1 and isinstance(events[0], InvalidBlock) and events[0].reason == "unterminated fence"
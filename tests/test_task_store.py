@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+from core.task_store import TaskStore
+
+
+def write(path, **task):
+    path.write_text(json.dumps(task))
+
+
+@pytest.mark.parametrize("watch", [True, False])
+def test_refresh_reports_only_changes(tmp_path, watch):
+    write(tmp_path / "task_002.json", task_id="task_002", status="pending")
+    write(tmp_path / "task_001.json", task_id="task_001", status="pending")
+    (tmp_path / "notes.txt").write_text("ignored")
+    store = TaskStore(tmp_path, watch=watch)
+
+    assert [t["task_id"] for t in store.load_all()] == ["task_001", "task_002"]
+    assert store.refresh() == ([], [])
+
+    # Written by "another process": same size, so bump mtime to be sure the stat scan sees it
+    write(tmp_path / "task_001.json", task_id="task_001", status="complete")
+    st = os.stat(tmp_path / "task_001.json")
+    os.utime(tmp_path / "task_001.json", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    write(tmp_path / "task_003.json", task_id="task_003", status="pending")
+    (tmp_path / "task_002.json").unlink()
+
+    changed, removed = store.refresh()
+    assert sorted(t["task_id"] for t in changed) == ["task_001", "task_003"]
+    assert removed == ["task_002"]
+    assert [(t["task_id"], t["status"]) for t in store.tasks()] == [("task_001", "complete"), ("task_003", "pending")]
+    store.close()
+
+
+def test_invalid_json_keeps_last_good_copy(tmp_path, capsys):
+    path = tmp_path / "task_001.json"
+    write(path, task_id="task_001", status="pending")
+    store = TaskStore(tmp_path, watch=False)
+    store.load_all()
+
+    path.write_text('{"task_id": "task_0')
+    assert store.refresh() == ([], [])
+    assert store.tasks()[0]["status"] == "pending"
+    assert "invalid JSON" in capsys.readouterr().out
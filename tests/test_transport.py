@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from clients.transport import LLMTransport, TransportError
+
+
+@pytest.fixture
+def slow_server():
+    state = {"active": 0, "peak": 0, "clients": set(), "lock": threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with state["lock"]:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                state["clients"].add(self.client_address)
+            time.sleep(0.05)
+            with state["lock"]:
+                state["active"] -= 1
+            status = 500 if body.get("fail") else 200
+            out = json.dumps({"echo": body["n"]}).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_requests_share_a_bounded_pool(slow_server):
+    transport = LLMTransport({"grok-fast": {"max_in_flight": 6, "max_connections": 2, "timeout": 10}})
+    try:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            results = list(pool.map(lambda n: transport.post_json("grok-fast", slow_server["url"], {"n": n}), range(24)))
+        assert [r["echo"] for r in results] == list(range(24))
+        assert slow_server["peak"] <= 2
+        assert len(slow_server["clients"]) <= 2  # keep-alive: sockets were reused
+        assert transport.stats["grok-fast"]["requests"] == 24
+        assert 1 < transport.stats["grok-fast"]["peak_in_flight"] <= 6
+    finally:
+        transport.close()
+
+
+def test_http_errors_raise_transport_error(slow_server):
+    transport = LLMTransport({})
+    try:
+        with pytest.raises(TransportError) as err:
+            transport.post_json("grok-web", slow_server["url"], {"n": 1, "fail": True})
+        assert err.value.status_code == 500
+        assert transport.stats["grok-web"]["errors"] == 1
+    finally:
+        transport.close()
+
+
+def test_run_bounds_blocking_sdk_calls():
+    transport = LLMTransport({"gemini": {"max_in_flight": 2}})
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def sdk_call(x):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return x * 2
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert list(pool.map(lambda x: transport.run("gemini", sdk_call, x), range(8))) == [x * 2 for x in range(8)]
+        assert peak[0] == 2
+    finally:
+        transport.close()
+
+
+@pytest.fixture
+def endpoints():
+    from benchmarks.mock_llm import MockLLMServer
+
+    servers = {"slow": MockLLMServer(latency=1.0).start(), "fast": MockLLMServer(latency=0.01).start(),
+               "broken": MockLLMServer(failure_rate=1.0).start()}
+    yield servers
+    for server in servers.values():
+        server.stop()
+
+
+HEDGED = {"grok-fast": {"timeout": 10, "hedge_percentile": 0.9, "hedge_min_delay": 0.05, "hedge_default_delay": 0.1}}
+CHAT = {"messages": [{"role": "user", "content": "### shared/a.py"}]}
+
+
+def test_hedged_request_beats_a_slow_endpoint(endpoints):
+    from core.metrics import LLM_HEDGES
+
+    transport = LLMTransport(HEDGED)
+    urls = [endpoints["slow"].url, endpoints["fast"].url]
+    hedges_won = LLM_HEDGES.samples().get(("grok-fast", "hedge"), 0)
+    try:
+        for _ in range(6):
+            started = time.perf_counter()
+            response = transport.post_json("grok-fast", urls, CHAT)
+            assert time.perf_counter() - started < 0.6
+            assert "```python:shared/a.py" in response["choices"][0]["message"]["content"]
+        # The slow endpoint never answered first, and its lost hedges rank it below the fast one
+        slow, fast = transport.endpoints[urls[0]], transport.endpoints[urls[1]]
+        assert slow.stats["ok"] == 0 and fast.stats["ok"] == 6
+        assert fast.weight("response", 1.0) > 2 * slow.weight("response", 1.0)
+        assert LLM_HEDGES.samples().get(("grok-fast", "hedge"), 0) >= hedges_won + 1
+    finally:
+        transport.close()
+
+
+def test_a_single_endpoint_is_not_hedged(endpoints):
+    transport = LLMTransport(HEDGED)
+    slow = endpoints["slow"]
+    try:
+        assert transport.post_json("grok-fast", [slow.url, slow.url], CHAT)["choices"]
+        assert slow.stats["requests"] == 1  # no duplicate sent to the same server
+    finally:
+        transport.close()
+
+
+def test_failed_endpoint_fails_over(endpoints):
+    transport = LLMTransport({"grok-fast": {"timeout": 10}})  # no hedging
+    urls = [endpoints["broken"].url, endpoints["fast"].url]
+    transport.endpoint(urls[0]).record("response", 0.001)  # looks best until it fails
+    transport.endpoint(urls[1]).record("response", 1.0)
+    try:
+        for _ in range(4):
+            assert transport.post_json("grok-fast", urls, CHAT)["choices"]
+        broken = transport.endpoints[urls[0]]
+        assert broken.failures == broken.stats["errors"] >= 1
+        with pytest.raises(TransportError):
+            transport.post_json("grok-fast", [urls[0]], CHAT)
+    finally:
+        transport.close()
+
+
+def test_streams_race_on_the_first_line(endpoints):
+    transport = LLMTransport(HEDGED)
+    urls = [endpoints["slow"].url, endpoints["fast"].url]
+    transport.endpoint(urls[1]).record_failure()  # make the slow endpoint the likelier first pick
+    try:
+        started = time.perf_counter()
+        lines = [line for line in transport.stream_lines("grok-fast", urls, {**CHAT, "stream": True}) if line]
+        assert time.perf_counter() - started < 0.6
+        assert lines[-1] == "data: [DONE]"
+        assert transport.endpoints[urls[1]].stats["ok"] == 1
+    finally:
+        transport.close()
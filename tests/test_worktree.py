@@ -0,0 +1,69 @@
+import subprocess
+
+import pytest
+
+from core.git_utils import commit_paths
+from core.worktree import MergeConflict, WorktreePool
+
+
+def git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q")
+    git(repo, "config", "user.name", "test")
+    git(repo, "config", "user.email", "test@example.com")
+    (repo / "shared.py").write_text("base\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "init")
+    return repo
+
+
+def work(pool, task_id, path, text):
+    wt = pool.acquire(task_id)
+    (wt.path / path).write_text(text)
+    commit_paths([path], f"Task {task_id}", root=wt.path)
+    return wt
+
+
+def test_concurrent_tasks_are_rebased_and_fast_forwarded(repo, tmp_path):
+    pool = WorktreePool(repo, directory=tmp_path / "wts")
+    first = work(pool, "task_001", "a.py", "a\n")
+    second = work(pool, "task_002", "b.py", "b\n")
+    assert first.path != second.path
+    assert not (repo / "a.py").exists()  # nothing reaches main before integration
+
+    pool.integrate(first)
+    pool.integrate(second)  # main moved on: rebased first
+    assert (repo / "a.py").read_text() == "a\n" and (repo / "b.py").read_text() == "b\n"
+    assert git(repo, "log", "--format=%s").splitlines() == ["Task task_002", "Task task_001", "init"]
+    assert git(repo, "status", "--porcelain") == ""
+
+    pool.release(first)
+    pool.release(second)
+    assert "task/" not in git(repo, "branch")
+    reused = pool.acquire("task_003")
+    assert pool.stats["reused"] == 1 and pool.stats["created"] == 2
+    assert (reused.path / "b.py").exists()  # checked out at the new main commit
+    assert pool.integrate(reused) is None  # nothing committed
+
+
+def test_conflicting_task_is_not_merged(repo, tmp_path):
+    pool = WorktreePool(repo, directory=tmp_path / "wts")
+    first = work(pool, "task_001", "shared.py", "first\n")
+    second = work(pool, "task_002", "shared.py", "second\n")
+    pool.integrate(first)
+    head = git(repo, "rev-parse", "HEAD")
+
+    with pytest.raises(MergeConflict):
+        pool.integrate(second)
+    assert git(repo, "rev-parse", "HEAD") == head
+    assert (repo / "shared.py").read_text() == "first\n"
+    assert pool.stats["conflicts"] == 1
+
+    pool.release(second)
+    assert WorktreePool(repo, directory=tmp_path / "wts").acquire("task_003").path == second.path  # adopted